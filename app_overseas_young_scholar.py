@@ -1,12 +1,30 @@
 from flask import Flask, render_template, request, jsonify, Response
 import json
-import requests
-from openai import OpenAI
-import PyPDF2
-import io
 import re
 from datetime import datetime
 import os
+import asyncio
+import threading
+import time
+import openai
+
+from client_pool import ClientPool
+from context_budget import ContextSection, estimate_tokens, fit_sections, relevant_paragraphs, score_lines
+from disciplines import classify
+from event_streams import StreamRegistry, parse_event_id
+from gateway_pool import GatewayPool
+from hedging import FirstTokenRace, HedgePolicy, RoundTimeout
+from jobs import JobRunner, MemoryJobStore, QueueFull, SQLiteJobStore
+from metrics import MetricsRegistry, RoundTiming
+from near_duplicates import NearDuplicateIndex
+from pdf_extract import Extraction, PDFExtractor, PDFTextCache, download_pdf, join_pages, remove_quietly, spool_upload
+from policy_cache import IncompleteAnalysis, PolicyCache
+from prompts import DIMENSION_KEYWORDS, DIMENSION_QUESTIONS, DIMENSIONS, PROMPTS
+from prevalidation import GateConfig, prevalidate
+from rate_limit import RateLimiter
+from result_cache import ResultCache, MemoryCache, SQLiteCache, cache_key, normalize_proposal
+from scheduler import UpstreamScheduler, is_retryable, retry_delay
+from streaming_json import StreamingJSONParser
 
 app = Flask(__name__)
 
@@ -30,706 +48,1560 @@ def safe_json_dumps(data):
         cleaned_data = clean_string(data)
         return json.dumps(cleaned_data, ensure_ascii=False)
 
-def stream_response_with_buffer(response, round_num, reviewer):
-    """使用缓冲区流式处理响应，避免JSON截断问题"""
-    result = ""
-    content_buffer = ""
-    
+class SSEEvent(str):
+    """SSE事件帧（data: {json}）；同时保留原始数据字典，服务端内部消费者可直接读取而无需重新解析"""
+
+    def __new__(cls, payload):
+        frame = super().__new__(cls, f"data: {safe_json_dumps(payload)}\n\n")
+        frame.payload = payload
+        return frame
+
+def event_payload(chunk_data):
+    """取SSE事件帧对应的数据字典；非 SSEEvent 的帧才需要解析"""
+    payload = getattr(chunk_data, 'payload', None)
+    if payload is None:
+        payload = json.loads(chunk_data[len('data: '):])
+    return payload
+
+class FlushPolicy:
+    """流式输出的刷新策略：缓冲达到指定字符数、新片段含句子结束符、或距上次发送超过指定秒数时发送"""
+
+    def __init__(self, max_chars=50, boundaries='。！？；\n', max_interval=None):
+        self.max_chars = max_chars
+        self.boundaries = frozenset(boundaries)
+        self.max_interval = max_interval
+
+DEFAULT_FLUSH_POLICY = FlushPolicy(
+    max_chars=int(os.getenv("STREAM_FLUSH_MAX_CHARS", "50")),
+    max_interval=float(os.getenv("STREAM_FLUSH_INTERVAL", "0")) or None,
+)
+
+async def stream_response_with_buffer(response, round_num, reviewer, emit, flush_policy=None, timing=None):
+    """使用缓冲区流式处理响应，避免JSON截断问题
+
+    通过 emit 发送SSE事件帧，返回累积的完整文本；提供 timing（RoundTiming）时记录首 token 时间、片段数与用量。
+    """
+    policy = flush_policy or DEFAULT_FLUSH_POLICY
+    max_chars = policy.max_chars
+    boundaries = policy.boundaries
+    max_interval = policy.max_interval
+    parts = []
+    pending = []
+    pending_chars = 0
+    last_flush = time.monotonic()
+
     try:
-        for chunk in response:
-            if hasattr(chunk, 'choices') and len(chunk.choices) > 0:
-                if hasattr(chunk.choices[0], 'delta') and hasattr(chunk.choices[0].delta, 'content'):
-                    if chunk.choices[0].delta.content:
-                        content_buffer += chunk.choices[0].delta.content
-                        result += chunk.choices[0].delta.content
-                        
-                        # 当缓冲区达到一定大小或遇到句子结束符时发送
-                        if len(content_buffer) >= 50 or any(char in content_buffer for char in ['。', '！', '？', '；', '\n']):
-                            try:
-                                json_data = safe_json_dumps({'round': round_num, 'reviewer': reviewer, 'status': 'streaming', 'content': content_buffer})
-                                yield f"data: {json_data}\n\n"
-                                content_buffer = ""  # 清空缓冲区
-                            except Exception as json_error:
-                                error_data = safe_json_dumps({'round': round_num, 'reviewer': reviewer, 'status': 'error', 'message': f'数据序列化失败: {str(json_error)}'})
-                                yield f"data: {error_data}\n\n"
-        
+        async for chunk in response:
+            if timing is not None:
+                # 开启 include_usage 时，用量在最后一个 choices 为空的片段中返回
+                timing.usage(getattr(chunk, 'usage', None))
+            choices = getattr(chunk, 'choices', None)
+            if not choices:
+                continue
+            content = getattr(getattr(choices[0], 'delta', None), 'content', None)
+            if not content:
+                continue
+            if timing is not None:
+                timing.chunk(content)
+            parts.append(content)
+            pending.append(content)
+            pending_chars += len(content)
+
+            # 缓冲区在遇到句子结束符时即被清空，因此只需检查新片段
+            if (pending_chars >= max_chars or not boundaries.isdisjoint(content)
+                    or (max_interval and time.monotonic() - last_flush >= max_interval)):
+                try:
+                    await emit(SSEEvent({'round': round_num, 'reviewer': reviewer, 'status': 'streaming', 'content': ''.join(pending)}))
+                    pending = []  # 清空缓冲区
+                    pending_chars = 0
+                    if max_interval:
+                        last_flush = time.monotonic()
+                except Exception as json_error:
+                    await emit(SSEEvent({'round': round_num, 'reviewer': reviewer, 'status': 'error', 'message': f'数据序列化失败: {str(json_error)}'}))
+
         # 发送剩余的缓冲区内容
-        if content_buffer:
+        if pending:
             try:
-                json_data = safe_json_dumps({'round': round_num, 'reviewer': reviewer, 'status': 'streaming', 'content': content_buffer})
-                yield f"data: {json_data}\n\n"
+                await emit(SSEEvent({'round': round_num, 'reviewer': reviewer, 'status': 'streaming', 'content': ''.join(pending)}))
             except Exception as json_error:
-                error_data = safe_json_dumps({'round': round_num, 'reviewer': reviewer, 'status': 'error', 'message': f'数据序列化失败: {str(json_error)}'})
-                yield f"data: {error_data}\n\n"
-    
+                await emit(SSEEvent({'round': round_num, 'reviewer': reviewer, 'status': 'error', 'message': f'数据序列化失败: {str(json_error)}'}))
+
     except Exception as e:
-        error_data = safe_json_dumps({'round': round_num, 'reviewer': reviewer, 'status': 'error', 'message': f'流式处理失败: {str(e)}'})
-        yield f"data: {error_data}\n\n"
-    
-    return result
+        if timing is not None:
+            timing.status = 'error'
+        await emit(SSEEvent({'round': round_num, 'reviewer': reviewer, 'status': 'error', 'message': f'流式处理失败: {str(e)}'}))
+
+    return ''.join(parts)
+
+class StageAbort(Exception):
+    """阶段已输出错误事件，需要终止整个评估流程"""
+
+
+async def run_stage_graph(stages, results, ready_times=None, on_skipped=None):
+    """按依赖关系并发执行各阶段，将各阶段产生的SSE事件合并为单一事件流
+
+    stages: {阶段名: (依赖阶段名元组, 阶段函数)}。阶段函数为协程 func(inputs, emit)：inputs 是已完成阶段的
+    结果字典，通过 await emit(帧) 发送SSE事件，返回值即阶段结果（写入 results）。依赖全部完成的阶段立即
+    作为独立任务启动。任一阶段抛出 StageAbort 时取消其余阶段，并在输出该阶段已发送的事件后重新抛出。
+    提供 ready_times 字典时，记录各阶段进入就绪状态的时间（time.monotonic()）；提供 on_skipped 时，提前结束
+    （中止、异常或客户端断开）后以尚未启动的阶段名列表调用它。
+    """
+    events = asyncio.Queue()
+    pending = dict(stages)
+    tasks = set()
+
+    async def run_stage(name, func, inputs):
+        async def emit(frame):
+            events.put_nowait(('event', name, frame))
+        try:
+            events.put_nowait(('done', name, await func(inputs, emit)))
+        except StageAbort as e:
+            events.put_nowait(('abort', name, e))
+        except Exception as e:
+            events.put_nowait(('failed', name, e))
+
+    def start_ready():
+        started = 0
+        for name, (deps, func) in list(pending.items()):
+            if all(dep in results for dep in deps):
+                del pending[name]
+                if ready_times is not None:
+                    ready_times[name] = time.monotonic()
+                tasks.add(asyncio.ensure_future(run_stage(name, func, dict(results))))
+                started += 1
+        return started
+
+    try:
+        active = start_ready()
+        while active:
+            kind, name, value = await events.get()
+            if kind == 'event':
+                yield value
+                continue
+            active -= 1
+            if kind != 'done':
+                raise value
+            results[name] = value
+            active += start_ready()
+        if pending:
+            raise RuntimeError(f"阶段依赖无法满足: {', '.join(pending)}")
+    except BaseException:
+        if pending and on_skipped is not None:
+            on_skipped(list(pending))
+        raise
+    finally:
+        # 提前结束（中止、异常或客户端断开）时取消其余阶段，正在进行的上游请求随之关闭
+        for task in tasks:
+            task.cancel()
+
+def background_loop():
+    """同步（WSGI）路由共用的后台事件循环，评估流程在其中异步执行"""
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='evaluation-loop', daemon=True).start()
+            _background_loop = loop
+    return _background_loop
+
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
+async def _anext(agen):
+    return await agen.__anext__()
+
+def iterate_in_background(agen):
+    """在后台事件循环上驱动异步生成器，并以同步生成器的形式逐个返回其产出"""
+    loop = background_loop()
+    try:
+        while True:
+            try:
+                item = asyncio.run_coroutine_threadsafe(_anext(agen), loop).result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        # 客户端断开或提前结束时关闭异步生成器，取消仍在进行的轮次
+        asyncio.run_coroutine_threadsafe(agen.aclose(), loop)
 
 # Defaults for model and API
 DEFAULT_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.chatfire.cn/v1")
 DEFAULT_API_KEY = os.getenv("OPENAI_API_KEY")
 DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "deepseek-v3")
+DEFAULT_POLICY_MODEL = "deepseek-r1-search-pro"
+
+# OpenAI 客户端池：跨请求复用客户端与 keep-alive 连接
+client_pool = ClientPool(
+    max_size=int(os.getenv("LLM_CLIENT_POOL_SIZE", "32")),
+    ttl=float(os.getenv("LLM_CLIENT_TTL", "1800")),
+    close_delay=float(os.getenv("LLM_CLIENT_CLOSE_DELAY", "120")),
+    max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20")),
+    keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30")),
+    max_retries=0,
+)
+
+# 各轮 LLM 调用的运行指标，由 /metrics 导出
+metrics_registry = MetricsRegistry()
+
+# 流式请求时要求上游在最后一个片段中返回 token 用量（stream_options.include_usage）；不支持该参数的网关可设为 0
+STREAM_INCLUDE_USAGE = os.getenv("LLM_STREAM_INCLUDE_USAGE", "1") != "0"
+
+# 上游准入控制：按 (网关, 模型) 限制并发请求数与每分钟 token 数（默认 0，不限制），超出的请求按到达顺序排队；
+# LLM_ENDPOINT_LIMITS 为 JSON 列表，单独设置某个网关或模型，如 [{"base_url": "...", "model": "deepseek-v3", "concurrency": 8, "tpm": 200000}]
+upstream_scheduler = UpstreamScheduler(
+    concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "0")),
+    tpm=int(os.getenv("LLM_TPM", "0")),
+    per_endpoint=json.loads(os.getenv("LLM_ENDPOINT_LIMITS", "[]")),
+)
+
+# 上游请求失败（限流、超时、连接失败、5xx）后的最大重试次数；重试由调度器负责，客户端自身不再重试
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+
+# 截止时间（秒，0 表示不限制）：单轮（含排队与重试）与整个评估
+LLM_ROUND_TIMEOUT = float(os.getenv("LLM_ROUND_TIMEOUT", "300"))
+EVALUATION_TIMEOUT = float(os.getenv("EVALUATION_TIMEOUT", "900"))
+
+# 首 token 看门狗：发出请求后超过该秒数仍无内容则取消并换发一次（0 表示不启用）；
+# 第6轮的检索/推理模型在输出正文前会长时间思考，单独设置
+TTFT_TIMEOUTS = dict.fromkeys((1, 2, 3, 4, 5), float(os.getenv("LLM_TTFT_TIMEOUT", "60")))
+TTFT_TIMEOUTS[6] = float(os.getenv("LLM_POLICY_TTFT_TIMEOUT", "0"))
+WATCHDOG_TICK = 0.25
+
+# 对冲请求：主调用超过对冲延迟（固定秒数，或该网关与模型近期首 token 时间的分位数）仍无内容时，
+# 向备用网关/模型并行发起第二个调用，先产出内容者获胜；备用目标缺省与主调用相同
+hedge_policy = HedgePolicy(
+    enabled=os.getenv("LLM_HEDGE_ENABLED", "0") == "1",
+    delay=float(os.getenv("LLM_HEDGE_DELAY", "0")),
+    percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95")),
+    min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+)
+HEDGE_BASE_URL = os.getenv("LLM_HEDGE_BASE_URL")
+HEDGE_API_KEY = os.getenv("LLM_HEDGE_API_KEY")
+HEDGE_MODEL = os.getenv("LLM_HEDGE_MODEL")
+
+# 多网关负载均衡：LLM_GATEWAYS 为 JSON，按角色（main 为第1-4轮，structured 为第5轮与融合流程，policy 为第6轮政策搜索）
+# 列出可互换的上游，如 {"main": [{"base_url": "...", "model": "deepseek-v3", "api_key_env": "GATEWAY_A_KEY"}, ...]}；
+# 未配置的字段与角色使用默认网关、密钥与模型（structured 缺省与 main 相同）。每轮发起时按首 token 时间与生成速度的
+# EWMA 选取上游，连续失败的上游熔断一段时间；请求指定了网关、密钥或模型时固定使用该目标，不参与选路
+gateway_pool = GatewayPool.from_config(
+    json.loads(os.getenv("LLM_GATEWAYS", "{}")),
+    {'main': (DEFAULT_BASE_URL, DEFAULT_API_KEY, DEFAULT_MODEL),
+     'structured': (DEFAULT_BASE_URL, DEFAULT_API_KEY, DEFAULT_MODEL),
+     'policy': (DEFAULT_BASE_URL, DEFAULT_API_KEY, DEFAULT_POLICY_MODEL)},
+    alpha=float(os.getenv("LLM_GATEWAY_EWMA_ALPHA", "0.3")),
+    failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "3")),
+    cooldown=float(os.getenv("LLM_BREAKER_COOLDOWN", "30")),
+    max_cooldown=float(os.getenv("LLM_BREAKER_MAX_COOLDOWN", "300")),
+)
+
+# 上游请求速率限制：每个网关每分钟最多发起的模型请求数（默认 0，不限制；批量评估 CLI 可按网关单独设置）
+upstream_rate_limiter = RateLimiter(float(os.getenv("LLM_RATE_LIMIT_RPM", "0")))
+
+# 评估结果缓存：同一申请材料重复提交时直接回放已完成的轮次
+result_cache = ResultCache(
+    MemoryCache(max_bytes=int(os.getenv("RESULT_CACHE_MEMORY_MB", "64")) * 1024 * 1024),
+    SQLiteCache(os.getenv("RESULT_CACHE_PATH"), max_bytes=int(os.getenv("RESULT_CACHE_DISK_MB", "512")) * 1024 * 1024)
+    if os.getenv("RESULT_CACHE_PATH") else None
+) if os.getenv("RESULT_CACHE_ENABLED", "1") != "0" else None
+
+# 近似重复检测：以 MinHash/LSH 索引登记评估过的申请材料（只存签名、段落哈希与材料摘要，不存原文），新提交与某份
+# 材料的估算 Jaccard 相似度不低于 NEAR_DUPLICATE_THRESHOLD 时可复用其评估结果或只重跑受修改影响的轮次（请求体
+# near_duplicate 字段）。索引默认在内存中，设置 NEAR_DUPLICATE_PATH 时保存到 SQLite；依赖评估结果缓存
+near_duplicate_index = NearDuplicateIndex(
+    os.getenv("NEAR_DUPLICATE_PATH") or None,
+    threshold=float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.6")),
+    max_entries=int(os.getenv("NEAR_DUPLICATE_MAX_ENTRIES", "200000")),
+) if result_cache is not None and os.getenv("NEAR_DUPLICATE_ENABLED", "1") != "0" else None
+# off：不查找；reuse：回放相似材料的全部轮次；partial：复用未受修改影响的轮次，其余重新评估
+NEAR_DUPLICATE_MODES = ('off', 'reuse', 'partial')
+NEAR_DUPLICATE_MODE = os.getenv("NEAR_DUPLICATE_MODE", "off")
+
+# 共享政策分析缓存：第六轮的政策搜索按 (学科, 月份) 共用，过期前在后台刷新；每个请求只在其上做简短的个性化
+policy_cache = PolicyCache(
+    ResultCache(
+        MemoryCache(max_bytes=int(os.getenv("POLICY_CACHE_MEMORY_MB", "16")) * 1024 * 1024),
+        SQLiteCache(os.getenv("POLICY_CACHE_PATH"), max_bytes=int(os.getenv("POLICY_CACHE_DISK_MB", "64")) * 1024 * 1024)
+        if os.getenv("POLICY_CACHE_PATH") else None
+    ),
+    ttl=float(os.getenv("POLICY_CACHE_TTL", str(7 * 86400))),
+    refresh_after=float(os.getenv("POLICY_CACHE_REFRESH", "86400")),
+) if os.getenv("POLICY_CACHE_ENABLED", "1") != "0" else None
+# 个性化步骤的生成上限（使用主评估模型）；设为 0 时直接返回学科共用的政策分析
+POLICY_PERSONALIZE_MAX_TOKENS = int(os.getenv("POLICY_PERSONALIZE_MAX_TOKENS", "600"))
+
+# 提示词模板版本（含全部模板内容的哈希）：修改任一轮提示词时旧的缓存结果自动失效
+PROMPT_VERSION = PROMPTS.version
+
+# 各轮生成参数（同时参与缓存键）
+ROUND_PARAMS = {
+    'validation': {'temperature': 0.3, 'max_tokens': 1000},
+    'analysis': {'temperature': 0.3, 'max_tokens': 1500},
+    'dimension': {'temperature': 0.3, 'max_tokens': 2000},
+    'dimension_item': {'temperature': 0.3, 'max_tokens': 800},
+    'final': {'temperature': 0.2, 'max_tokens': 3000},
+    'structured': {'temperature': 0.1, 'max_tokens': 3000},
+    'fused': {'temperature': 0.1, 'max_tokens': 4000},
+    'policy': {'temperature': 0.2, 'max_tokens': 2000},
+}
+
+# 各阶段的主调用所属的轮次（融合调用记在第5轮）
+STAGE_ROUNDS = {'validation': 1, 'analysis': 2, 'dimension': 3, 'final': 4, 'structured': 5, 'fused': 5, 'policy': 6}
+
+# 第4、5轮嵌入前几轮输出（及申请材料）时的 token 预算，超出时先提炼第三轮评分要点、再截断；设为 0 不限制。
+# dimension 为第三轮按维度拆分时每个调用的申请材料预算，超出时只保留与该维度相关的段落
+CONTEXT_BUDGETS = {
+    'dimension': int(os.getenv("CONTEXT_BUDGET_DIMENSION", "3000")),
+    'final': int(os.getenv("CONTEXT_BUDGET_FINAL", "8000")),
+    'structured': int(os.getenv("CONTEXT_BUDGET_STRUCTURED", "6000")),
+    'fused': int(os.getenv("CONTEXT_BUDGET_FUSED", "8000")),
+    'personalize': int(os.getenv("CONTEXT_BUDGET_PERSONALIZE", "4000")),
+}
+
+# 评估流程：standard 为第4轮综合评估、第5轮据此生成结构化 JSON；fused 以一次 JSON 模式调用同时生成综合评估发言与
+# 结构化结果，省去第5轮重复输入的上下文与第二次生成。请求体 pipeline 字段可按请求覆盖
+PIPELINES = ('standard', 'fused')
+EVALUATION_PIPELINE = os.getenv("EVALUATION_PIPELINE", "standard")
+
+# 第三轮按维度拆分：五个维度各一个较小的调用并行执行，第三轮耗时约为最慢的单个维度；请求体 dimension_fanout 字段可按请求覆盖
+DIMENSION_FANOUT = os.getenv("DIMENSION_FANOUT", "0") != "0"
+
+# 拒绝 response_format 的 (网关, 模型)：融合模式对它们直接使用 standard 流程
+json_mode_unsupported = set()
+
+# 本地预校验：在任何上游调用之前拒绝明显无效的输入（阈值见 PREVALIDATION_* 环境变量）
+PREVALIDATION = GateConfig.from_env() if os.getenv("PREVALIDATION_ENABLED", "1") != "0" else None
+
+# PDF 提取：按页码区间分片交给进程池并行处理；上传与下载的文件大小上限
+pdf_extractor = PDFExtractor(
+    workers=int(os.getenv("PDF_WORKERS", "0")) or None,
+    shard_pages=int(os.getenv("PDF_SHARD_PAGES", "16")),
+)
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_MB", "50")) * 1024 * 1024
+
+# PDF 提取缓存：按文件内容哈希缓存整份文本，按页面指纹缓存各页文本
+pdf_cache = PDFTextCache(ResultCache(
+    MemoryCache(max_bytes=int(os.getenv("PDF_CACHE_MEMORY_MB", "128")) * 1024 * 1024),
+    SQLiteCache(os.getenv("PDF_CACHE_PATH"), max_bytes=int(os.getenv("PDF_CACHE_DISK_MB", "1024")) * 1024 * 1024)
+    if os.getenv("PDF_CACHE_PATH") else None
+)) if os.getenv("PDF_CACHE_ENABLED", "1") != "0" else None
 
 # Initialize default OpenAI client (used when未传自定义设置)
-client = OpenAI(base_url=DEFAULT_BASE_URL, api_key=DEFAULT_API_KEY)
+client = client_pool.get(DEFAULT_BASE_URL, DEFAULT_API_KEY)
 model = DEFAULT_MODEL
 
 @app.route('/')
 def index():
     return render_template('overseas_young_scholar.html')
 
-@app.route('/evaluate_stream', methods=['POST'])
-def evaluate_stream():
-    # 在请求上下文中获取数据
-    data = request.json
-    proposal_text = data.get('proposal_text', '').strip()
-    # 可选：前端透传的自定义模型、API网关与API密钥
-    api_name = (data.get('api_name') or '').strip() if isinstance(data, dict) else ''
-    api_base = (data.get('api_base') or '').strip() if isinstance(data, dict) else ''
-    api_key = (data.get('api_key') or '').strip() if isinstance(data, dict) else ''
-    # 政策分析单独设置
-    policy_api_name = (data.get('policy_api_name') or '').strip() if isinstance(data, dict) else ''
-    policy_api_base = (data.get('policy_api_base') or '').strip() if isinstance(data, dict) else ''
-    policy_api_key = (data.get('policy_api_key') or '').strip() if isinstance(data, dict) else ''
-    effective_base_url = api_base if api_base else DEFAULT_BASE_URL
-    effective_model = api_name if api_name else DEFAULT_MODEL
-    effective_client = OpenAI(base_url=effective_base_url, api_key=(api_key or DEFAULT_API_KEY))
-    # 政策分析专用 client & model（独立于主评估设置）
-    policy_base_url = policy_api_base if policy_api_base else effective_base_url
-    policy_api_key_eff = policy_api_key if policy_api_key else (api_key or DEFAULT_API_KEY)
-    effective_policy_model = policy_api_name if policy_api_name else "deepseek-r1-search-pro"
-    policy_client = OpenAI(base_url=policy_base_url, api_key=policy_api_key_eff)
-    
-    def generate():
+async def stream_llm_round(llm_client, llm_model, round_num, reviewer, system_prompt, user_prompt, emit,
+                           temperature, max_tokens, fallback_on_empty=False, timings=None, queued_at=None,
+                           deadline=None, backup=None, response_format=None):
+    """单轮LLM调用：通过 emit 流式发送SSE事件并返回完整文本；可选在流式无内容时回退一次非流式请求
+
+    deadline 为整个评估的截止时间（time.monotonic() 时刻），本轮截止时间取它与 LLM_ROUND_TIMEOUT 中较早者；
+    backup 为对冲与替换调用使用的 (客户端, 模型)，缺省与主调用相同；response_format 原样传给上游（如 JSON 模式）。
+    本轮的计时与用量记入 metrics_registry；提供 timings 列表时同时追加本轮的 RoundTiming。
+    """
+    timing = RoundTiming(round_num, reviewer, llm_model, str(llm_client.base_url),
+                         time.monotonic() if queued_at is None else queued_at)
+    if timings is not None:
+        timings.append(timing)
+    if LLM_ROUND_TIMEOUT:
+        round_deadline = time.monotonic() + LLM_ROUND_TIMEOUT
+        deadline = round_deadline if deadline is None else min(deadline, round_deadline)
+    try:
+        result = await _stream_llm_round(llm_client, llm_model, round_num, reviewer, system_prompt, user_prompt,
+                                         emit, temperature, max_tokens, fallback_on_empty, timing, deadline,
+                                         backup or (llm_client, llm_model), response_format)
+    except asyncio.CancelledError:
+        timing.finish('cancelled')
+        metrics_registry.observe_round(timing)
+        # 仍在排队、尚未发出的请求连同提示 token 一并节省
+        metrics_registry.observe_cancellation(
+            timing, max_tokens,
+            0 if timing.started_at is not None else estimate_tokens(system_prompt) + estimate_tokens(user_prompt))
+        raise
+    except RoundTimeout:
+        timing.finish('timeout')
+        metrics_registry.observe_round(timing)
+        raise
+    except Exception:
+        timing.finish('error')
+        metrics_registry.observe_round(timing)
+        raise
+    timing.finish()
+    metrics_registry.observe_round(timing)
+    return result
+
+def remaining_time(deadline, round_num):
+    """距截止时间的秒数；已超过时抛出 RoundTimeout"""
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise RoundTimeout(f'第{round_num}轮超过截止时间')
+    return remaining
+
+async def _stream_llm_round(llm_client, llm_model, round_num, reviewer, system_prompt, user_prompt, emit,
+                            temperature, max_tokens, fallback_on_empty, timing, deadline, backup, response_format):
+    """主调用发出后超过首 token 看门狗时间仍无内容时取消，并向 backup 换发一次；启用对冲时，超过对冲延迟
+    即向 backup 并行发起第二个调用。第一个产出内容的调用获胜，其余调用被取消（同一轮最多两个流式调用）。
+    主调用在重试后仍失败时，启用对冲或 backup 是网关池中的另一个上游时由 backup 接替。
+    各调用的首 token 时间、生成速度与成败反馈给网关池。
+    """
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    # 可选的生成参数（如 JSON 模式），只在调用方指定时传给上游
+    options = {'response_format': response_format} if response_format else {}
+    attempts = {}  # 任务 -> (路径, 该调用的 RoundTiming)
+    timed_out = set()  # 被首 token 看门狗取消的任务
+
+    def cancel_losers(winner):
+        for task, (path, _) in attempts.items():
+            if path != winner:
+                task.cancel()
+
+    race = FirstTokenRace(emit, on_win=cancel_losers)
+
+    def launch(path, client, model):
+        attempt = RoundTiming(round_num, reviewer, model, str(client.base_url), timing.queued_at)
+        task = asyncio.ensure_future(_call_upstream(client, model, round_num, reviewer, messages, race.gate(path),
+                                                    temperature, max_tokens, attempt, options))
+        attempts[task] = (path, attempt)
+        gateway_pool.begin(attempt.endpoint, model)
+        task.add_done_callback(lambda _: attempt.finish())
+        return task
+
+    primary = launch('primary', llm_client, llm_model)
+    hedge_delay = hedge_policy.delay(str(llm_client.base_url), llm_model)
+    failover = hedge_policy.enabled or (
+        (backup[0] is not llm_client or backup[1] != llm_model) and gateway_pool.knows(str(backup[0].base_url), backup[1]))
+    ttft_timeout = TTFT_TIMEOUTS.get(round_num, 0)
+    try:
+        while True:
+            pending = [task for task in attempts if not task.done()]
+            if not pending:
+                break
+            remaining = remaining_time(deadline, round_num)
+            await asyncio.wait(pending, timeout=min(WATCHDOG_TICK, remaining or WATCHDOG_TICK),
+                               return_when=asyncio.FIRST_COMPLETED)
+            if race.winner is not None:
+                continue
+            now = time.monotonic()
+            for task, (path, attempt) in attempts.items():
+                if (ttft_timeout and not task.done() and attempt.started_at is not None
+                        and attempt.first_token_at is None and now - attempt.started_at >= ttft_timeout):
+                    timed_out.add(task)
+                    task.cancel()
+            if len(attempts) > 1:
+                continue
+            started_at = attempts[primary][1].started_at
+            if primary.cancelled():
+                launch('watchdog', *backup)
+            elif primary.done():
+                # 主调用在重试后仍失败：启用对冲或网关池中另有上游时改由 backup 接替
+                if primary.exception() is not None and failover:
+                    launch('failover', *backup)
+            elif hedge_delay is not None and started_at is not None and now - started_at >= hedge_delay:
+                launch('hedge', *backup)
+    finally:
+        for task in attempts:
+            task.cancel()
+        await asyncio.gather(*attempts, return_exceptions=True)
+        for task, (path, attempt) in attempts.items():
+            observe_gateway(task, attempt, task in timed_out)
+            if attempt.ttft is not None:
+                hedge_policy.observe(attempt.endpoint, attempt.model, attempt.ttft)
+            # 本轮的计时与用量以获胜的调用为准，没有获胜者时以主调用为准
+            if path == (race.winner or 'primary'):
+                timing.adopt(attempt, path)
+        # 首 token 时间从本轮第一次发出请求算起
+        started = [attempt.started_at for _, attempt in attempts.values() if attempt.started_at is not None]
+        timing.started_at = min(started) if started else None
+
+    for task, (path, attempt) in attempts.items():
+        if path == race.winner:
+            return task.result()
+
+    # 没有调用产出内容
+    finished = [task for task in attempts if not task.cancelled()]
+    errors = [task.exception() for task in finished if task.exception() is not None]
+    if fallback_on_empty and len(errors) < len(attempts):
+        # 若某些模型（如部分 qwen*）不返回流式 content，则在截止时间内回退一次非流式以获取完整结果
         try:
-            
-            if not proposal_text:
-                yield f"data: {safe_json_dumps({'error': '请提供研究计划文本'})}\n\n"
-                return
-            
-            # 第一轮：输入验证
-            yield f"data: {safe_json_dumps({'round': 1, 'reviewer': '输入验证专家', 'status': 'start', 'message': '开始验证输入内容...'})}\n\n"
-            
-            validation_prompt = f"""作为输入验证专家，请验证以下申请材料的有效性：
+            result = await asyncio.wait_for(
+                _complete_round(llm_client, llm_model, round_num, reviewer, messages, emit,
+                                temperature, max_tokens, timing, options),
+                remaining_time(deadline, round_num))
+            timing.path = 'fallback'
+            return result
+        except asyncio.TimeoutError:
+            raise RoundTimeout(f'第{round_num}轮超过截止时间')
+        except Exception:
+            # 忽略回退失败，继续后续解析与降级处理
+            pass
+    if errors and len(errors) == len(finished):
+        raise errors[0]
+    if not finished:
+        raise RoundTimeout(f'第{round_num}轮等待首个内容超时（{ttft_timeout:g} 秒）')
+    for chunk_data in race.held[attempts[primary][0]]:
+        await emit(chunk_data)
+    return ''
+
+def pinned_targets(settings):
+    """请求指定了网关、密钥或模型的角色固定使用该目标，返回 {角色: (base_url, api_key, model)}；
+    其余角色每轮发起时由网关池选取
+    """
+    pinned = {}
+    if settings['pinned']:
+        pinned['main'] = pinned['structured'] = (settings['base_url'], settings['api_key'], settings['model'])
+    if settings['policy_pinned']:
+        pinned['policy'] = (settings['policy_base_url'], settings['policy_api_key'], settings['policy_model'])
+    return pinned
 
-{proposal_text}
+def select_target(role, pinned, max_tokens, pool=None):
+    """本轮调用的目标 (base_url, api_key, model) 与网关池对该角色的排序；固定目标的角色不经过网关池，排序为空"""
+    if role in pinned:
+        return pinned[role], []
+    upstreams = (pool or gateway_pool).ranked(role, max_tokens)
+    return (upstreams[0].base_url, upstreams[0].api_key, upstreams[0].model), upstreams
 
-**验证标准**：
-- 检查是否包含基本的申请材料内容
-- 评估内容的完整性和学术价值
-- 判断是否适合进行深入评估
-- 对于PDF提取的内容，要理解可能包含一些格式信息
+def observe_gateway(task, attempt, timed_out):
+    """把一次已结束的上游调用反馈给网关池：产出内容的调用更新 EWMA，失败或首 token 超时计入熔断器，
+    首 token 之前被取消（对冲落败、评估取消）的调用以已等待的时间作为首 token 时间的下限
+    """
+    endpoint, model = attempt.endpoint, attempt.model
+    finished_at = attempt.finished_at or time.monotonic()
+    gateway_pool.end(endpoint, model)
+    if timed_out or attempt.status == 'error':
+        # 首 token 超时，或流式输出中途断开（已输出的部分照常作为本轮结果）
+        gateway_pool.failure(endpoint, model)
+    elif not task.cancelled() and task.exception() is not None:
+        # 参数错误（如网关不支持 JSON 模式）与网关健康无关
+        if not isinstance(task.exception(), (openai.BadRequestError, openai.UnprocessableEntityError)):
+            gateway_pool.failure(endpoint, model)
+    elif attempt.ttft is not None:
+        generation_time = None if task.cancelled() else finished_at - attempt.first_token_at
+        gateway_pool.success(endpoint, model, attempt.ttft, attempt.output_chars, generation_time)
+    elif task.cancelled() and attempt.started_at is not None:
+        gateway_pool.slow(endpoint, model, finished_at - attempt.started_at)
 
-请以对话形式回答：
-1. 这段内容是否包含有效的国内青年人才申请材料？
-2. 内容长度和质量如何？是否包含学术相关要素？
-3. 是否值得进行深入评估？
-4. 您的初步判断是什么？
+async def _call_upstream(llm_client, llm_model, round_num, reviewer, messages, emit, temperature, max_tokens, timing,
+                         options=None):
+    """一次流式调用：经速率限制与准入调度发出请求，可重试的失败按退避重试；返回完整文本"""
+    endpoint = str(llm_client.base_url)
+    prompt_tokens = sum(estimate_tokens(message['content']) for message in messages)
 
-请用自然语言回答，就像在与其他专家讨论一样。对于合理的申请材料，应该给予评估机会。"""
+    async def report_queue(position):
+        await emit(SSEEvent({'round': round_num, 'reviewer': reviewer, 'status': 'queued', 'position': position,
+                             'message': f'上游繁忙，排队中（第 {position} 位）'}))
 
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        # 等待速率限制与准入名额的时间计入排队时间；重试时重新排队，并计入同一预算
+        await upstream_rate_limiter.acquire(endpoint)
+        async with upstream_scheduler.slot(endpoint, llm_model, prompt_tokens + max_tokens, report_queue) as slot:
+            if timing.started_at is None:
+                timing.start()
             try:
-                validation_response = effective_client.chat.completions.create(
-                    model=effective_model,
-                    messages=[
-                        {"role": "system", "content": "你是一位资深的国内青年人才项目评审专家，正在与其他专家进行讨论。"},
-                        {"role": "user", "content": validation_prompt}
-                    ],
-                    temperature=0.3,
-                    max_tokens=1000,
-                    stream=True
+                response = await llm_client.chat.completions.create(
+                    model=llm_model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    **({'stream_options': {'include_usage': True}} if STREAM_INCLUDE_USAGE else {}),
+                    **(options or {})
                 )
-                
-                # 使用缓冲区流式处理
-                validation_result = ""
-                for chunk_data in stream_response_with_buffer(validation_response, 1, '输入验证专家'):
-                    yield chunk_data
-                    # 提取内容用于后续处理
-                    if isinstance(chunk_data, str) and 'content' in chunk_data:
-                        try:
-                            data = json.loads(chunk_data.replace('data: ', ''))
-                            if 'content' in data:
-                                validation_result += data['content']
-                        except:
-                            pass
-                
-                yield f"data: {safe_json_dumps({'round': 1, 'reviewer': '输入验证专家', 'status': 'complete', 'message': '输入验证完成'})}\n\n"
-                
-                # 检查是否包含URL链接（只在URL占主导地位时拒绝）
-                url_count = proposal_text.count("http://") + proposal_text.count("https://")
-                text_length = len(proposal_text)
-                
-                # 如果URL数量过多或文本太短，则拒绝
-                if url_count > 3 or (url_count > 0 and text_length < 100):
-                    yield f"data: {safe_json_dumps({'round': 1, 'reviewer': '输入验证专家', 'status': 'error', 'message': '检测到过多URL链接或内容过短，请提供实际的申请材料文本内容'})}\n\n"
-                    yield f"data: {safe_json_dumps({'status': 'validation_failed', 'message': '输入验证失败'})}\n\n"
-                    return
-                
             except Exception as e:
-                yield f"data: {safe_json_dumps({'round': 1, 'reviewer': '输入验证专家', 'status': 'error', 'message': f'输入验证失败: {str(e)}'})}\n\n"
-                return
-            
-            # 第二轮：内容质量分析
-            yield f"data: {safe_json_dumps({'round': 2, 'reviewer': '内容质量分析专家', 'status': 'start', 'message': '开始分析内容质量...'})}\n\n"
-            
-            analysis_prompt = f"""作为内容质量分析专家，请深入分析以下申请材料：
+                if attempt == LLM_MAX_RETRIES or not is_retryable(e):
+                    raise
+                slot.settle(prompt_tokens)
+                delay = retry_delay(e, attempt)
+            else:
+                try:
+                    # 使用缓冲区流式处理
+                    result = await stream_response_with_buffer(response, round_num, reviewer, emit, timing=timing)
+                except asyncio.CancelledError:
+                    # 对冲落败、看门狗或截止时间取消时关闭上游连接
+                    await response.close()
+                    raise
+                slot.settle((timing.prompt_tokens or prompt_tokens)
+                            + (timing.completion_tokens or estimate_tokens(result)))
+                return result
+        timing.retries += 1
+        await asyncio.sleep(delay)
 
-{proposal_text}
+async def _complete_round(llm_client, llm_model, round_num, reviewer, messages, emit, temperature, max_tokens, timing,
+                          options=None):
+    """非流式请求一次完整结果，并以单条流内容的形式输出，便于前端显示这一轮内容"""
+    endpoint = str(llm_client.base_url)
+    prompt_tokens = sum(estimate_tokens(message['content']) for message in messages)
+    await upstream_rate_limiter.acquire(endpoint)
+    async with upstream_scheduler.slot(endpoint, llm_model, prompt_tokens + max_tokens) as slot:
+        response_simple = await llm_client.chat.completions.create(
+            model=llm_model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=False,
+            **(options or {})
+        )
+        result = response_simple.choices[0].message.content or ""
+        timing.fallback = True
+        timing.usage(getattr(response_simple, 'usage', None))
+        slot.settle((timing.prompt_tokens or prompt_tokens) + (timing.completion_tokens or estimate_tokens(result)))
+    if result:
+        timing.chunk(result)
+        await emit(SSEEvent({'round': round_num, 'reviewer': reviewer, 'status': 'streaming', 'content': result}))
+    return result
 
-**极其严格的评估标准**：
-- 只有世界顶级水平的研究才能获得高分评价
-- 普通水平的研究只能获得中等评价
-- 质量差的研究必须给予严厉批评
-- 如果材料不完整、缺乏具体数据、没有突出成果，必须指出严重不足
+# 兜底结果：模型没有输出可解析的评估结果、政策搜索没有内容时使用，不写入结果缓存（见 is_cacheable_result）
+REVIEW_UNPARSABLE = '无法解析模型输出的评估结果'
+POLICY_UNAVAILABLE = "政策搜索暂时不可用，请稍后重试。"
 
-请从以下角度进行详细分析，并以对话形式与其他专家讨论：
+def is_cacheable_result(value):
+    """阶段结果是否可以写入缓存：占位文本与解析失败的兜底评估结果应在下次提交时重新生成"""
+    if value is None or value == POLICY_UNAVAILABLE:
+        return False
+    return not (isinstance(value, dict) and value.get('parse_error') == REVIEW_UNPARSABLE)
 
-1. **内容完整性分析**：
-   - 是否包含详细的教育背景信息？是否来自世界顶级大学？
-   - 是否有具体的研究成果？是否发表在顶级期刊？
-   - 是否描述了突破性创新贡献？是否有重大社会影响？
-   - 是否有明确的发展计划？是否具有可操作性？
+def parse_review_data(json_result):
+    """解析第五轮输出的结构化评估结果，并补全必要字段
 
-2. **学术水平评估**：
-   - 体现了什么水平的学术能力？是否达到世界级水平？
-   - 研究实力如何？是否有独立解决重大科学问题的能力？
-   - 与国际水平相比如何？是否具有国际竞争力？
+    输出被截断或夹杂说明文字时由增量解析器补全，并在 parse_error 中注明；缺少维度名或分数的评分项被丢弃。
+    完全无法解析时返回兜底结果，parse_error 为 REVIEW_UNPARSABLE。
+    """
+    parser = StreamingJSONParser()
+    parser.feed(json_result)
+    complete = parser.done
+    review_data = parser.result()
+    if not isinstance(review_data, dict):
+        review_data = {
+            "meta": {
+                "title": "综合评估结果",
+                "version": "v1.0",
+                "review_time": datetime.now().isoformat()
+            },
+            "scores": [],
+            "aggregate": {
+                "weighted_total_100": 0,
+                "strengths": ["评估过程中出现错误"],
+                "risks": ["无法解析评估结果"],
+                "priority_fixes_top5": ["重新提交评估", "检查输入内容", "联系技术支持"]
+            },
+            "parse_error": REVIEW_UNPARSABLE
+        }
+    elif not complete:
+        review_data['parse_error'] = '模型输出不完整，已自动补全截断的内容'
+        review_data['raw_response'] = json_result
 
-3. **具体程度分析**：
-   - 提供了哪些具体数据？是否有量化指标？
-   - 成果描述是否具体？是否有详细的技术细节？
-   - 计划是否可操作？是否有明确的时间表和里程碑？
+    if isinstance(review_data.get('scores'), list):
+        review_data['scores'] = [item for item in review_data['scores'] if is_complete_score(item)]
 
-4. **逻辑性评价**：
-   - 内容结构是否清晰？逻辑是否严密？
-   - 各部分是否协调？是否形成完整的研究体系？
-   - 是否体现了高水平的学术思维？
+    # 确保必要字段存在
+    if 'meta' not in review_data:
+        review_data['meta'] = {
+            "title": "综合评估结果",
+            "version": "v1.0",
+            "review_time": datetime.now().isoformat()
+        }
 
-请用自然语言详细回答，就像在评审会议上发言一样。记住：宁可严厉批评也不要给予过高评价！"""
+    elif isinstance(review_data['meta'], dict):
+        # 评估时间由服务端填写（模板中不含时间，保持提示词前缀稳定）
+        review_data['meta']['review_time'] = datetime.now().isoformat()
 
-            try:
-                analysis_response = effective_client.chat.completions.create(
-                    model=effective_model,
-                    messages=[
-                        {"role": "system", "content": "你是一位资深的学术内容分析专家，正在评审会议上发言。"},
-                        {"role": "user", "content": analysis_prompt}
-                    ],
-                    temperature=0.3,
-                    max_tokens=1500,
-                    stream=True
-                )
-                
-                # 使用缓冲区流式处理
-                analysis_result = ""
-                for chunk_data in stream_response_with_buffer(analysis_response, 2, '内容质量分析专家'):
-                    yield chunk_data
-                    # 提取内容用于后续处理
-                    if isinstance(chunk_data, str) and 'content' in chunk_data:
-                        try:
-                            data = json.loads(chunk_data.replace('data: ', ''))
-                            if 'content' in data:
-                                analysis_result += data['content']
-                        except:
-                            pass
-                
-                yield f"data: {safe_json_dumps({'round': 2, 'reviewer': '内容质量分析专家', 'status': 'complete', 'message': '内容质量分析完成'})}\n\n"
-                
-            except Exception as e:
-                yield f"data: {safe_json_dumps({'round': 2, 'reviewer': '内容质量分析专家', 'status': 'error', 'message': f'内容质量分析失败: {str(e)}'})}\n\n"
-                return
-            
-            # 第三轮：各维度详细评估
-            yield f"data: {safe_json_dumps({'round': 3, 'reviewer': '各维度评估专家', 'status': 'start', 'message': '开始详细评估各维度...'})}\n\n"
-            
-            dimension_prompt = f"""作为各维度评估专家，请对以下申请材料进行详细评估：
-
-{proposal_text}
-
-**极其严格的评分标准**：
-- 5分：世界级突破性成果，发表在Nature/Science级别期刊，有重大社会影响
-- 4分：国际一流成果，发表在顶级期刊，有重要学术贡献
-- 3分：国内先进水平，有一定学术价值，但缺乏突破性
-- 2分：一般水平，成果有限，缺乏创新性
-- 1分：质量很差，缺乏学术价值，不适合申请
-
-请分别评估以下5个维度，并以对话形式详细说明：
-
-**维度1：教育、学术与科研工作经历 (权重15%)**
-- 教育背景如何？是否来自世界顶级大学？
-- 海外科研经历如何？是否在顶级机构工作？
-- 项目负责经验如何？是否独立负责重大项目？
-- 评分理由是什么？严格按照上述标准评分
-
-**维度2：已取得科学研究及技术创新的成果及贡献 (权重30%)**
-- 主要成果有哪些？是否发表在顶级期刊？
-- 创新贡献如何？是否有突破性发现？
-- 社会影响如何？是否有重大应用价值？
-- 评分理由是什么？严格按照上述标准评分
-
-**维度3：学术见解及技术成果独特性和原始创新性评价 (权重20%)**
-- 工作的原创性如何？是否解决了前人未解决的问题？
-- 独特性体现在哪里？
-- 与现有工作的区别？
-- 评分理由是什么？
-
-**维度4：发展潜力的评价 (权重20%)**
-- 前期成果与国家需求的契合度如何？
-- 研究连续性和成果集中度如何？
-- 未来发展方向是否明确？
-- 评分理由是什么？
-
-**维度5：申请工作设想和国内依托单位支持情况 (权重15%)**
-- 工作设想是否具体可行？
-- 依托单位支持是否充分？
-- 与前期工作的衔接如何？
-- 评分理由是什么？
-
-请用自然语言详细回答，就像在评审会议上发言一样。"""
+    if 'scores' not in review_data:
+        review_data['scores'] = []
 
-            try:
-                dimension_response = effective_client.chat.completions.create(
-                    model=effective_model,
-                    messages=[
-                        {"role": "system", "content": "你是一位资深的各维度评估专家，正在评审会议上发言。"},
-                        {"role": "user", "content": dimension_prompt}
-                    ],
-                    temperature=0.3,
-                    max_tokens=2000,
-                    stream=True
-                )
-                
-                # 使用缓冲区流式处理
-                dimension_result = ""
-                for chunk_data in stream_response_with_buffer(dimension_response, 3, '各维度评估专家'):
-                    yield chunk_data
-                    # 提取内容用于后续处理
-                    if isinstance(chunk_data, str) and 'content' in chunk_data:
-                        try:
-                            data = json.loads(chunk_data.replace('data: ', ''))
-                            if 'content' in data:
-                                dimension_result += data['content']
-                        except:
-                            pass
-                
-                yield f"data: {safe_json_dumps({'round': 3, 'reviewer': '各维度评估专家', 'status': 'complete', 'message': '各维度评估完成'})}\n\n"
-                
-            except Exception as e:
-                yield f"data: {safe_json_dumps({'round': 3, 'reviewer': '各维度评估专家', 'status': 'error', 'message': f'各维度评估失败: {str(e)}'})}\n\n"
-                return
-            
-            # 第四轮：综合评分和建议
-            yield f"data: {safe_json_dumps({'round': 4, 'reviewer': '综合评审专家', 'status': 'start', 'message': '开始综合评估和建议...'})}\n\n"
-            
-            final_prompt = f"""作为综合评审专家，基于前面的分析，请进行最终的综合评估：
-
-申请材料：{proposal_text}
-
-前面的分析结果：
-- 输入验证：{validation_result}
-- 内容质量分析：{analysis_result}
-- 各维度评估：{dimension_result}
-
-请以对话形式进行最终的综合评估，包括：
-
-1. **综合评分**：给出5个维度的具体分数（1-5分）和加权总分
-2. **主要优势分析**：详细分析申请人的主要优势（至少5点）
-3. **主要风险分析**：详细分析存在的主要风险（至少5点）
-4. **具体改进建议**：提供针对国内青年人才申请的具体、可操作的改进建议（至少8条，按优先级排序），包括：
-   - 申请材料的具体修改建议
-   - 成果展示的优化方向
-   - 申请策略的调整建议
-   - 时间安排和准备计划
-   - 与依托单位的沟通建议
-5. **总体评价**：给出总体评价和最终建议
-
-**极其严格的评分标准**：
-- 只有世界顶级水平的研究才能获得4-5分
-- 普通水平的研究只能获得2-3分
-- 质量差的研究必须给予1-2分
-- 如果材料不完整、缺乏具体数据、没有突出成果，总分必须在50分以下
-- 如果只是泛泛而谈、没有实质性内容，总分必须在40分以下
-- 如果内容空洞、缺乏学术价值，总分必须在30分以下
-
-**评分参考标准**：
-- 5分：世界级突破性成果，发表在Nature/Science级别期刊，有重大社会影响
-- 4分：国际一流成果，发表在顶级期刊，有重要学术贡献
-- 3分：国内先进水平，有一定学术价值，但缺乏突破性
-- 2分：一般水平，成果有限，缺乏创新性
-- 1分：质量很差，缺乏学术价值，不适合申请
-
-请用自然语言详细回答，就像在评审会议上做最终总结发言一样。记住：宁可给低分也不要给同情分！"""
+    if 'aggregate' not in review_data:
+        review_data['aggregate'] = {
+            "weighted_total_100": 0,
+            "strengths": ["评估结果不完整"],
+            "risks": ["缺少聚合信息"],
+            "priority_fixes_top5": ["重新提交评估"]
+        }
+
+    return review_data
+
+def structured_emitter(emit, on_summary=None):
+    """包装第5轮的 emit：边生成边增量解析 JSON，每个评分项、聚合结果完整时立即推送，前端无需等待整段 JSON
+
+    融合模式下综合评估发言（summary）完整时调用 on_summary(发言)。
+    """
+    parser = StreamingJSONParser()
+
+    async def emit_structured(chunk_data):
+        await emit(chunk_data)
+        payload = event_payload(chunk_data)
+        if payload.get('status') != 'streaming':
+            return
+        for path, value in parser.feed(payload.get('content', '')):
+            if len(path) == 2 and path[0] == 'scores' and is_complete_score(value):
+                await emit(SSEEvent({'round': 5, 'reviewer': '结构化评估专家', 'status': 'score',
+                                     'index': path[1], 'score': value}))
+            elif path == ('aggregate',) and isinstance(value, dict):
+                await emit(SSEEvent({'round': 5, 'reviewer': '结构化评估专家', 'status': 'aggregate',
+                                     'aggregate': value}))
+            elif path == ('summary',) and on_summary is not None and isinstance(value, str):
+                await on_summary(value)
+
+    return emit_structured
+
+def is_complete_score(item):
+    """评分项至少包含维度名与数值分数才能展示"""
+    return isinstance(item, dict) and bool(item.get('dimension')) \
+        and isinstance(item.get('score_1_to_5'), (int, float)) and not isinstance(item.get('score_1_to_5'), bool)
+
+def coalesce_streaming_events(events):
+    """合并同一轮（及同一子轮次）相邻的流式片段，缓存回放时整段输出"""
+    merged = []
+    parts = []
+    for payload in events:
+        if payload.get('status') == 'streaming' and merged and merged[-1].get('status') == 'streaming' \
+                and merged[-1].get('round') == payload.get('round') \
+                and merged[-1].get('sub_round') == payload.get('sub_round'):
+            parts.append(payload.get('content', ''))
+            continue
+        if parts:
+            merged[-1]['content'] = ''.join(parts)
+        merged.append(dict(payload))
+        parts = [payload.get('content', '')] if payload.get('status') == 'streaming' else []
+    if parts:
+        merged[-1]['content'] = ''.join(parts)
+    return merged
+
+def cached_stage(stage_func, key, deps, cache_hits, fallback_key=None, timings=None):
+    """为评估阶段加上结果缓存
+
+    依赖阶段全部命中且存在缓存时直接回放该阶段记录的事件；否则执行阶段并记录其事件与结果。
+    阶段输出过 error 事件、其轮次的上游调用出错（timings 中 status 为 error，如流式输出中途断开后保留的部分内容）
+    或结果为兜底内容（见 is_cacheable_result）时不写入缓存。
+    fallback_key 为近似重复材料的同一阶段的缓存键：本材料没有缓存时回放其结果，并写入本材料的键下。
+    各轮 start 事件带有 cache: hit/miss/near_duplicate 字段。
+    """
+    async def stage(results, emit):
+        entry = None
+        source = 'hit'
+        if all(dep in cache_hits for dep in deps):
+            entry = await asyncio.to_thread(result_cache.get, key)
+            if entry is None and fallback_key is not None:
+                entry = await asyncio.to_thread(result_cache.get, fallback_key)
+                source = 'near_duplicate'
+                if entry is not None:
+                    await asyncio.to_thread(result_cache.put, key, entry)
+        if entry is not None:
+            cache_hits.add(key)
+            for payload in entry['events']:
+                if payload.get('status') == 'queued':
+                    # 早先写入的条目可能含排队事件
+                    continue
+                if payload.get('status') == 'start':
+                    payload = dict(payload, cache=source)
+                await emit(SSEEvent(payload))
+            return entry['value']
+
+        events = []
+        first_timing = len(timings) if timings is not None else 0
+        retried = {}  # 轮次 -> 该轮重新输出时 timings 的长度
+
+        async def record(chunk_data):
+            payload = event_payload(chunk_data)
+            status = payload.get('status')
+            if status == 'start' and 'cache' not in payload:
+                # 阶段内部回放的子轮次（近似重复材料中未改动的维度）已带有 cache 字段
+                chunk_data = SSEEvent(dict(payload, cache='miss'))
+            if status == 'retry':
+                # 该轮重新输出（如融合调用回退为两轮流程）：此前记录的事件与上游调用作废，回放时只给出最终的输出
+                events[:] = [item for item in events if item.get('round') != payload.get('round')]
+                retried[payload.get('round')] = len(timings) if timings is not None else 0
+            elif status != 'queued':
+                # 排队位置只对当时的上游调用有意义，回放时没有上游调用，不记录
+                events.append(payload)
+            await emit(chunk_data)
+
+        value = await stage_func(results, record)
+        failed = any(payload.get('status') == 'error' for payload in events)
+        if timings is not None:
+            # 并行的其他阶段也会追加记录，只看本阶段输出过的轮次
+            rounds = {payload.get('round') for payload in events}
+            failed = failed or any(timing.status == 'error' and timing.round in rounds
+                                   and index >= retried.get(timing.round, 0)
+                                   for index, timing in enumerate(timings[first_timing:], first_timing))
+        if not failed and is_cacheable_result(value):
+            await asyncio.to_thread(result_cache.put, key, {'events': coalesce_streaming_events(events), 'value': value})
+        return value
+    return stage
+
+# 申请材料中未改动的维度在各子轮次合并结果中的标题（见 dimension_fanout_stage）
+DIMENSION_SECTION = re.compile(r'\*\*维度(\d+)：')
+
+def near_duplicate_plan(match, mode, discipline):
+    """近似重复材料可复用的阶段
+
+    reuse 模式或段落完全相同（只是顺序、空白等不同）时复用全部阶段；partial 模式复用第一轮输入验证，学科相同时
+    复用第六轮政策分析，第三轮按维度拆分时复用未受修改影响的维度（修改段落的关键词所属维度，见 paragraph_fingerprints），
+    第二轮内容质量分析与依赖第三轮的第4、5轮重新评估。第六轮带个性化建议（共享政策缓存且
+    POLICY_PERSONALIZE_MAX_TOKENS 不为 0）时，建议针对原材料生成，partial 模式不复用第六轮：学科共用的政策分析
+    仍由共享缓存提供，只重新生成个性化建议。
+    """
+    affected = [index for index in range(1, len(DIMENSIONS) + 1) if match['changed_mask'] >> (index - 1) & 1]
+    if mode == 'reuse' or not match['changed_paragraphs']:
+        stages = ['validation', 'analysis', 'dimension', 'policy', 'final', 'structured', 'fused']
+    else:
+        personalized = policy_cache is not None and POLICY_PERSONALIZE_MAX_TOKENS
+        stages = ['validation'] + (['policy'] if match['meta'].get('discipline') == discipline and not personalized
+                                   else [])
+    return {
+        'similarity': round(match['similarity'], 3),
+        'changed_paragraphs': match['changed_paragraphs'],
+        'affected_dimensions': [DIMENSIONS[index - 1][0] for index in affected],
+        'reused': stages,
+        'reused_dimensions': [index for index in range(1, len(DIMENSIONS) + 1) if index not in affected],
+        'evaluated_at': datetime.fromtimestamp(match['created_at']).isoformat(timespec='seconds'),
+        'pipeline': match['meta'].get('pipeline'),
+        'dimension_fanout': match['meta'].get('dimension_fanout'),
+    }
+
+def dimension_sections(entry, indices):
+    """从按维度拆分的第三轮缓存记录中取出指定维度的 {序号: (结果段落, 子轮次事件)}"""
+    sections = {}
+    for section in re.split(r'\n\n(?=\*\*维度\d+：)', entry['value']):
+        found = DIMENSION_SECTION.match(section)
+        if found and int(found.group(1)) in indices:
+            index = int(found.group(1))
+            sections[index] = (section, [payload for payload in entry['events'] if payload.get('sub_round') == index])
+    return sections
+
+async def run_evaluation(proposal_text, settings, use_cache=True):
+    """六轮评估流程，产出SSE事件
+
+    第1、2、3、6轮只依赖申请材料，同时启动；第4轮在1-3轮完成后启动，第5轮紧随第4轮，
+    整体耗时约为最长依赖链 3→4→5 的耗时。
+    """
+    # URL 占比、长度、乱码、重复内容等明显问题在本地直接拒绝，不占用上游容量
+    gate = prevalidate(proposal_text, PREVALIDATION) if PREVALIDATION is not None else None
+    if gate is not None:
+        metrics_registry.observe_prevalidation('fast_path' if gate.fast_path else 'accepted' if gate.accepted else 'rejected')
+        if not gate.accepted:
+            yield SSEEvent({'status': 'validation_failed', 'message': '；'.join(gate.reasons), 'reasons': gate.reasons})
+            return
+
+    pinned = pinned_targets(settings)
+
+    def route(role, max_tokens):
+        """本轮的 (客户端, 模型, 备用目标)：网关池中排在第二的上游作为对冲、看门狗替换与失败接替的备用目标；
+        只有一个上游时，第1-5轮的备用目标为 LLM_HEDGE_* 配置的网关与模型（未配置时与主调用相同）
+        """
+        (base_url, api_key, llm_model), upstreams = select_target(role, pinned, max_tokens)
+        llm_client = client_pool.get_async(base_url, api_key)
+        if len(upstreams) > 1:
+            backup = (client_pool.get_async(upstreams[1].base_url, upstreams[1].api_key), upstreams[1].model)
+        elif role != 'policy' and (HEDGE_BASE_URL or HEDGE_API_KEY or HEDGE_MODEL):
+            backup = (client_pool.get_async(HEDGE_BASE_URL or base_url, HEDGE_API_KEY or api_key), HEDGE_MODEL or llm_model)
+        else:
+            backup = None
+        return llm_client, llm_model, backup
+
+    def model_label(role):
+        """结果缓存键中该角色的模型标识"""
+        return pinned[role][2] if role in pinned else gateway_pool.label(role)
+    started_at = time.monotonic()
+    deadline = started_at + EVALUATION_TIMEOUT if EVALUATION_TIMEOUT else None
+    ready_times = {}
+    round_timings = []
+    context_reports = {}
+    policy_info = {}
+    # 第六轮个性化步骤的上游调用（与政策搜索同属第六轮，在 served_by 中单独列出）
+    personalize_timings = []
+    # 近似重复材料中可直接复用的维度 {序号: (结果段落, 子轮次事件)}（按维度拆分的第三轮）
+    reused_dimensions = {}
+
+    # 第一轮：输入验证
+    async def validation_stage(results, emit):
+        await emit(f"data: {safe_json_dumps({'round': 1, 'reviewer': '输入验证专家', 'status': 'start', 'message': '开始验证输入内容...'})}\n\n")
+
+        system, validation_prompt = PROMPTS['validation'].render(proposal=proposal_text)
+
+        try:
+            llm_client, llm_model, backup = route('main', ROUND_PARAMS['validation']['max_tokens'])
+            validation_result = await stream_llm_round(
+                llm_client, llm_model, 1, '输入验证专家',
+                system, validation_prompt, emit, **ROUND_PARAMS['validation'],
+                timings=round_timings, queued_at=ready_times.get('validation'),
+                deadline=deadline, backup=backup
+            )
+        except Exception as e:
+            await emit(f"data: {safe_json_dumps({'round': 1, 'reviewer': '输入验证专家', 'status': 'error', 'message': f'输入验证失败: {str(e)}'})}\n\n")
+            raise StageAbort()
+
+        await emit(f"data: {safe_json_dumps({'round': 1, 'reviewer': '输入验证专家', 'status': 'complete', 'message': '输入验证完成'})}\n\n")
+        return validation_result
 
+    # 第一轮快速通道：本地预校验已确认关键部分齐全，以预校验结论代替模型验证
+    async def fast_validation_stage(results, emit):
+        validation_result = gate.summary()
+        await emit(SSEEvent({'round': 1, 'reviewer': '输入验证专家', 'status': 'start', 'message': '本地预校验通过，跳过模型验证', 'fast_path': True}))
+        await emit(SSEEvent({'round': 1, 'reviewer': '输入验证专家', 'status': 'streaming', 'content': validation_result}))
+        await emit(SSEEvent({'round': 1, 'reviewer': '输入验证专家', 'status': 'complete', 'message': '输入验证完成'}))
+        return validation_result
+
+    # 第二轮：内容质量分析
+    async def analysis_stage(results, emit):
+        await emit(f"data: {safe_json_dumps({'round': 2, 'reviewer': '内容质量分析专家', 'status': 'start', 'message': '开始分析内容质量...'})}\n\n")
+
+        system, analysis_prompt = PROMPTS['analysis'].render(proposal=proposal_text)
+
+        try:
+            llm_client, llm_model, backup = route('main', ROUND_PARAMS['analysis']['max_tokens'])
+            analysis_result = await stream_llm_round(
+                llm_client, llm_model, 2, '内容质量分析专家',
+                system, analysis_prompt, emit, **ROUND_PARAMS['analysis'],
+                timings=round_timings, queued_at=ready_times.get('analysis'),
+                deadline=deadline, backup=backup
+            )
+        except Exception as e:
+            await emit(f"data: {safe_json_dumps({'round': 2, 'reviewer': '内容质量分析专家', 'status': 'error', 'message': f'内容质量分析失败: {str(e)}'})}\n\n")
+            raise StageAbort()
+
+        await emit(f"data: {safe_json_dumps({'round': 2, 'reviewer': '内容质量分析专家', 'status': 'complete', 'message': '内容质量分析完成'})}\n\n")
+        return analysis_result
+
+    # 第三轮：各维度详细评估
+    async def dimension_stage(results, emit):
+        await emit(f"data: {safe_json_dumps({'round': 3, 'reviewer': '各维度评估专家', 'status': 'start', 'message': '开始详细评估各维度...'})}\n\n")
+
+        system, dimension_prompt = PROMPTS['dimension'].render(proposal=proposal_text)
+
+        try:
+            llm_client, llm_model, backup = route('main', ROUND_PARAMS['dimension']['max_tokens'])
+            dimension_result = await stream_llm_round(
+                llm_client, llm_model, 3, '各维度评估专家',
+                system, dimension_prompt, emit, **ROUND_PARAMS['dimension'],
+                timings=round_timings, queued_at=ready_times.get('dimension'),
+                deadline=deadline, backup=backup
+            )
+        except Exception as e:
+            await emit(f"data: {safe_json_dumps({'round': 3, 'reviewer': '各维度评估专家', 'status': 'error', 'message': f'各维度评估失败: {str(e)}'})}\n\n")
+            raise StageAbort()
+
+        await emit(f"data: {safe_json_dumps({'round': 3, 'reviewer': '各维度评估专家', 'status': 'complete', 'message': '各维度评估完成'})}\n\n")
+        return dimension_result
+
+    # 第三轮（按维度拆分）：每个维度一个调用，只带该维度的评估要点与相关段落；各调用的事件带 sub_round 与 dimension
+    # 字段作为第三轮的子轮次输出，全部完成后按维度顺序合并为与单次调用相同形式的第三轮结果
+    async def dimension_fanout_stage(results, emit):
+        await emit(SSEEvent({'round': 3, 'reviewer': '各维度评估专家', 'status': 'start',
+                             'message': f'开始并行评估{len(DIMENSIONS)}个维度...', 'sub_rounds': len(DIMENSIONS)}))
+
+        async def assess(index, name, weight, questions, keywords):
+            if index in reused_dimensions:
+                section, events = reused_dimensions[index]
+                for payload in events:
+                    if payload.get('status') == 'start':
+                        payload = dict(payload, cache='near_duplicate')
+                    await emit(SSEEvent(payload))
+                return section
+
+            async def emit_sub(chunk_data):
+                await emit(SSEEvent(dict(event_payload(chunk_data), reviewer='各维度评估专家', sub_round=index, dimension=name)))
+
+            budget = CONTEXT_BUDGETS['dimension']
+            context, report = fit_sections([
+                ContextSection('proposal', proposal_text, condense=lambda text: relevant_paragraphs(text, keywords, budget)),
+            ], budget)
+            context_reports[f'dimension_{index}'] = report
+            metrics_registry.observe_context(3, report)
+
+            system, item_prompt = PROMPTS['dimension_item'].render(
+                index=index, dimension=name, weight=weight,
+                questions='\n'.join(f'- {question}' for question in questions), proposal=context['proposal'])
+            await emit_sub(SSEEvent({'round': 3, 'status': 'start', 'message': f'开始评估维度{index}：{name}'}))
+            llm_client, llm_model, backup = route('main', ROUND_PARAMS['dimension_item']['max_tokens'])
+            item_result = await stream_llm_round(
+                llm_client, llm_model, 3, f'各维度评估专家·维度{index}',
+                system, item_prompt, emit_sub, **ROUND_PARAMS['dimension_item'], fallback_on_empty=True,
+                timings=round_timings, queued_at=ready_times.get('dimension'),
+                deadline=deadline, backup=backup
+            )
+            await emit_sub(SSEEvent({'round': 3, 'status': 'complete', 'message': f'维度{index}评估完成'}))
+            return f"**维度{index}：{name} (权重{weight}%)**\n{item_result.strip()}"
+
+        tasks = [asyncio.ensure_future(assess(index, name, weight, questions, keywords))
+                 for index, ((name, weight), questions, keywords)
+                 in enumerate(zip(DIMENSIONS, DIMENSION_QUESTIONS, DIMENSION_KEYWORDS), 1)]
+        try:
+            sections = await asyncio.gather(*tasks)
+        except Exception as e:
+            await emit(SSEEvent({'round': 3, 'reviewer': '各维度评估专家', 'status': 'error', 'message': f'各维度评估失败: {str(e)}'}))
+            raise StageAbort()
+        finally:
+            # 任一维度失败或阶段被取消时，其余维度的调用随之取消
+            for task in tasks:
+                task.cancel()
+
+        await emit(SSEEvent({'round': 3, 'reviewer': '各维度评估专家', 'status': 'complete', 'message': '各维度评估完成'}))
+        return '\n\n'.join(sections)
+
+    # 第四轮：综合评分和建议
+    async def final_stage(results, emit):
+        validation_result = results['validation']
+        analysis_result = results['analysis']
+        dimension_result = results['dimension']
+        await emit(f"data: {safe_json_dumps({'round': 4, 'reviewer': '综合评审专家', 'status': 'start', 'message': '开始综合评估和建议...'})}\n\n")
+
+        context, context_reports['final'] = fit_sections([
+            ContextSection('validation', validation_result),
+            ContextSection('analysis', analysis_result),
+            ContextSection('dimension', dimension_result, condense=score_lines),
+            ContextSection('proposal', proposal_text, min_tokens=1000),
+        ], CONTEXT_BUDGETS['final'])
+        metrics_registry.observe_context(4, context_reports['final'])
+
+        system, final_prompt = PROMPTS['final'].render(**context)
+
+        try:
+            llm_client, llm_model, backup = route('main', ROUND_PARAMS['final']['max_tokens'])
+            final_result = await stream_llm_round(
+                llm_client, llm_model, 4, '综合评审专家',
+                system, final_prompt, emit, **ROUND_PARAMS['final'], fallback_on_empty=True,
+                timings=round_timings, queued_at=ready_times.get('final'),
+                deadline=deadline, backup=backup
+            )
+        except Exception as e:
+            await emit(f"data: {safe_json_dumps({'round': 4, 'reviewer': '综合评审专家', 'status': 'error', 'message': f'综合评估失败: {str(e)}'})}\n\n")
+            raise StageAbort()
+
+        await emit(f"data: {safe_json_dumps({'round': 4, 'reviewer': '综合评审专家', 'status': 'complete', 'message': '综合评估完成'})}\n\n")
+        return final_result
+
+    # 第五轮：结构化评分（基于前面的分析生成JSON）
+    async def structured_stage(results, emit):
+        validation_result = results['validation']
+        analysis_result = results['analysis']
+        dimension_result = results['dimension']
+        final_result = results['final']
+        await emit(f"data: {safe_json_dumps({'round': 5, 'reviewer': '结构化评估专家', 'status': 'start', 'message': '正在生成结构化评估结果...'})}\n\n")
+
+        context, context_reports['structured'] = fit_sections([
+            ContextSection('validation', validation_result),
+            ContextSection('analysis', analysis_result),
+            ContextSection('dimension', dimension_result, condense=score_lines),
+            ContextSection('final', final_result, min_tokens=1000),
+        ], CONTEXT_BUDGETS['structured'])
+        metrics_registry.observe_context(5, context_reports['structured'])
+
+        system, json_prompt = PROMPTS['structured'].render(**context)
+
+        try:
+            llm_client, llm_model, backup = route('structured', ROUND_PARAMS['structured']['max_tokens'])
+            json_result = await stream_llm_round(
+                llm_client, llm_model, 5, '结构化评估专家',
+                system, json_prompt, structured_emitter(emit), **ROUND_PARAMS['structured'], fallback_on_empty=True,
+                timings=round_timings, queued_at=ready_times.get('structured'),
+                deadline=deadline, backup=backup
+            )
+        except Exception as e:
+            await emit(f"data: {safe_json_dumps({'round': 5, 'reviewer': '结构化评估专家', 'status': 'error', 'message': f'结构化评估失败: {str(e)}'})}\n\n")
+            raise StageAbort()
+
+        await emit(f"data: {safe_json_dumps({'round': 5, 'reviewer': '结构化评估专家', 'status': 'complete', 'message': '结构化评估完成'})}\n\n")
+
+        # 解析结构化结果
+        try:
+            return parse_review_data(json_result)
+        except Exception as e:
+            await emit(f"data: {safe_json_dumps({'status': 'error', 'message': f'解析评估结果失败: {str(e)}'})}\n\n")
+            raise StageAbort()
+
+    # 第4、5轮融合：一次 JSON 模式调用同时生成综合评估发言（作为第4轮输出）与结构化结果（第5轮）
+    async def fused_stage(results, emit):
+        llm_client, llm_model, backup = route('structured', ROUND_PARAMS['fused']['max_tokens'])
+        if (str(llm_client.base_url), llm_model) in json_mode_unsupported:
+            return await two_round_stage(results, emit)
+        validation_result = results['validation']
+        analysis_result = results['analysis']
+        dimension_result = results['dimension']
+        await emit(SSEEvent({'round': 4, 'reviewer': '综合评审专家', 'status': 'start', 'message': '综合评估与结构化评估合并为一次调用...', 'pipeline': 'fused'}))
+        await emit(SSEEvent({'round': 5, 'reviewer': '结构化评估专家', 'status': 'start', 'message': '正在生成综合评估与结构化评估结果...', 'pipeline': 'fused'}))
+
+        context, context_reports['fused'] = fit_sections([
+            ContextSection('validation', validation_result),
+            ContextSection('analysis', analysis_result),
+            ContextSection('dimension', dimension_result, condense=score_lines),
+            ContextSection('proposal', proposal_text, min_tokens=1000),
+        ], CONTEXT_BUDGETS['fused'])
+        metrics_registry.observe_context(4, context_reports['fused'])
+
+        system, fused_prompt = PROMPTS['fused'].render(**context)
+
+        summary_sent = False
+
+        async def emit_summary(summary):
+            nonlocal summary_sent
+            summary_sent = True
+            await emit(SSEEvent({'round': 4, 'reviewer': '综合评审专家', 'status': 'streaming', 'content': summary}))
+            await emit(SSEEvent({'round': 4, 'reviewer': '综合评审专家', 'status': 'complete', 'message': '综合评估完成'}))
+
+        async def retry_two_rounds(message):
+            # 融合调用已输出的第4、5轮内容（start、综合评估发言、原始 JSON）作废：retry 事件通知前端、任务状态与
+            # 结果缓存清空这两轮，随后按两轮流程重新输出
+            for round_num, reviewer in ((4, '综合评审专家'), (5, '结构化评估专家')):
+                await emit(SSEEvent({'round': round_num, 'reviewer': reviewer, 'status': 'retry', 'message': message}))
+            return await two_round_stage(results, emit)
+
+        try:
+            json_result = await stream_llm_round(
+                llm_client, llm_model, 5, '结构化评估专家',
+                system, fused_prompt, structured_emitter(emit, emit_summary), **ROUND_PARAMS['fused'], fallback_on_empty=True,
+                timings=round_timings, queued_at=ready_times.get('fused'),
+                deadline=deadline, backup=backup, response_format={'type': 'json_object'}
+            )
+        except (openai.BadRequestError, openai.UnprocessableEntityError):
+            # 网关不支持 JSON 模式：记住该 (网关, 模型)，本次及以后的融合请求改用两轮流程
+            json_mode_unsupported.add((str(llm_client.base_url), llm_model))
+            return await retry_two_rounds('网关不支持 JSON 模式，改为分两轮评估...')
+        except Exception as e:
+            await emit(SSEEvent({'round': 5, 'reviewer': '结构化评估专家', 'status': 'error', 'message': f'结构化评估失败: {str(e)}'}))
+            raise StageAbort()
+
+        review_data = parse_review_data(json_result)
+        summary = review_data.pop('summary', None)
+        if not review_data['scores']:
+            # 上游接受了参数却没有按约定的 JSON 格式输出：本次回退为两轮流程
+            return await retry_two_rounds('融合调用未返回评分结果，改为分两轮评估...')
+        if not summary_sent:
+            await emit_summary(summary if isinstance(summary, str) and summary else '（模型未给出综合评估发言）')
+        await emit(SSEEvent({'round': 5, 'reviewer': '结构化评估专家', 'status': 'complete', 'message': '结构化评估完成'}))
+        return review_data
+
+    async def two_round_stage(results, emit):
+        final_result = await final_stage(results, emit)
+        return await structured_stage(dict(results, final=final_result), emit)
+
+    # 第六轮：政策搜索和建议（只依赖申请材料，与主评估并行）
+    async def policy_stage(results, emit):
+        await emit(f"data: {safe_json_dumps({'round': 6, 'reviewer': '政策分析专家', 'status': 'start', 'message': '正在搜索最新相关政策...'})}\n\n")
+
+        now = datetime.now()
+        system, policy_prompt = PROMPTS['policy'].render(year=now.year, month=now.month, proposal=proposal_text)
+
+        try:
+            # 政策搜索/分析模型：优先使用用户传入模型
+            llm_client, llm_model, backup = route('policy', ROUND_PARAMS['policy']['max_tokens'])
+            policy_result = await stream_llm_round(
+                llm_client, llm_model, 6, '政策分析专家',
+                system, policy_prompt, emit, **ROUND_PARAMS['policy'], fallback_on_empty=True,
+                timings=round_timings, queued_at=ready_times.get('policy'), deadline=deadline, backup=backup
+            )
+            if not policy_result:
+                policy_result = POLICY_UNAVAILABLE
+                await emit(f"data: {safe_json_dumps({'round': 6, 'reviewer': '政策分析专家', 'status': 'streaming', 'content': policy_result})}\n\n")
+        except Exception as e:
+            await emit(f"data: {safe_json_dumps({'round': 6, 'reviewer': '政策分析专家', 'status': 'error', 'message': f'政策搜索失败: {str(e)}'})}\n\n")
+            # 即使政策搜索失败，也发送评估结果
+            return None
+
+        await emit(f"data: {safe_json_dumps({'round': 6, 'reviewer': '政策分析专家', 'status': 'complete', 'message': '政策分析完成'})}\n\n")
+        return policy_result
+
+    # 第六轮（共享政策缓存）：同学科、同月份的申请共用一份政策搜索结果，每个请求只做简短的个性化
+    async def shared_policy_stage(results, emit):
+        discipline = classify(proposal_text)
+        now = datetime.now()
+        month = now.strftime('%Y-%m')
+        policy_info.update(discipline=discipline.code, month=month)
+        await emit(SSEEvent({'round': 6, 'reviewer': '政策分析专家', 'status': 'start', 'message': f'正在获取{discipline.name}领域的最新政策...', 'discipline': discipline.name}))
+
+        system, field_prompt = PROMPTS['policy_field'].render(discipline=discipline.name, year=now.year, month=now.month)
+
+        async def generate(emit=emit, timings=round_timings, deadline=deadline):
+            llm_client, llm_model, backup = route('policy', ROUND_PARAMS['policy']['max_tokens'])
+            attempt = []
             try:
-                final_response = effective_client.chat.completions.create(
-                    model=effective_model,
-                    messages=[
-                        {"role": "system", "content": "你是一位资深的综合评审专家，负责最终的综合评估和建议。"},
-                        {"role": "user", "content": final_prompt}
-                    ],
-                    temperature=0.2,
-                    max_tokens=3000,
-                    stream=True
+                analysis = await stream_llm_round(
+                    llm_client, llm_model, 6, '政策分析专家',
+                    system, field_prompt, emit, **ROUND_PARAMS['policy'], fallback_on_empty=True,
+                    timings=attempt, queued_at=ready_times.get('policy'), deadline=deadline, backup=backup
                 )
-                
-                # 使用缓冲区流式处理
-                final_result = ""
-                for chunk_data in stream_response_with_buffer(final_response, 4, '综合评审专家'):
-                    yield chunk_data
-                    # 提取内容用于后续处理
-                    if isinstance(chunk_data, str) and 'content' in chunk_data:
-                        try:
-                            data = json.loads(chunk_data.replace('data: ', ''))
-                            if 'content' in data:
-                                final_result += data['content']
-                        except:
-                            pass
-
-                # 若流式没有任何内容，回退一次非流式获取完整结果
-                if not final_result.strip():
-                    try:
-                        final_response_simple = effective_client.chat.completions.create(
-                            model=effective_model,
-                            messages=[
-                                {"role": "system", "content": "你是一位资深的综合评审专家，负责最终的综合评估和建议。"},
-                                {"role": "user", "content": final_prompt}
-                            ],
-                            temperature=0.2,
-                            max_tokens=3000,
-                            stream=False
-                        )
-                        final_result = final_response_simple.choices[0].message.content or ""
-                        if final_result:
-                            yield f"data: {safe_json_dumps({'round': 4, 'reviewer': '综合评审专家', 'status': 'streaming', 'content': final_result})}\n\n"
-                    except Exception as _fallback_err:
-                        pass
-
-                yield f"data: {safe_json_dumps({'round': 4, 'reviewer': '综合评审专家', 'status': 'complete', 'message': '综合评估完成'})}\n\n"
-                
-            except Exception as e:
-                yield f"data: {safe_json_dumps({'round': 4, 'reviewer': '综合评审专家', 'status': 'error', 'message': f'综合评估失败: {str(e)}'})}\n\n"
-                return
-            
-            # 第五轮：结构化评分（基于前面的分析生成JSON）
-            yield f"data: {safe_json_dumps({'round': 5, 'reviewer': '结构化评估专家', 'status': 'start', 'message': '正在生成结构化评估结果...'})}\n\n"
-            
-            json_prompt = f"""基于前面的所有分析，请生成结构化的评估结果：
-
-前面的分析：
-- 输入验证：{validation_result}
-- 内容质量分析：{analysis_result}
-- 各维度评估：{dimension_result}
-- 综合评估：{final_result}
-
-**极其严格的评分标准**：
-- 5分：世界级突破性成果，发表在Nature/Science级别期刊，有重大社会影响
-- 4分：国际一流成果，发表在顶级期刊，有重要学术贡献  
-- 3分：国内先进水平，有一定学术价值，但缺乏突破性
-- 2分：一般水平，成果有限，缺乏创新性
-- 1分：质量很差，缺乏学术价值，不适合申请
-
-**评分原则**：
-- 只有真正世界级的研究才能获得4-5分
-- 普通水平的研究只能获得2-3分
-- 质量差的研究必须给予1-2分
-- 如果材料不完整、缺乏具体数据、没有突出成果，总分必须在50分以下
-- 如果只是泛泛而谈、没有实质性内容，总分必须在40分以下
-- 如果内容空洞、缺乏学术价值，总分必须在30分以下
-
-**重要要求**：
-1. **优先级改进建议**：必须是针对国内青年人才申请的具体、可操作的改进建议，包括：
-   - 申请材料的具体修改建议
-   - 成果展示的优化方向
-   - 申请策略的调整建议
-   - 时间安排和准备计划
-   - 与依托单位的沟通建议
-
-2. **详细评估信息**：重点关注申请相关的要素，避免技术细节：
-   - 教育背景和海外经历的亮点与不足
-   - 科研成果的学术影响力和创新性
-   - 与国家重大需求的契合度
-   - 工作计划的可行性
-   - 依托单位支持的充分性
-
-请严格按照以下JSON格式输出结构化结果：
-
-{{
-  "meta": {{
-    "title": "国内青年人才申请评估结果",
-    "version": "v1.0", 
-    "review_time": "{datetime.now().isoformat()}"
-  }},
-  "scores": [
-    {{
-      "dimension": "教育、学术与科研工作经历",
-      "weight": 15,
-      "score_1_to_5": 分数,
-      "evidence": ["教育背景亮点", "海外经历优势"],
-      "issues": ["教育背景不足", "海外经历缺陷"],
-      "suggestion": "针对申请的具体改进建议"
-    }},
-    {{
-      "dimension": "已取得科学研究及技术创新的成果及贡献",
-      "weight": 30,
-      "score_1_to_5": 分数,
-      "evidence": ["主要学术成果", "创新贡献"],
-      "issues": ["成果展示不足", "创新性不够"],
-      "suggestion": "针对申请的具体改进建议"
-    }},
-    {{
-      "dimension": "学术见解及技术成果独特性和原始创新性评价",
-      "weight": 20,
-      "score_1_to_5": 分数,
-      "evidence": ["原创性体现", "独特性优势"],
-      "issues": ["原创性不足", "独特性不够"],
-      "suggestion": "针对申请的具体改进建议"
-    }},
-    {{
-      "dimension": "发展潜力的评价",
-      "weight": 20,
-      "score_1_to_5": 分数,
-      "evidence": ["与国家需求契合度", "发展前景"],
-      "issues": ["契合度不足", "发展前景不明"],
-      "suggestion": "针对申请的具体改进建议"
-    }},
-    {{
-      "dimension": "申请工作设想和国内依托单位支持情况",
-      "weight": 15,
-      "score_1_to_5": 分数,
-      "evidence": ["工作设想可行性", "依托单位支持"],
-      "issues": ["工作设想不足", "支持不够充分"],
-      "suggestion": "针对申请的具体改进建议"
-    }}
-  ],
-  "aggregate": {{
-    "weighted_total_100": 加权总分,
-    "strengths": ["申请优势1", "申请优势2", "申请优势3", "申请优势4", "申请优势5"],
-    "risks": ["申请风险1", "申请风险2", "申请风险3", "申请风险4", "申请风险5"],
-    "priority_fixes_top5": ["具体可操作的改进建议1", "具体可操作的改进建议2", "具体可操作的改进建议3", "具体可操作的改进建议4", "具体可操作的改进建议5"]
-  }}
-}}
-
-请严格按照上述格式输出，不要添加任何其他内容。所有建议必须针对国内青年人才申请，避免技术细节。"""
+            finally:
+                if timings is not None:
+                    timings.extend(attempt)
+            if attempt[0].status == 'error':
+                # 流式输出中途断开：部分内容不写入共享缓存，也不分发给等待同一学科结果的请求
+                raise IncompleteAnalysis('政策搜索的流式输出中途断开')
+            return analysis
+
+        async def refresh():
+            # 后台刷新不向任何请求输出内容，也不受本次评估的截止时间限制
+            async def discard(chunk_data):
+                pass
+            return await generate(discard, None, None)
+
+        key = cache_key(PROMPT_VERSION, 'policy', discipline.code, month, model_label('policy'), ROUND_PARAMS['policy'])
+        try:
+            base_result, state = await policy_cache.get(key, generate, refresh)
+        except Exception as e:
+            await emit(SSEEvent({'round': 6, 'reviewer': '政策分析专家', 'status': 'error', 'message': f'政策搜索失败: {str(e)}'}))
+            return None
+        policy_info['state'] = state
+        metrics_registry.observe_policy_cache(discipline.code, state)
+        if state != 'miss':
+            # 由本请求生成时内容已流式输出；其余情况整段输出共用的分析
+            await emit(SSEEvent({'round': 6, 'reviewer': '政策分析专家', 'status': 'streaming', 'content': base_result}))
 
+        policy_result = base_result
+        if POLICY_PERSONALIZE_MAX_TOKENS:
+            context, context_reports['personalize'] = fit_sections([
+                ContextSection('policy', base_result),
+                ContextSection('proposal', proposal_text, min_tokens=500),
+            ], CONTEXT_BUDGETS['personalize'])
+            metrics_registry.observe_context(6, context_reports['personalize'])
+            personalize_system, personalize_prompt = PROMPTS['policy_personalize'].render(
+                discipline=discipline.name, policy=context['policy'], proposal=context['proposal'])
+            header = '\n\n## 针对本申请的政策建议\n\n'
             try:
-                json_response = effective_client.chat.completions.create(
-                    model=effective_model,
-                    messages=[
-                        {"role": "system", "content": "你是一位资深的结构化评估专家，专门负责生成标准化的评估结果。"},
-                        {"role": "user", "content": json_prompt}
-                    ],
-                    temperature=0.1,
-                    max_tokens=3000,
-                    stream=True
+                await emit(SSEEvent({'round': 6, 'reviewer': '政策分析专家', 'status': 'streaming', 'content': header}))
+                llm_client, llm_model, backup = route('main', POLICY_PERSONALIZE_MAX_TOKENS)
+                personal_result = await stream_llm_round(
+                    llm_client, llm_model, 6, '政策分析专家',
+                    personalize_system, personalize_prompt, emit, temperature=ROUND_PARAMS['policy']['temperature'],
+                    max_tokens=POLICY_PERSONALIZE_MAX_TOKENS, fallback_on_empty=True,
+                    timings=personalize_timings, deadline=deadline, backup=backup
                 )
-                
-                # 使用缓冲区流式处理
-                json_result = ""
-                for chunk_data in stream_response_with_buffer(json_response, 5, '结构化评估专家'):
-                    yield chunk_data
-                    # 提取内容用于后续处理
-                    if isinstance(chunk_data, str) and 'content' in chunk_data:
-                        try:
-                            data = json.loads(chunk_data.replace('data: ', ''))
-                            if 'content' in data:
-                                json_result += data['content']
-                        except:
-                            pass
-                
-                # 若某些模型（如部分 qwen*）不返回流式 content，则回退一次非流式以获取完整结果
-                if not json_result.strip():
-                    try:
-                        json_response_simple = effective_client.chat.completions.create(
-                            model=effective_model,
-                            messages=[
-                                {"role": "system", "content": "你是一位资深的结构化评估专家，专门负责生成标准化的评估结果。"},
-                                {"role": "user", "content": json_prompt}
-                            ],
-                            temperature=0.1,
-                            max_tokens=3000,
-                            stream=False
-                        )
-                        json_result = json_response_simple.choices[0].message.content or ""
-                        # 以单条流内容的形式输出，便于前端显示这一轮内容
-                        if json_result:
-                            yield f"data: {safe_json_dumps({'round': 5, 'reviewer': '结构化评估专家', 'status': 'streaming', 'content': json_result})}\n\n"
-                    except Exception as _fallback_err:
-                        # 忽略回退失败，继续后续解析与降级处理
-                        pass
-
-                yield f"data: {safe_json_dumps({'round': 5, 'reviewer': '结构化评估专家', 'status': 'complete', 'message': '结构化评估完成'})}\n\n"
-                
-                # 解析结构化结果
-                try:
-                    import re
-                    cleaned_result = json_result.strip()
-                    if cleaned_result.startswith('```json'):
-                        cleaned_result = cleaned_result[7:]
-                    if cleaned_result.endswith('```'):
-                        cleaned_result = cleaned_result[:-3]
-                    cleaned_result = cleaned_result.strip()
-                    
-                    try:
-                        review_data = json.loads(cleaned_result)
-                    except json.JSONDecodeError:
-                        json_match = re.search(r'\{.*\}', cleaned_result, re.DOTALL)
-                        if json_match:
-                            review_data = json.loads(json_match.group())
-                        else:
-                            review_data = {
-                                "meta": {
-                                    "title": "综合评估结果",
-                                    "version": "v1.0",
-                                    "review_time": datetime.now().isoformat()
-                                },
-                                "scores": [],
-                                "aggregate": {
-                                    "weighted_total_100": 0,
-                                    "strengths": ["评估过程中出现错误"],
-                                    "risks": ["无法解析评估结果"],
-                                    "priority_fixes_top5": ["重新提交评估", "检查输入内容", "联系技术支持"]
-                                }
-                            }
-                    
-                    # 确保必要字段存在
-                    if 'meta' not in review_data:
-                        review_data['meta'] = {
-                            "title": "综合评估结果",
-                            "version": "v1.0",
-                            "review_time": datetime.now().isoformat()
-                        }
-                    
-                    if 'scores' not in review_data:
-                        review_data['scores'] = []
-                        
-                    if 'aggregate' not in review_data:
-                        review_data['aggregate'] = {
-                            "weighted_total_100": 0,
-                            "strengths": ["评估结果不完整"],
-                            "risks": ["缺少聚合信息"],
-                            "priority_fixes_top5": ["重新提交评估"]
-                        }
-                    
-                    # 第六轮：政策搜索和建议
-                    print("开始第六轮：政策搜索和建议")
-                    print(f"结构化评估结果: {review_data.get('aggregate', {}).get('weighted_total_100', 'N/A')}")
-                    yield f"data: {safe_json_dumps({'round': 6, 'reviewer': '政策分析专家', 'status': 'start', 'message': '正在搜索最新相关政策...'})}\n\n"
-                    
-                    policy_prompt = f"""作为政策分析专家，请搜索并分析以下申请材料相关的国家最新政策：
-
-申请材料：{proposal_text}
-
-请搜索以下方面的最新政策：
-1. 国内青年人才项目的最新政策变化
-2. 相关学科领域的最新支持政策
-3. 人才引进和科研资助的最新政策
-4. 创新创业的支持政策
-5. 相关产业发展的政策导向
-
-请提供：
-1. 最新政策要点（2024-2025年）
-2. 政策对申请人的影响分析
-3. 基于政策的项目建议
-4. 申请策略优化建议
-
-请用自然语言详细回答，就像在政策咨询会议上发言一样。"""
-
-                    try:
-                        # 政策搜索/分析模型：优先使用用户传入模型
-                        policy_response = policy_client.chat.completions.create(
-                            model=effective_policy_model,
-                            messages=[
-                                {"role": "system", "content": "你是一位资深的政策分析专家，专门负责搜索和分析国家最新政策。"},
-                                {"role": "user", "content": policy_prompt}
-                            ],
-                            temperature=0.2,
-                            max_tokens=2000,
-                            stream=True
-                        )
-                        
-                        # 使用缓冲区流式处理
-                        policy_result = ""
-                        try:
-                            for chunk_data in stream_response_with_buffer(policy_response, 6, '政策分析专家'):
-                                yield chunk_data
-                                # 提取内容用于后续处理
-                                if isinstance(chunk_data, str) and chunk_data.startswith('data: '):
-                                    try:
-                                        data = json.loads(chunk_data.replace('data: ', ''))
-                                        if 'content' in data:
-                                            policy_result += data['content']
-                                    except:
-                                        pass
-                        except Exception as stream_error:
-                            print(f"政策搜索流式处理错误: {stream_error}")
-                            # 如果流式处理失败，尝试非流式处理
-                            try:
-                                policy_response_simple = policy_client.chat.completions.create(
-                                    model=effective_policy_model,
-                                    messages=[
-                                        {"role": "system", "content": "你是一位资深的政策分析专家，专门负责搜索和分析国家最新政策。"},
-                                        {"role": "user", "content": policy_prompt}
-                                    ],
-                                    temperature=0.2,
-                                    max_tokens=2000,
-                                    stream=False
-                                )
-                                policy_result = policy_response_simple.choices[0].message.content
-                                yield f"data: {safe_json_dumps({'round': 6, 'reviewer': '政策分析专家', 'status': 'streaming', 'content': policy_result})}\n\n"
-                            except Exception as fallback_error:
-                                print(f"政策搜索备用方案也失败: {fallback_error}")
-                                policy_result = "政策搜索暂时不可用，请稍后重试。"
-                                yield f"data: {safe_json_dumps({'round': 6, 'reviewer': '政策分析专家', 'status': 'streaming', 'content': policy_result})}\n\n"
-                        
-                        print(f"政策分析完成，结果长度: {len(policy_result)}")
-                        yield f"data: {safe_json_dumps({'round': 6, 'reviewer': '政策分析专家', 'status': 'complete', 'message': '政策分析完成'})}\n\n"
-                        
-                        # 将政策分析结果添加到最终输出
-                        if 'meta' in review_data:
-                            review_data['meta']['policy_analysis'] = policy_result
-                        
-                        # 发送包含政策分析的最终结果
-                        print("发送包含政策分析的最终结果")
-                        yield f"data: {safe_json_dumps({'status': 'complete', 'review': review_data, 'policy_analysis': policy_result, 'scoring_criteria': {}})}\n\n"
-                        
-                    except Exception as e:
-                        yield f"data: {safe_json_dumps({'round': 6, 'reviewer': '政策分析专家', 'status': 'error', 'message': f'政策搜索失败: {str(e)}'})}\n\n"
-                        # 即使政策搜索失败，也发送评估结果
-                        yield f"data: {safe_json_dumps({'status': 'complete', 'review': review_data, 'scoring_criteria': {}})}\n\n"
-                    
-                except Exception as e:
-                    yield f"data: {safe_json_dumps({'status': 'error', 'message': f'解析评估结果失败: {str(e)}'})}\n\n"
-                
-            except Exception as e:
-                yield f"data: {safe_json_dumps({'round': 5, 'reviewer': '结构化评估专家', 'status': 'error', 'message': f'结构化评估失败: {str(e)}'})}\n\n"
-                return
-                
-        except Exception as e:
-            yield f"data: {safe_json_dumps({'status': 'error', 'message': f'评估过程中出现错误: {str(e)}'})}\n\n"
-    
-    return Response(generate(), mimetype='text/event-stream', headers={
-        'Cache-Control': 'no-cache',
-        'Connection': 'keep-alive',
-        'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': 'Content-Type'
-    })
+                if personal_result:
+                    policy_result = base_result + header + personal_result
+            except Exception:
+                # 个性化失败时仍返回学科共用的政策分析
+                pass
+            finally:
+                round_timings.extend(personalize_timings)
+
+        await emit(SSEEvent({'round': 6, 'reviewer': '政策分析专家', 'status': 'complete', 'message': '政策分析完成'}))
+        return policy_result
+
+    stages = {
+        'validation': ((), fast_validation_stage if gate is not None and gate.fast_path else validation_stage),
+        'analysis': ((), analysis_stage),
+        'dimension': ((), dimension_fanout_stage if settings['dimension_fanout'] else dimension_stage),
+        'policy': ((), shared_policy_stage if policy_cache is not None else policy_stage),
+    }
+    if settings['pipeline'] == 'fused':
+        stages['fused'] = (('validation', 'analysis', 'dimension'), fused_stage)
+    else:
+        stages['final'] = (('validation', 'analysis', 'dimension'), final_stage)
+        stages['structured'] = (('validation', 'analysis', 'dimension', 'final'), structured_stage)
+    cache_status = 'miss'
+    near_duplicate = None
+    if result_cache is not None and use_cache:
+        # 缓存键：归一化后申请材料的摘要 + 提示词版本 + 该轮模型与生成参数（及上下文预算）
+        digest = cache_key(normalize_proposal(proposal_text))
+        cache_hits = set()
+
+        # 政策分析的提示词含当前年月（搜索“最新”政策），其缓存键同样带上年月，跨月后重新生成
+        month = datetime.now().strftime('%Y-%m')
+
+        def keys_for(digest):
+            return {
+                name: cache_key(PROMPT_VERSION, digest, name,
+                                model_label('policy' if name == 'policy' else 'structured' if name in ('structured', 'fused') else 'main'),
+                                ROUND_PARAMS['dimension_item' if stages[name][1] is dimension_fanout_stage else name],
+                                CONTEXT_BUDGETS.get(name), stages[name][1].__name__,
+                                *((month,) if name == 'policy' else ()))
+                for name in stages
+            }
+
+        stage_keys = keys_for(digest)
+        fallback_keys = {}
+        if near_duplicate_index is not None and settings['near_duplicate'] != 'off':
+            match = await asyncio.to_thread(near_duplicate_index.query, proposal_text, DIMENSION_KEYWORDS, digest)
+            metrics_registry.observe_near_duplicate(settings['near_duplicate'], 'match' if match else 'none')
+            if match is not None:
+                near_duplicate = near_duplicate_plan(match, settings['near_duplicate'], classify(proposal_text).code)
+                previous_keys = keys_for(match['key'])
+                fallback_keys = {name: previous_keys[name] for name in near_duplicate['reused'] if name in stages}
+                if 'dimension' not in fallback_keys and stages['dimension'][1] is dimension_fanout_stage:
+                    entry = await asyncio.to_thread(result_cache.get, previous_keys['dimension'])
+                    if entry is not None:
+                        reused_dimensions.update(dimension_sections(entry, near_duplicate['reused_dimensions']))
+                near_duplicate['reused'] = list(fallback_keys)
+                near_duplicate['reused_dimensions'] = sorted(reused_dimensions)
+                yield SSEEvent(dict(near_duplicate, status='near_duplicate', mode=settings['near_duplicate']))
+        stages = {
+            name: (deps, cached_stage(func, stage_keys[name], [stage_keys[dep] for dep in deps], cache_hits,
+                                      fallback_keys.get(name), round_timings))
+            for name, (deps, func) in stages.items()
+        }
+
+    def observe_skipped(names):
+        # 评估提前结束时尚未启动的阶段（如客户端断开时仍在等待第三轮的第4、5轮）也节省了其上游调用，按该轮以往的
+        # 平均生成量计入；其提示词由前几轮输出构造，尚未生成，不计提示 token
+        for name in names:
+            metrics_registry.observe_cancellation(RoundTiming(STAGE_ROUNDS[name], None, None, None),
+                                                  ROUND_PARAMS[name]['max_tokens'])
+
+    results = {}
+    try:
+        async for chunk_data in run_stage_graph(stages, results, ready_times, observe_skipped):
+            yield chunk_data
+    except StageAbort:
+        return
+    if result_cache is not None and use_cache and len(cache_hits) == len(stages):
+        cache_status = 'near_duplicate' if near_duplicate else 'hit'
+    if near_duplicate_index is not None and use_cache:
+        # 登记本次评估的材料（键为材料摘要，与各阶段缓存键一致），供之后的近似重复提交查找
+        await asyncio.to_thread(near_duplicate_index.add, digest, proposal_text, {
+            'discipline': classify(proposal_text).code, 'pipeline': settings['pipeline'],
+            'dimension_fanout': settings['dimension_fanout'],
+        }, DIMENSION_KEYWORDS)
+
+    # 各轮计时与用量（缓存回放的轮次没有上游调用，不在其中）；context 为第4、5轮上下文裁剪节省的 token
+    yield SSEEvent({'status': 'timings', 'timings': [timing.as_dict() for timing in round_timings],
+                    'context': context_reports, 'total_duration': time.monotonic() - started_at})
+
+    # 各轮实际的服务路径：上游调用（primary / hedge / watchdog / failover / fallback）、缓存回放或本地预校验
+    served_by = {str(timing.round): {'path': timing.path, 'model': timing.model, 'endpoint': timing.endpoint}
+                 for timing in round_timings if timing not in personalize_timings}
+    if settings['pipeline'] == 'fused' and '5' in served_by and '4' not in served_by:
+        # 第4轮的综合评估发言由第5轮的融合调用一并生成
+        served_by['4'] = dict(served_by['5'], path='fused')
+    if policy_info.get('state'):
+        # 第六轮的政策分析来自共享缓存（或由本请求生成后写入），个性化步骤另行调用主评估模型
+        served_by.setdefault('6', {'path': 'policy_cache'})['policy_cache'] = policy_info
+        for timing in personalize_timings:
+            served_by['6']['personalize'] = {'path': timing.path, 'model': timing.model, 'endpoint': timing.endpoint}
+    for round_num in range(1, 7):
+        served_by.setdefault(str(round_num), {'path': 'local' if round_num == 1 and gate is not None and gate.fast_path else 'cache'})
+
+    review_data = results['fused'] if 'fused' in results else results['structured']
+    policy_result = results['policy']
+    if policy_result is None:
+        yield f"data: {safe_json_dumps({'status': 'complete', 'review': review_data, 'scoring_criteria': {}, 'cache': cache_status, 'served_by': served_by})}\n\n"
+        return
+
+    # 将政策分析结果添加到最终输出
+    if 'meta' in review_data:
+        review_data['meta']['policy_analysis'] = policy_result
+
+    # 发送包含政策分析的最终结果
+    yield f"data: {safe_json_dumps({'status': 'complete', 'review': review_data, 'policy_analysis': policy_result, 'scoring_criteria': {}, 'cache': cache_status, 'served_by': served_by})}\n\n"
+
+def evaluation_settings(data):
+    """从请求体解析主评估与政策分析的网关、密钥与模型（未提供时使用默认值）"""
+    data = data if isinstance(data, dict) else {}
+    # 可选：前端透传的自定义模型、API网关与API密钥
+    api_name = (data.get('api_name') or '').strip()
+    api_base = (data.get('api_base') or '').strip()
+    api_key = (data.get('api_key') or '').strip()
+    # 政策分析单独设置
+    policy_api_name = (data.get('policy_api_name') or '').strip()
+    policy_api_base = (data.get('policy_api_base') or '').strip()
+    policy_api_key = (data.get('policy_api_key') or '').strip()
+    effective_base_url = api_base if api_base else DEFAULT_BASE_URL
+    return {
+        'base_url': effective_base_url,
+        'api_key': api_key or DEFAULT_API_KEY,
+        'model': api_name if api_name else DEFAULT_MODEL,
+        # 政策分析专用网关、密钥与模型（独立于主评估设置）
+        'policy_base_url': policy_api_base if policy_api_base else effective_base_url,
+        'policy_api_key': policy_api_key if policy_api_key else (api_key or DEFAULT_API_KEY),
+        'policy_model': policy_api_name if policy_api_name else DEFAULT_POLICY_MODEL,
+        # 请求指定了网关、密钥或模型时固定使用该目标，否则由网关池按角色选取；政策分析未单独指定时沿用主评估的网关与密钥
+        'pinned': bool(api_base or api_key or api_name),
+        'policy_pinned': bool(policy_api_base or policy_api_key or policy_api_name or api_base or api_key),
+        # 评估流程（standard / fused），未指定或无效时使用 EVALUATION_PIPELINE
+        'pipeline': data.get('pipeline') if data.get('pipeline') in PIPELINES else EVALUATION_PIPELINE,
+        # 第三轮是否按维度拆分为并行调用，未指定时使用 DIMENSION_FANOUT
+        'dimension_fanout': data['dimension_fanout'] if isinstance(data.get('dimension_fanout'), bool) else DIMENSION_FANOUT,
+        # 与此前评估过的材料近似重复时的处理方式（off / reuse / partial），未指定或无效时使用 NEAR_DUPLICATE_MODE
+        'near_duplicate': data.get('near_duplicate') if data.get('near_duplicate') in NEAR_DUPLICATE_MODES else NEAR_DUPLICATE_MODE,
+    }
+
+async def evaluation_events(data):
+    """/evaluate_stream 的事件流（WSGI 与 ASGI 入口共用）"""
+    try:
+        proposal_text = (data.get('proposal_text') or '').strip() if isinstance(data, dict) else ''
+        if not proposal_text:
+            yield f"data: {safe_json_dumps({'error': '请提供研究计划文本'})}\n\n"
+            return
+
+        # 可选：设为 false 时跳过结果缓存，强制重新评估
+        use_cache = data.get('use_cache', True) is not False
+        async for chunk_data in run_evaluation(proposal_text, evaluation_settings(data), use_cache):
+            yield chunk_data
+
+    except Exception as e:
+        yield f"data: {safe_json_dumps({'status': 'error', 'message': f'评估过程中出现错误: {str(e)}'})}\n\n"
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'Connection': 'keep-alive',
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type, Last-Event-ID',
+    'Access-Control-Expose-Headers': 'X-Evaluation-Id'
+}
+
+# 可续传的评估流：每个评估流有 ID，事件帧带 id 字段并写入有界的重放缓冲区；客户端断线后凭 Last-Event-ID 从断点继续，
+# 评估流程在后台继续运行；最后一个连接断开后 SSE_RESUME_GRACE 秒内没有重连即取消评估与进行中的上游请求
+# （默认 20 秒，覆盖前端 5 次退避重连的总时长；设为 0 时断开即取消）
+evaluation_streams = StreamRegistry(
+    max_bytes=int(os.getenv("SSE_REPLAY_BUFFER_KB", "512")) * 1024,
+    spill_dir=os.getenv("SSE_REPLAY_PATH") or None,
+    ttl=float(os.getenv("SSE_REPLAY_TTL", "600")),
+    grace=float(os.getenv("SSE_RESUME_GRACE", "20")),
+    max_streams=int(os.getenv("SSE_MAX_STREAMS", "1000")),
+    on_event=metrics_registry.observe_stream,
+)
+STREAM_ABANDONED = SSEEvent({'status': 'error', 'message': '连接断开时间过长，评估已取消，请重新提交'})
+# 连接读取过慢、尚未发送的事件已从重放缓冲区淘汰时的最后一个事件（评估流程本身不受影响）
+STREAM_LAGGED = SSEEvent({'status': 'error', 'message': '连接读取过慢，部分评估事件已无法发送，请重新提交'})
+# 长时间没有事件（如等待首 token）时发送 SSE 注释帧，WSGI 服务器只有在写入时才能发现客户端已断开
+SSE_HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15")) or None
+
+def resume_target(last_event_id):
+    """按 Last-Event-ID 查找可续传的评估流，返回 (流, 已收到的最后序号)；不存在、已过期或事件已淘汰时流为 None"""
+    stream_id, after = parse_event_id(last_event_id)
+    stream = evaluation_streams.get(stream_id) if stream_id else None
+    if stream is None or not stream.available(after):
+        return None, -1
+    evaluation_streams.resumed()
+    return stream, after
+
+def stream_response(stream, after):
+    headers = dict(SSE_HEADERS, **{'X-Evaluation-Id': stream.id})
+    return Response(iterate_in_background(stream.subscribe(after, SSE_HEARTBEAT_INTERVAL, STREAM_LAGGED)), mimetype='text/event-stream', headers=headers)
+
+@app.route('/evaluate_stream', methods=['POST'])
+def evaluate_stream():
+    # 带 Last-Event-ID 的重新提交直接续传原评估流；否则新建评估流，评估流程在后台事件循环上异步执行
+    stream, after = resume_target(request.headers.get('Last-Event-ID'))
+    if stream is None:
+        data = request.json
+        stream = asyncio.run_coroutine_threadsafe(
+            evaluation_streams.start(evaluation_events(data), STREAM_ABANDONED), background_loop()
+        ).result()
+    return stream_response(stream, after)
+
+@app.route('/evaluate_stream/<stream_id>', methods=['GET'])
+def evaluate_stream_resume(stream_id):
+    """续传评估流：从 Last-Event-ID（请求头或 last_event_id 参数）之后的事件继续；未提供时从头回放"""
+    stream = evaluation_streams.get(stream_id)
+    if stream is None:
+        return jsonify({'error': '评估流不存在或已过期，请重新提交'}), 404
+    last_stream_id, after = parse_event_id(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    if last_stream_id != stream_id:
+        after = -1
+    if not stream.available(after):
+        return jsonify({'error': '断点之后的事件已不在缓冲区中，请重新提交'}), 410
+    evaluation_streams.resumed()
+    return stream_response(stream, after)
+
+@app.route('/near_duplicates', methods=['POST'])
+def near_duplicates():
+    """查找与提交材料近似重复、此前评估过的材料，返回相似度、修改涉及的段落与维度及 partial 模式可复用的阶段
+
+    前端据此询问用户复用已有评估（near_duplicate: reuse）、只重跑受影响的轮次（partial）或完整评估。
+    """
+    data = request.json
+    proposal_text = (data.get('proposal_text') or '').strip() if isinstance(data, dict) else ''
+    if not proposal_text:
+        return jsonify({'success': False, 'error': '请提供研究计划文本'}), 400
+    if near_duplicate_index is None:
+        return jsonify({'success': True, 'enabled': False, 'match': None})
+    match = near_duplicate_index.query(proposal_text, DIMENSION_KEYWORDS, cache_key(normalize_proposal(proposal_text)))
+    metrics_registry.observe_near_duplicate('lookup', 'match' if match else 'none')
+    if match is not None:
+        match = near_duplicate_plan(match, 'partial', classify(proposal_text).code)
+    return jsonify({'success': True, 'enabled': True, 'threshold': near_duplicate_index.threshold, 'match': match})
+
+@app.route('/metrics')
+def metrics():
+    return Response(metrics_registry.render(upstream_scheduler.stats(), gateway_pool.stats()), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+async def evaluation_payloads(data):
+    """评估事件的数据字典（供 /evaluate 的后台任务消费）"""
+    async for chunk_data in evaluation_events(data):
+        yield event_payload(chunk_data)
+
+# /evaluate 异步任务：有界工作池在后台事件循环上运行评估；任务状态默认保存在进程内，设置 EVALUATE_JOB_PATH 时保存到 SQLite
+JOB_RETENTION = {
+    'max_jobs': int(os.getenv("EVALUATE_JOB_RETENTION", "1000")),
+    'ttl': float(os.getenv("EVALUATE_JOB_TTL", "86400")),
+}
+evaluation_jobs = JobRunner(
+    SQLiteJobStore(os.getenv("EVALUATE_JOB_PATH"), **JOB_RETENTION)
+    if os.getenv("EVALUATE_JOB_PATH") else MemoryJobStore(**JOB_RETENTION),
+    evaluation_payloads,
+    background_loop,
+    workers=int(os.getenv("EVALUATE_WORKERS", "4")),
+    queue_size=int(os.getenv("EVALUATE_QUEUE_SIZE", "100")),
+)
+
+def job_response(job, include_rounds=True):
+    if not include_rounds:
+        def strip(state):
+            state = {k: v for k, v in state.items() if k != 'content'}
+            if 'sub_rounds' in state:
+                state['sub_rounds'] = {key: strip(item) for key, item in state['sub_rounds'].items()}
+            return state
+        job = dict(job, rounds={key: strip(state) for key, state in job['rounds'].items()})
+    return {'success': True, 'job': job}
 
 @app.route('/evaluate', methods=['POST'])
 def evaluate():
+    """提交评估任务，立即返回任务 ID；通过 GET /evaluate/<job_id> 查询进度与结果"""
     try:
         data = request.json
-        proposal_text = data.get('proposal_text', '').strip()
-        
+        proposal_text = (data.get('proposal_text') or '').strip() if isinstance(data, dict) else ''
+
         if not proposal_text:
-            return jsonify({'success': False, 'error': '请提供研究计划文本'})
-        
-        # 这里可以添加非流式评估逻辑
-        return jsonify({'success': True, 'message': '请使用流式评估接口'})
-        
+            return jsonify({'success': False, 'error': '请提供研究计划文本'}), 400
+
+        job = evaluation_jobs.submit(data)
+        return jsonify({'success': True, 'job_id': job['id'], 'status': job['status'],
+                        'status_url': f"/evaluate/{job['id']}"}), 202
+
+    except QueueFull:
+        return jsonify({'success': False, 'error': '评估任务过多，请稍后重试'}), 503
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/evaluate/<job_id>', methods=['GET'])
+def evaluate_status(job_id):
+    """任务状态、各轮部分输出与最终结果；rounds=0 时省略各轮输出内容，便于低开销轮询"""
+    job = evaluation_jobs.store.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': '任务不存在或已过期'}), 404
+    return jsonify(job_response(job, request.args.get('rounds', '1') != '0'))
+
+@app.route('/evaluate/<job_id>', methods=['DELETE'])
+@app.route('/evaluate/<job_id>/cancel', methods=['POST'])
+def evaluate_cancel(job_id):
+    job = evaluation_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': '任务不存在或已过期'}), 404
+    return jsonify(job_response(evaluation_jobs.store.get(job_id) or job, include_rounds=False))
+
+def stream_pdf_pages(path, digest, error_prefix, texts=None):
+    """逐页以SSE推送提取结果：start（总页数）→ page（每页文本）→ complete（缓存命中情况与耗时）；结束后删除临时文件"""
+    try:
+        extraction = Extraction(pdf_extractor, pdf_cache, path, digest, texts)
+        yield SSEEvent({'status': 'start', 'pages': extraction.pages})
+        has_text = False
+        for index, page_text in extraction:
+            has_text = has_text or bool(page_text.strip())
+            yield SSEEvent({'status': 'page', 'page': index + 1, 'pages': extraction.pages, 'text': page_text})
+        if not has_text:
+            yield SSEEvent({'status': 'error', 'error': '无法从PDF中提取文本'})
+            return
+        yield SSEEvent(dict(extraction.stats(), status='complete'))
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+        yield SSEEvent({'status': 'error', 'error': f'{error_prefix}: {str(e)}'})
+    finally:
+        if path is not None:
+            remove_quietly(path)
 
 @app.route('/extract_pdf', methods=['POST'])
 def extract_pdf():
@@ -741,17 +1613,19 @@ def extract_pdf():
         if request.content_type and 'application/json' in request.content_type:
             data = request.json
             pdf_url = data.get('pdf_url', '')
+            stream = data.get('stream') is True
         else:
             # 处理表单数据文件上传
             pdf_file = request.files.get('pdf_file')
             # 同时检查表单数据中的URL
             pdf_url = request.form.get('pdf_url', '')
+            stream = request.form.get('stream') in ('1', 'true')
+        # 可选：stream 为 true 时以SSE逐页返回提取进度
+        stream = stream or request.args.get('stream') in ('1', 'true')
         
         if not pdf_url and not pdf_file:
             return jsonify({'error': '请提供PDF URL或上传PDF文件'}), 400
         
-        text = ""
-        
         if pdf_file:
             # 处理上传的文件
             if pdf_file.filename == '':
@@ -760,31 +1634,51 @@ def extract_pdf():
             if not pdf_file.filename.lower().endswith('.pdf'):
                 return jsonify({'error': '请上传PDF文件'}), 400
             
+            error_prefix = '读取PDF文件时出错'
+            cached_texts = None
             try:
-                pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_file.read()))
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
+                path, digest = spool_upload(pdf_file.stream, PDF_MAX_BYTES)
             except Exception as e:
-                return jsonify({'error': f'读取PDF文件时出错: {str(e)}'}), 400
+                return jsonify({'error': f'{error_prefix}: {str(e)}'}), 400
         
-        elif pdf_url:
-            # 处理URL
+        else:
+            # 处理URL：流式下载到临时文件，超过大小上限即中止；已缓存的 URL 带 ETag/Last-Modified 条件请求
+            error_prefix = '从URL下载或读取PDF时出错'
+            url_entry = pdf_cache.url_entry(pdf_url) if pdf_cache is not None else None
+            # 条件请求返回 304 时直接使用这里取出的文本，不再查缓存（其间条目可能已被淘汰）
+            cached_texts = pdf_cache.document(url_entry['digest']) if url_entry is not None else None
+            if cached_texts is None:
+                url_entry = None
             try:
-                response = requests.get(pdf_url, timeout=30)
-                response.raise_for_status()
-                
-                pdf_reader = PyPDF2.PdfReader(io.BytesIO(response.content))
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
+                path, digest, headers = download_pdf(pdf_url, PDF_MAX_BYTES, validators=url_entry)
             except Exception as e:
-                return jsonify({'error': f'从URL下载或读取PDF时出错: {str(e)}'}), 400
+                return jsonify({'error': f'{error_prefix}: {str(e)}'}), 400
+            if path is None:
+                digest = url_entry['digest']  # 304：远程文件未变化
+            else:
+                cached_texts = None
+                if pdf_cache is not None:
+                    pdf_cache.put_url(pdf_url, headers, digest)
+        
+        if stream:
+            return Response(stream_pdf_pages(path, digest, error_prefix, cached_texts), mimetype='text/event-stream', headers=SSE_HEADERS)
+        
+        try:
+            extraction = Extraction(pdf_extractor, pdf_cache, path, digest, cached_texts)
+            text = join_pages(page_text for _, page_text in extraction)
+        except Exception as e:
+            return jsonify({'error': f'{error_prefix}: {str(e)}'}), 400
+        finally:
+            if path is not None:
+                remove_quietly(path)
         
-        if not text.strip():
+        if not text:
             return jsonify({'error': '无法从PDF中提取文本'}), 400
         
         return jsonify({
             'success': True,
-            'text': text.strip()
+            'text': text,
+            'stats': extraction.stats()
         })
     
     except Exception as e:
@@ -0,0 +1,114 @@
+"""ASGI 入口：/evaluate_stream 直接在服务器事件循环上异步执行，单个工作进程即可同时保持大量 SSE 长连接；
+页面、/evaluate、/extract_pdf 等其余路由仍交给 Flask 应用处理。
+
+运行：uvicorn asgi_app:app --host 0.0.0.0 --port 4091
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app_overseas_young_scholar import (
+    app as flask_app, evaluation_events, evaluation_streams, parse_event_id, resume_target, safe_json_dumps,
+    SSE_HEADERS, SSE_HEARTBEAT_INTERVAL, STREAM_ABANDONED, STREAM_LAGGED,
+)
+
+wsgi_app = WsgiToAsgi(flask_app)
+
+
+async def read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return bytes(body)
+
+
+def request_header(scope, name):
+    name = name.lower().encode('latin-1')
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+async def send_json(send, status, payload):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': safe_json_dumps(payload).encode('utf-8')})
+
+
+async def evaluate_stream(scope, receive, send):
+    body = await read_body(receive)
+    if body is None:
+        return
+    # 带 Last-Event-ID 的重新提交直接续传原评估流
+    stream, after = resume_target(request_header(scope, 'Last-Event-ID'))
+    if stream is None:
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            await send_json(send, 400, {'error': '请求体不是有效的JSON'})
+            return
+        stream = await evaluation_streams.start(evaluation_events(data), STREAM_ABANDONED)
+    await stream_events(stream, after, receive, send)
+
+
+async def evaluate_stream_resume(scope, receive, send, stream_id):
+    stream = evaluation_streams.get(stream_id)
+    if stream is None:
+        await send_json(send, 404, {'error': '评估流不存在或已过期，请重新提交'})
+        return
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    last_event_id = request_header(scope, 'Last-Event-ID') or (query.get('last_event_id') or [None])[0]
+    last_stream_id, after = parse_event_id(last_event_id)
+    if last_stream_id != stream_id:
+        after = -1
+    if not stream.available(after):
+        await send_json(send, 410, {'error': '断点之后的事件已不在缓冲区中，请重新提交'})
+        return
+    evaluation_streams.resumed()
+    await stream_events(stream, after, receive, send)
+
+
+async def stream_events(stream, after, receive, send):
+    headers = [(b'content-type', b'text/event-stream; charset=utf-8')]
+    headers += [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in dict(SSE_HEADERS, **{'X-Evaluation-Id': stream.id}).items()]
+    await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+
+    events = stream.subscribe(after, SSE_HEARTBEAT_INTERVAL, STREAM_LAGGED)
+
+    async def forward():
+        async for chunk_data in events:
+            await send({'type': 'http.response.body', 'body': chunk_data.encode('utf-8'), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    async def wait_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    streaming = asyncio.ensure_future(forward())
+    disconnected = asyncio.ensure_future(wait_disconnect())
+    try:
+        await asyncio.wait({streaming, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        # 客户端断开时只结束本次连接；评估流程在后台继续，可凭 Last-Event-ID 续传
+        streaming.cancel()
+        disconnected.cancel()
+        await asyncio.gather(streaming, disconnected, return_exceptions=True)
+        await events.aclose()
+
+
+async def app(scope, receive, send):
+    path = scope.get('path', '')
+    if scope['type'] == 'http' and path == '/evaluate_stream' and scope['method'] == 'POST':
+        await evaluate_stream(scope, receive, send)
+    elif scope['type'] == 'http' and path.startswith('/evaluate_stream/') and scope['method'] == 'GET':
+        await evaluate_stream_resume(scope, receive, send, path[len('/evaluate_stream/'):])
+    else:
+        await wsgi_app(scope, receive, send)
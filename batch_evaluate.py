@@ -0,0 +1,240 @@
+"""批量评估：对 PDF 目录或 JSONL 申请材料逐份运行与 /evaluate_stream 相同的六轮评估，每份材料输出一条结构化结果
+
+用法：
+  python batch_evaluate.py applications/ -o results.jsonl --concurrency 8
+  python batch_evaluate.py proposals.jsonl -o results.parquet --rpm 120 --endpoint-rpm https://gw.example.com/v1=60
+
+输入为目录时递归读取其中的 PDF（候选人 ID 为相对路径）；为 JSONL 文件时每行一条记录，需包含 proposal_text，
+可选 id（缺省为“文件名:行号”）。结果逐条追加到检查点文件（输出为 JSONL 时即输出文件本身），中断后重新运行同一命令
+会跳过已完成的候选人；Parquet 输出在全部完成后由检查点生成（需安装 pandas 与 pyarrow）。
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+
+from app_overseas_young_scholar import (
+    DEFAULT_MODEL, PDF_MAX_BYTES, PIPELINES, evaluation_events, event_payload, pdf_cache, pdf_extractor,
+    safe_json_dumps,
+)
+import app_overseas_young_scholar
+from pdf_extract import Extraction, join_pages
+from rate_limit import RateLimiter
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extract_pdf_text(path):
+    """提取本地 PDF 的文本（复用服务端的分片提取器与提取缓存）"""
+    if os.path.getsize(path) > PDF_MAX_BYTES:
+        raise ValueError(f'PDF 超过大小上限（{PDF_MAX_BYTES // (1024 * 1024)} MB）')
+    extraction = Extraction(pdf_extractor, pdf_cache, path, file_digest(path))
+    return join_pages(text for _, text in extraction)
+
+
+def iter_candidates(source):
+    """产出 (候选人 ID, 来源, 读取申请材料文本的函数)"""
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith('.pdf'):
+                    path = os.path.join(root, name)
+                    yield os.path.relpath(path, source), path, lambda path=path: extract_pdf_text(path)
+        return
+    with open(source, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            candidate_id = str(record.get('id') or f'{os.path.basename(source)}:{line_no}')
+            yield candidate_id, f'{source}:{line_no}', lambda record=record: record.get('proposal_text') or ''
+
+
+def load_checkpoint(path):
+    """检查点中各候选人的最后一条结果 {候选人 ID: 结果}"""
+    records = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程崩溃时可能留下不完整的最后一行
+                    continue
+                records[record['id']] = record
+    return records
+
+
+async def evaluate_candidate(candidate_id, source, read_text, settings):
+    """评估一份材料，返回结构化结果（失败时 status 为 failed / rejected，不抛出异常）"""
+    started_at = time.monotonic()
+    record = {
+        'id': candidate_id, 'source': source, 'status': 'failed', 'error': None, 'score': None,
+        'review': None, 'policy_analysis': None, 'rounds': None, 'served_by': None,
+        'prompt_tokens': 0, 'completion_tokens': 0,
+        'duration': None,
+    }
+    try:
+        proposal_text = (await asyncio.to_thread(read_text)).strip()
+        if not proposal_text:
+            raise ValueError('申请材料为空')
+        errors = []
+        async for chunk_data in evaluation_events(dict(settings, proposal_text=proposal_text)):
+            payload = event_payload(chunk_data)
+            status = payload.get('status')
+            if 'round' in payload:
+                if status == 'error':
+                    errors.append(payload.get('message'))
+            elif status == 'timings':
+                record['rounds'] = payload.get('timings')
+                for timing in record['rounds'] or []:
+                    record['prompt_tokens'] += timing.get('prompt_tokens') or 0
+                    record['completion_tokens'] += timing.get('completion_tokens') or 0
+            elif status == 'complete':
+                review = payload.get('review') or {}
+                record.update(status='complete', review=review, policy_analysis=payload.get('policy_analysis'),
+                              score=review.get('aggregate', {}).get('weighted_total_100'),
+                              served_by=payload.get('served_by'))
+            elif status == 'validation_failed':
+                record.update(status='rejected', error=payload.get('message'))
+            elif status == 'error' or 'error' in payload:
+                record['error'] = payload.get('message') or payload.get('error')
+        if record['status'] == 'failed' and record['error'] is None:
+            record['error'] = errors[-1] if errors else '评估流程未返回结果'
+    except Exception as e:
+        record['error'] = str(e)
+    record['duration'] = time.monotonic() - started_at
+    return record
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def write_parquet(records, path):
+    try:
+        import pandas as pd
+    except ImportError:
+        sys.exit('写入 Parquet 需要安装 pandas 与 pyarrow：pip install pandas pyarrow')
+    rows = []
+    for record in records:
+        row = dict(record)
+        # 嵌套结构以 JSON 字符串存储
+        for key in ('review', 'policy_analysis', 'rounds', 'served_by'):
+            if row[key] is not None and not isinstance(row[key], str):
+                row[key] = json.dumps(row[key], ensure_ascii=False)
+        rows.append(row)
+    pd.DataFrame(rows).to_parquet(path, index=False)
+
+
+def print_summary(records, wall_time, skipped, args):
+    done = [record for record in records if record['status'] == 'complete']
+    durations = [record['duration'] for record in records]
+    prompt_tokens = sum(record['prompt_tokens'] for record in records)
+    completion_tokens = sum(record['completion_tokens'] for record in records)
+    cost = (prompt_tokens * args.input_price + completion_tokens * args.output_price) / 1e6
+    print(f"\n本次评估 {len(records)} 份（完成 {len(done)}，"
+          f"预校验拒绝 {sum(record['status'] == 'rejected' for record in records)}，"
+          f"失败 {sum(record['status'] == 'failed' for record in records)}），跳过已完成 {skipped} 份")
+    if records:
+        print(f"总耗时 {wall_time:.1f}s，吞吐 {len(records) / wall_time * 60:.1f} 份/分钟，"
+              f"单份耗时 p50 {percentile(durations, 0.5):.1f}s / p95 {percentile(durations, 0.95):.1f}s")
+    print(f"token 用量：输入 {prompt_tokens}，输出 {completion_tokens}"
+          + (f"，估算费用 {cost:.4f}" if args.input_price or args.output_price else ''))
+
+
+def parse_endpoint_rpm(value):
+    endpoint, _, limit = value.rpartition('=')
+    if not endpoint:
+        raise argparse.ArgumentTypeError('格式应为 BASE_URL=每分钟请求数')
+    return endpoint, float(limit)
+
+
+async def run_batch(args, candidates, checkpoint):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    settings = {
+        'api_base': args.api_base, 'api_key': args.api_key, 'api_name': args.model,
+        'policy_api_base': args.policy_api_base, 'policy_api_key': args.policy_api_key,
+        'policy_api_name': args.policy_model, 'use_cache': not args.no_cache,
+        'pipeline': args.pipeline,
+    }
+    records = []
+
+    async def worker(candidate_id, source, read_text):
+        async with semaphore:
+            record = await evaluate_candidate(candidate_id, source, read_text, settings)
+        # 每完成一份立即写入检查点并刷盘，崩溃后重新运行时从此处继续
+        checkpoint.write(safe_json_dumps(record) + '\n')
+        checkpoint.flush()
+        os.fsync(checkpoint.fileno())
+        records.append(record)
+        print(f"[{len(records)}/{len(candidates)}] {candidate_id}: {record['status']}"
+              + (f" 得分 {record['score']}" if record['score'] is not None else '')
+              + (f" {record['error']}" if record['error'] else ''), flush=True)
+
+    await asyncio.gather(*(worker(*candidate) for candidate in candidates))
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help='PDF 目录或 JSONL 文件')
+    parser.add_argument('-o', '--output', required=True, help='结果文件（.jsonl 或 .parquet）')
+    parser.add_argument('--checkpoint', help='检查点文件（默认：输出为 JSONL 时即输出文件，否则为“输出文件.partial.jsonl”）')
+    parser.add_argument('--concurrency', type=int, default=4, help='同时评估的份数')
+    parser.add_argument('--rpm', type=float, default=0, help='每个网关每分钟最多发起的模型请求数（0 不限制）')
+    parser.add_argument('--endpoint-rpm', type=parse_endpoint_rpm, action='append', default=[],
+                        metavar='BASE_URL=RPM', help='单独设置某个网关的请求速率，可重复')
+    parser.add_argument('--api-base', default='')
+    parser.add_argument('--api-key', default='')
+    parser.add_argument('--model', default='', help=f'评估模型（默认 {DEFAULT_MODEL}）')
+    parser.add_argument('--policy-api-base', default='')
+    parser.add_argument('--policy-api-key', default='')
+    parser.add_argument('--policy-model', default='')
+    parser.add_argument('--pipeline', choices=PIPELINES, default=None,
+                        help='评估流程：standard 为第4、5轮分别调用，fused 为一次 JSON 模式调用（默认 EVALUATION_PIPELINE）')
+    parser.add_argument('--no-cache', action='store_true', help='跳过结果缓存，强制重新评估')
+    parser.add_argument('--input-price', type=float, default=0, help='输入 token 单价（每百万 token），用于估算费用')
+    parser.add_argument('--output-price', type=float, default=0, help='输出 token 单价（每百万 token）')
+    args = parser.parse_args()
+
+    parquet = args.output.lower().endswith('.parquet')
+    checkpoint_path = args.checkpoint or (f'{args.output}.partial.jsonl' if parquet else args.output)
+    previous = load_checkpoint(checkpoint_path)
+    candidates = []
+    skipped = 0
+    for candidate_id, source, read_text in iter_candidates(args.source):
+        if previous.get(candidate_id, {}).get('status') in ('complete', 'rejected'):
+            skipped += 1
+        else:
+            candidates.append((candidate_id, source, read_text))
+    print(f"待评估 {len(candidates)} 份，检查点中已完成 {skipped} 份", flush=True)
+
+    if args.rpm or args.endpoint_rpm:
+        app_overseas_young_scholar.upstream_rate_limiter = RateLimiter(args.rpm, dict(args.endpoint_rpm))
+
+    started_at = time.monotonic()
+    with open(checkpoint_path, 'a', encoding='utf-8') as checkpoint:
+        records = asyncio.run(run_batch(args, candidates, checkpoint))
+    print_summary(records, time.monotonic() - started_at, skipped, args)
+
+    if parquet:
+        write_parquet(list(load_checkpoint(checkpoint_path).values()), args.output)
+        print(f"已写入 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
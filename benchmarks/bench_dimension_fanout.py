@@ -0,0 +1,161 @@
+"""第三轮维度拆分基准：对比单次调用评估全部维度与按维度拆分的并行调用
+
+对每份申请材料交替运行两种模式各 --runs 次（逐个顺序执行），报告：
+- 第三轮耗时（第三轮 start 到 complete 事件）与评估总耗时的分位数
+- 第三轮的输入/输出 token（取自 timings 事件中上游报告的用量；拆分模式为五个调用之和）
+- 拆分模式下最慢与最快维度的耗时差（第三轮耗时应接近最慢的单个维度）
+
+默认启动本地模拟上游（叙述输出按请求的 max_tokens 截断）与评估服务：
+  python benchmarks/bench_dimension_fanout.py --output-chars 4000
+  python benchmarks/bench_dimension_fanout.py --url http://127.0.0.1:4091 --proposals proposals.jsonl --json fanout.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from bench_e2e import percentile
+from bench_fused import load_proposals, mean
+from load_test import ROOT, free_port, start_server, wait_for_port
+
+MODES = ('single', 'fanout')
+
+
+async def one_evaluation(client, base_url, proposal_text, mode, api_settings):
+    """运行一次评估，返回第三轮与整体的耗时、第三轮 token 用量"""
+    start = time.monotonic()
+    record = {'mode': mode}
+    round_start = round_end = None
+    body = dict(api_settings, proposal_text=proposal_text, dimension_fanout=mode == 'fanout', use_cache=False)
+    async with client.stream('POST', f'{base_url}/evaluate_stream', json=body) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith('data: '):
+                continue
+            payload = json.loads(line[len('data: '):])
+            status = payload.get('status')
+            if payload.get('round') == 3 and 'sub_round' not in payload:
+                if status == 'start':
+                    round_start = time.monotonic()
+                elif status == 'complete':
+                    round_end = time.monotonic()
+            elif status == 'timings':
+                timings = [t for t in payload.get('timings') or [] if t.get('round') == 3]
+                record['calls'] = len(timings)
+                record['prompt_tokens'] = sum(t.get('prompt_tokens') or 0 for t in timings)
+                record['completion_tokens'] = sum(t.get('completion_tokens') or 0 for t in timings)
+                durations = [t['duration'] for t in timings if t.get('duration') is not None]
+                record['call_spread'] = max(durations) - min(durations) if durations else None
+            elif status == 'complete' and 'review' in payload:
+                record['completed'] = True
+            elif status in ('error', 'validation_failed') or 'error' in payload:
+                raise RuntimeError(payload.get('message') or payload.get('error'))
+    if not record.get('completed') or round_start is None or round_end is None:
+        raise RuntimeError('stream ended without final result')
+    record.update(duration=time.monotonic() - start, round3=round_end - round_start)
+    return record
+
+
+def summarize(records):
+    summary = {}
+    for mode in MODES:
+        items = [r for r in records if r['mode'] == mode]
+        summary[mode] = {
+            'runs': len(items),
+            'round3_p50': percentile([r['round3'] for r in items], 50),
+            'round3_p95': percentile([r['round3'] for r in items], 95),
+            'total_p50': percentile([r['duration'] for r in items], 50),
+            'calls': mean([r.get('calls', 0) for r in items]),
+            'prompt_tokens': mean([r.get('prompt_tokens', 0) for r in items]),
+            'completion_tokens': mean([r.get('completion_tokens', 0) for r in items]),
+            'call_spread': mean([r['call_spread'] for r in items if r.get('call_spread') is not None]),
+        }
+    return summary
+
+
+def print_summary(summary):
+    print(f"{'mode':<8}{'runs':>6}{'第三轮p50':>11}{'第三轮p95':>11}{'总耗时p50':>11}{'调用数':>8}"
+          f"{'输入tok':>10}{'输出tok':>10}")
+    for mode in MODES:
+        s = summary[mode]
+        print(f"{mode:<8}{s['runs']:>6}{s['round3_p50']:>11.2f}{s['round3_p95']:>11.2f}{s['total_p50']:>11.2f}"
+              f"{s['calls']:>8.0f}{s['prompt_tokens']:>10.0f}{s['completion_tokens']:>10.0f}")
+    print(f"拆分模式各维度调用耗时的最大差：{summary['fanout']['call_spread']:.2f}s")
+
+
+async def run(base_url, proposals, runs, api_settings, timeout):
+    records = []
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        for index, proposal_text in enumerate(proposals):
+            for run_index in range(runs):
+                order = MODES if run_index % 2 == 0 else MODES[::-1]
+                for mode in order:
+                    try:
+                        record = await one_evaluation(client, base_url, proposal_text, mode, api_settings)
+                    except Exception as e:
+                        print(f"proposal {index} {mode}: {type(e).__name__}: {e}", file=sys.stderr)
+                        continue
+                    record['proposal'] = index
+                    records.append(record)
+                    print(f"proposal {index} run {run_index} {mode:<7} round3 {record['round3']:.2f}s "
+                          f"total {record['duration']:.2f}s", flush=True)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description='第三轮维度拆分基准（单次调用与并行调用对比）')
+    parser.add_argument('--url', default=None, help='使用已启动的服务，例如 http://127.0.0.1:4091')
+    parser.add_argument('--proposals', default=None, help='JSONL 文件，每行包含 proposal_text（默认使用内置样例）')
+    parser.add_argument('--count', type=int, default=2, help='评估的申请材料份数（--proposals 时 0 表示全部）')
+    parser.add_argument('--runs', type=int, default=2, help='每份材料每种模式的运行次数')
+    parser.add_argument('--mode', choices=['wsgi', 'asgi'], default='wsgi', help='自动启动的服务入口')
+    parser.add_argument('--api-base', default='')
+    parser.add_argument('--api-key', default='')
+    parser.add_argument('--model', default='')
+    parser.add_argument('--timeout', type=float, default=900.0)
+    parser.add_argument('--json', default=None, help='将逐次结果与汇总写入 JSON 文件')
+    # 模拟上游参数：叙述输出按 max_tokens 截断，单次调用的第三轮最多 2000 token，拆分后每个维度最多 800 token
+    parser.add_argument('--tokens-per-second', type=float, default=200.0)
+    parser.add_argument('--ttft', type=float, default=0.5)
+    parser.add_argument('--output-chars', type=int, default=4000)
+    args = parser.parse_args()
+
+    api_settings = {key: value for key, value in
+                    (('api_base', args.api_base), ('api_key', args.api_key), ('api_name', args.model)) if value}
+    proposals = load_proposals(args.proposals, args.count)
+    processes = []
+    try:
+        base_url = args.url
+        if base_url is None:
+            upstream_port = free_port()
+            processes.append(subprocess.Popen(
+                [sys.executable, os.path.join(ROOT, 'benchmarks', 'mock_upstream.py'), '--port', str(upstream_port),
+                 '--tokens-per-second', str(args.tokens_per_second), '--ttft', str(args.ttft),
+                 '--output-chars', str(args.output_chars)],
+                stdout=subprocess.DEVNULL))
+            wait_for_port(upstream_port)
+            port = free_port()
+            processes.append(start_server(args.mode, port, upstream_port))
+            wait_for_port(port)
+            base_url = f'http://127.0.0.1:{port}'
+
+        records = asyncio.run(run(base_url, proposals, args.runs, api_settings, args.timeout))
+        summary = summarize(records)
+        print()
+        print_summary(summary)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump({'args': vars(args), 'summary': summary, 'records': records}, f, ensure_ascii=False, indent=2)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""端到端基准：在本地模拟上游下驱动 /evaluate_stream 与 /extract_pdf，报告延迟分位数、吞吐与各轮耗时
+
+默认启动 benchmarks/mock_upstream.py 与评估服务（子进程），完全离线运行；也可用 --url 压测已启动的服务
+（此时服务需自行指向模拟上游）。每个并发级别发送 --requests 个请求（至少等于并发数），
+/evaluate_stream 的各轮耗时取自该轮 start 与 complete 事件之间的时间。
+
+用法：
+  python benchmarks/bench_e2e.py --concurrency 1 10 50
+  python benchmarks/bench_e2e.py --endpoint extract_pdf --pdf-pages 20 --concurrency 1 8
+  python benchmarks/bench_e2e.py --error-rate 0.05 --empty-stream-models deepseek-r1-search-pro --json before.json
+  python benchmarks/bench_e2e.py --slow-rate 0.05 --slow-ttft 20   # 长尾延迟；配合 LLM_HEDGE_ENABLED=1 对比对冲前后的 p99
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from load_test import PROPOSAL, ROOT, free_port, start_server, wait_for_port
+
+PDF_LINE = "Applicant research experience, publications and future work plan. Line {line} of page {page}."
+
+
+def make_pdf(pages, lines_per_page=40):
+    """生成仅含 ASCII 文本的多页 PDF（手写对象与 xref，不依赖第三方库）"""
+    font_id = 3 + 2 * pages
+    objects = {
+        1: "<< /Type /Catalog /Pages 2 0 R >>",
+        2: "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            ' '.join(f"{3 + 2 * i} 0 R" for i in range(pages)), pages),
+        font_id: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    for i in range(pages):
+        text = ' '.join(f"({PDF_LINE.format(line=line + 1, page=i + 1)}) Tj T*" for line in range(lines_per_page))
+        stream = f"BT /F1 10 Tf 12 TL 50 780 Td {text} ET"
+        objects[3 + 2 * i] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                              f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {4 + 2 * i} 0 R >>")
+        objects[4 + 2 * i] = f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = len(out)
+        out += f"{obj_id} 0 obj\n{objects[obj_id]}\nendobj\n".encode('latin-1')
+    xref = len(out)
+    out += f"xref\n0 {font_id + 1}\n0000000000 65535 f \n".encode('latin-1')
+    for obj_id in range(1, font_id + 1):
+        out += f"{offsets[obj_id]:010d} 00000 n \n".encode('latin-1')
+    out += f"trailer\n<< /Size {font_id + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode('latin-1')
+    return bytes(out)
+
+
+def percentile(values, pct):
+    """最近秩法分位数"""
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+async def one_evaluation(client, base_url, index):
+    """发起一次流式评估，返回 (总耗时, 首个事件耗时, {轮次: 耗时})"""
+    start = time.monotonic()
+    first_event = None
+    round_started = {}
+    round_durations = {}
+    completed = False
+    async with client.stream('POST', f'{base_url}/evaluate_stream',
+                             json={'proposal_text': f'{PROPOSAL}#{index}', 'use_cache': False}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith('data: '):
+                continue
+            now = time.monotonic()
+            if first_event is None:
+                first_event = now - start
+            payload = json.loads(line[len('data: '):])
+            status = payload.get('status')
+            if 'round' in payload:
+                if status == 'start':
+                    round_started[payload['round']] = now
+                elif status == 'complete' and payload['round'] in round_started:
+                    round_durations[payload['round']] = now - round_started[payload['round']]
+            elif status == 'complete':
+                completed = True
+            elif status in ('error', 'validation_failed') or 'error' in payload:
+                raise RuntimeError(payload.get('message') or payload.get('error'))
+    if not completed:
+        raise RuntimeError('stream ended without final result')
+    return time.monotonic() - start, first_event, round_durations
+
+
+async def one_extraction(client, base_url, pdf_bytes):
+    start = time.monotonic()
+    response = await client.post(f'{base_url}/extract_pdf',
+                                 files={'pdf_file': ('bench.pdf', pdf_bytes, 'application/pdf')})
+    response.raise_for_status()
+    if not response.json().get('success'):
+        raise RuntimeError(response.json().get('error'))
+    return time.monotonic() - start, None, {}
+
+
+async def run_level(base_url, endpoint, concurrency, total, timeout, pdf_bytes):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(client, index):
+        async with semaphore:
+            if endpoint == 'extract_pdf':
+                return await one_extraction(client, base_url, pdf_bytes)
+            return await one_evaluation(client, base_url, index)
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        start = time.monotonic()
+        outcomes = await asyncio.gather(*(bounded(client, i) for i in range(total)), return_exceptions=True)
+        wall = time.monotonic() - start
+
+    succeeded = [o for o in outcomes if not isinstance(o, BaseException)]
+    errors = collections.Counter(type(o).__name__ for o in outcomes if isinstance(o, BaseException))
+    latencies = [o[0] for o in succeeded]
+    first_events = [o[1] for o in succeeded if o[1] is not None]
+    rounds = collections.defaultdict(list)
+    for _, _, durations in succeeded:
+        for round_num, duration in durations.items():
+            rounds[round_num].append(duration)
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': total,
+        'ok': len(succeeded),
+        'failed': total - len(succeeded),
+        'wall': wall,
+        'throughput': len(succeeded) / wall if wall else 0.0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'first_event_p50': percentile(first_events, 50),
+        'rounds': {str(round_num): {'p50': percentile(values, 50), 'p95': percentile(values, 95)}
+                   for round_num, values in sorted(rounds.items())},
+        'errors': dict(errors),
+    }
+
+
+def print_result(r):
+    print(f"{r['endpoint']:<16}{r['concurrency']:>6}{r['requests']:>6}{r['ok']:>6}{r['failed']:>6}"
+          f"{r['p50']:>9.2f}{r['p95']:>9.2f}{r['p99']:>9.2f}{r['throughput']:>9.2f}"
+          + (f"  errors: {r['errors']}" if r['errors'] else ''))
+    for round_num, timing in r['rounds'].items():
+        print(f"{'':<16}round {round_num}: p50 {timing['p50']:.2f}s  p95 {timing['p95']:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='端到端基准（本地模拟上游）')
+    parser.add_argument('--endpoint', nargs='+', choices=['evaluate_stream', 'extract_pdf'],
+                        default=['evaluate_stream', 'extract_pdf'])
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 10, 50])
+    parser.add_argument('--requests', type=int, default=0, help='每个并发级别的请求数（默认等于并发数）')
+    parser.add_argument('--mode', choices=['wsgi', 'asgi'], default='wsgi', help='自动启动的服务入口')
+    parser.add_argument('--url', default=None, help='压测已启动的服务，例如 http://127.0.0.1:4091')
+    parser.add_argument('--pdf-pages', type=int, default=10)
+    parser.add_argument('--timeout', type=float, default=300.0)
+    parser.add_argument('--json', default=None, help='将结果写入 JSON 文件，便于优化前后对比')
+    # 模拟上游参数
+    parser.add_argument('--tokens-per-second', type=float, default=50.0)
+    parser.add_argument('--ttft', type=float, default=0.5)
+    parser.add_argument('--chunk-chars', type=int, default=2)
+    parser.add_argument('--output-chars', type=int, default=600)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--stream-error-rate', type=float, default=0.0)
+    parser.add_argument('--empty-stream-models', default='')
+    parser.add_argument('--slow-rate', type=float, default=0.0)
+    parser.add_argument('--slow-ttft', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    pdf_bytes = make_pdf(args.pdf_pages)
+    processes = []
+    try:
+        base_url = args.url
+        if base_url is None:
+            upstream_port = free_port()
+            processes.append(subprocess.Popen(
+                [sys.executable, os.path.join(ROOT, 'benchmarks', 'mock_upstream.py'), '--port', str(upstream_port),
+                 '--tokens-per-second', str(args.tokens_per_second), '--ttft', str(args.ttft),
+                 '--chunk-chars', str(args.chunk_chars), '--output-chars', str(args.output_chars),
+                 '--error-rate', str(args.error_rate), '--stream-error-rate', str(args.stream_error_rate),
+                 '--empty-stream-models', args.empty_stream_models, '--seed', str(args.seed),
+                 '--slow-rate', str(args.slow_rate), '--slow-ttft', str(args.slow_ttft)],
+                stdout=subprocess.DEVNULL))
+            wait_for_port(upstream_port)
+            port = free_port()
+            processes.append(start_server(args.mode, port, upstream_port))
+            wait_for_port(port)
+            base_url = f'http://127.0.0.1:{port}'
+
+        print(f"{'endpoint':<16}{'conc':>6}{'reqs':>6}{'ok':>6}{'fail':>6}"
+              f"{'p50(s)':>9}{'p95(s)':>9}{'p99(s)':>9}{'req/s':>9}")
+        results = []
+        for endpoint in args.endpoint:
+            for concurrency in args.concurrency:
+                total = max(concurrency, args.requests)
+                result = asyncio.run(run_level(base_url, endpoint, concurrency, total, args.timeout, pdf_bytes))
+                print_result(result)
+                results.append(result)
+
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump({'args': vars(args), 'results': results}, f, ensure_ascii=False, indent=2)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
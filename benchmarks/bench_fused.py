@@ -0,0 +1,216 @@
+"""融合流程基准：对比 standard（第4、5轮分别调用）与 fused（一次 JSON 模式调用）的延迟、token 用量与评分一致性
+
+对每份申请材料交替运行两种流程各 --runs 次（逐个顺序执行，避免相互排队影响延迟），报告：
+- 总耗时与首个评分项（score 事件）到达时间的分位数
+- 全部轮次与第4、5轮的输入/输出 token（取自 timings 事件中上游报告的用量）
+- 评分一致性：同一材料 standard 与 fused 结果的总分平均绝对差、各维度分数相同/相差不超过 1 分的比例；
+  runs >= 2 时同时给出 standard 两次运行之间的一致性，作为模型自身波动的基线
+- fused 请求实际回退为两轮流程的次数（网关不支持 JSON 模式或未按 JSON 输出）
+
+默认启动本地模拟上游与评估服务（模拟上游的评分固定，只能验证流程与 token 开销）；评分一致性需对真实模型运行：
+  python benchmarks/bench_fused.py --url http://127.0.0.1:4091 --proposals proposals.jsonl --runs 3 --json fused.json
+  python benchmarks/bench_fused.py --no-json-mode   # 模拟不支持 JSON 模式的网关，验证回退
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from bench_e2e import percentile
+from load_test import PROPOSAL, ROOT, free_port, start_server, wait_for_port
+
+PIPELINES = ('standard', 'fused')
+
+
+async def one_evaluation(client, base_url, proposal_text, pipeline, api_settings):
+    """运行一次评估，返回耗时、token 用量、评分与服务路径"""
+    start = time.monotonic()
+    first_score = None
+    record = {'pipeline': pipeline}
+    body = dict(api_settings, proposal_text=proposal_text, pipeline=pipeline, use_cache=False)
+    async with client.stream('POST', f'{base_url}/evaluate_stream', json=body) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith('data: '):
+                continue
+            payload = json.loads(line[len('data: '):])
+            status = payload.get('status')
+            if status == 'score' and first_score is None:
+                first_score = time.monotonic() - start
+            elif status == 'timings':
+                timings = payload.get('timings') or []
+                record['prompt_tokens'] = sum(t.get('prompt_tokens') or 0 for t in timings)
+                record['completion_tokens'] = sum(t.get('completion_tokens') or 0 for t in timings)
+                late = [t for t in timings if t.get('round') in (4, 5)]
+                record['final_prompt_tokens'] = sum(t.get('prompt_tokens') or 0 for t in late)
+                record['final_completion_tokens'] = sum(t.get('completion_tokens') or 0 for t in late)
+            elif status == 'complete' and 'review' in payload:
+                review = payload['review']
+                record['scores'] = {item['dimension']: item['score_1_to_5'] for item in review.get('scores') or []}
+                record['total'] = (review.get('aggregate') or {}).get('weighted_total_100')
+                record['round4_path'] = ((payload.get('served_by') or {}).get('4') or {}).get('path')
+            elif status in ('error', 'validation_failed') or 'error' in payload:
+                raise RuntimeError(payload.get('message') or payload.get('error'))
+    if 'scores' not in record:
+        raise RuntimeError('stream ended without final result')
+    record.update(duration=time.monotonic() - start, first_score=first_score)
+    return record
+
+
+def agreement(pairs):
+    """[(结果A, 结果B)] 的评分一致性"""
+    total_diffs = []
+    exact = within_one = dimensions = 0
+    for a, b in pairs:
+        if isinstance(a.get('total'), (int, float)) and isinstance(b.get('total'), (int, float)):
+            total_diffs.append(abs(a['total'] - b['total']))
+        for dimension in a['scores'].keys() & b['scores'].keys():
+            diff = abs(a['scores'][dimension] - b['scores'][dimension])
+            dimensions += 1
+            exact += diff == 0
+            within_one += diff <= 1
+    return {
+        'pairs': len(pairs),
+        'total_mae': sum(total_diffs) / len(total_diffs) if total_diffs else float('nan'),
+        'dimension_exact': exact / dimensions if dimensions else float('nan'),
+        'dimension_within_1': within_one / dimensions if dimensions else float('nan'),
+    }
+
+
+def mean(values):
+    return sum(values) / len(values) if values else float('nan')
+
+
+def summarize(records):
+    by_pipeline = {pipeline: [r for r in records if r['pipeline'] == pipeline] for pipeline in PIPELINES}
+    summary = {}
+    for pipeline, items in by_pipeline.items():
+        durations = [r['duration'] for r in items]
+        first_scores = [r['first_score'] for r in items if r['first_score'] is not None]
+        summary[pipeline] = {
+            'runs': len(items),
+            'p50': percentile(durations, 50),
+            'p95': percentile(durations, 95),
+            'first_score_p50': percentile(first_scores, 50),
+            'prompt_tokens': mean([r.get('prompt_tokens', 0) for r in items]),
+            'completion_tokens': mean([r.get('completion_tokens', 0) for r in items]),
+            'final_prompt_tokens': mean([r.get('final_prompt_tokens', 0) for r in items]),
+            'final_completion_tokens': mean([r.get('final_completion_tokens', 0) for r in items]),
+        }
+    summary['fused']['fallbacks'] = sum(r['round4_path'] != 'fused' for r in by_pipeline['fused'])
+
+    grouped = {}
+    for r in records:
+        grouped.setdefault((r['proposal'], r['pipeline']), []).append(r)
+    cross, baseline = [], []
+    for (proposal, pipeline), items in grouped.items():
+        if pipeline != 'standard':
+            continue
+        cross.extend(zip(items, grouped.get((proposal, 'fused'), [])))
+        baseline.extend(itertools.combinations(items, 2))
+    summary['agreement'] = {'standard_vs_fused': agreement(cross)}
+    if baseline:
+        summary['agreement']['standard_vs_standard'] = agreement(baseline)
+    return summary
+
+
+def print_summary(summary):
+    print(f"{'pipeline':<10}{'runs':>6}{'p50(s)':>9}{'p95(s)':>9}{'首评分p50':>11}"
+          f"{'输入tok':>10}{'输出tok':>10}{'4-5轮输入':>11}{'4-5轮输出':>11}")
+    for pipeline in PIPELINES:
+        s = summary[pipeline]
+        print(f"{pipeline:<10}{s['runs']:>6}{s['p50']:>9.2f}{s['p95']:>9.2f}{s['first_score_p50']:>11.2f}"
+              f"{s['prompt_tokens']:>10.0f}{s['completion_tokens']:>10.0f}"
+              f"{s['final_prompt_tokens']:>11.0f}{s['final_completion_tokens']:>11.0f}")
+    print(f"fused 回退为两轮流程：{summary['fused']['fallbacks']} 次")
+    for name, a in summary['agreement'].items():
+        print(f"评分一致性 {name}（{a['pairs']} 对）：总分平均绝对差 {a['total_mae']:.2f}，"
+              f"维度分数相同 {a['dimension_exact']:.0%}，相差不超过 1 分 {a['dimension_within_1']:.0%}")
+
+
+def load_proposals(path, count):
+    if path is None:
+        return [f'{PROPOSAL}#{index}' for index in range(count)]
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line)['proposal_text'] for line in f if line.strip()][:count or None]
+
+
+async def run(base_url, proposals, runs, api_settings, timeout):
+    records = []
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        for index, proposal_text in enumerate(proposals):
+            for run_index in range(runs):
+                # 交替先后顺序，抵消上游缓存预热等顺序效应
+                order = PIPELINES if run_index % 2 == 0 else PIPELINES[::-1]
+                for pipeline in order:
+                    try:
+                        record = await one_evaluation(client, base_url, proposal_text, pipeline, api_settings)
+                    except Exception as e:
+                        print(f"proposal {index} {pipeline}: {type(e).__name__}: {e}", file=sys.stderr)
+                        continue
+                    record['proposal'] = index
+                    records.append(record)
+                    print(f"proposal {index} run {run_index} {pipeline:<8} {record['duration']:.2f}s "
+                          f"total {record['total']} round4 {record['round4_path']}", flush=True)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description='融合流程基准（standard 与 fused 对比）')
+    parser.add_argument('--url', default=None, help='使用已启动的服务，例如 http://127.0.0.1:4091')
+    parser.add_argument('--proposals', default=None, help='JSONL 文件，每行包含 proposal_text（默认使用内置样例）')
+    parser.add_argument('--count', type=int, default=3, help='评估的申请材料份数（--proposals 时 0 表示全部）')
+    parser.add_argument('--runs', type=int, default=2, help='每份材料每种流程的运行次数')
+    parser.add_argument('--mode', choices=['wsgi', 'asgi'], default='wsgi', help='自动启动的服务入口')
+    parser.add_argument('--api-base', default='')
+    parser.add_argument('--api-key', default='')
+    parser.add_argument('--model', default='')
+    parser.add_argument('--timeout', type=float, default=900.0)
+    parser.add_argument('--json', default=None, help='将逐次结果与汇总写入 JSON 文件')
+    # 模拟上游参数
+    parser.add_argument('--tokens-per-second', type=float, default=50.0)
+    parser.add_argument('--ttft', type=float, default=0.5)
+    parser.add_argument('--output-chars', type=int, default=600)
+    parser.add_argument('--no-json-mode', action='store_true', help='模拟上游拒绝 response_format')
+    args = parser.parse_args()
+
+    api_settings = {key: value for key, value in
+                    (('api_base', args.api_base), ('api_key', args.api_key), ('api_name', args.model)) if value}
+    proposals = load_proposals(args.proposals, args.count)
+    processes = []
+    try:
+        base_url = args.url
+        if base_url is None:
+            upstream_port = free_port()
+            processes.append(subprocess.Popen(
+                [sys.executable, os.path.join(ROOT, 'benchmarks', 'mock_upstream.py'), '--port', str(upstream_port),
+                 '--tokens-per-second', str(args.tokens_per_second), '--ttft', str(args.ttft),
+                 '--output-chars', str(args.output_chars)] + (['--no-json-mode'] if args.no_json_mode else []),
+                stdout=subprocess.DEVNULL))
+            wait_for_port(upstream_port)
+            port = free_port()
+            processes.append(start_server(args.mode, port, upstream_port))
+            wait_for_port(port)
+            base_url = f'http://127.0.0.1:{port}'
+
+        records = asyncio.run(run(base_url, proposals, args.runs, api_settings, args.timeout))
+        summary = summarize(records)
+        print()
+        print_summary(summary)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump({'args': vars(args), 'summary': summary, 'records': records}, f, ensure_ascii=False, indent=2)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
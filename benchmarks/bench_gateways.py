@@ -0,0 +1,207 @@
+"""多网关负载均衡基准：启动多个延迟不同的本地模拟上游，对比单网关、网关池、网关中途宕机与固定路由
+
+场景（每个场景单独启动一次评估服务）：
+- single：不配置网关池，全部轮次发往慢速网关（改造前只能指向一个网关时的情形）
+- pool：main / structured / policy 三个角色都配置 快速、慢速、故障（全部返回 HTTP 500）三个上游
+- outage：网关池为 快速、慢速 两个上游，提交一半评估后停止快速网关，其余评估应由慢速网关接替并全部完成
+- pinned：配置同 pool，但请求体指定 api_base 为慢速网关，全部调用应固定发往该网关
+报告每个场景的完成/失败数、耗时分位数、各上游承担的调用比例、各轮的服务路径（primary / failover / watchdog 等）
+与 /metrics 中的熔断次数。
+
+  python benchmarks/bench_gateways.py
+  python benchmarks/bench_gateways.py --evaluations 24 --concurrency 8 --scenarios pool,outage --json gateways.json
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+import httpx
+
+from bench_e2e import percentile
+from bench_fused import load_proposals
+from load_test import ROOT, free_port, start_server, wait_for_port
+
+SCENARIOS = ('single', 'pool', 'outage', 'pinned')
+
+
+def start_mock(port, ttft, tokens_per_second, output_chars, error_rate=0.0):
+    return subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'benchmarks', 'mock_upstream.py'), '--port', str(port),
+         '--tokens-per-second', str(tokens_per_second), '--ttft', str(ttft), '--output-chars', str(output_chars),
+         '--error-rate', str(error_rate)],
+        stdout=subprocess.DEVNULL)
+
+
+async def one_evaluation(client, base_url, proposal_text, body):
+    """运行一次评估，返回耗时与 timings 事件中各轮的上游与服务路径"""
+    start = time.monotonic()
+    record = {'calls': [], 'completed': False, 'round_errors': 0}
+    async with client.stream('POST', f'{base_url}/evaluate_stream', json=dict(body, proposal_text=proposal_text)) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith('data: '):
+                continue
+            payload = json.loads(line[len('data: '):])
+            status = payload.get('status')
+            if status == 'timings':
+                record['calls'] = [(t.get('endpoint'), t.get('path'), t.get('status')) for t in payload.get('timings') or []]
+            elif status == 'complete' and 'review' in payload:
+                record['completed'] = True
+            elif status == 'error' and 'round' in payload:
+                # 单轮出错（如上游在流式输出中途断开）不一定导致评估失败
+                record['round_errors'] += 1
+            elif status in ('error', 'validation_failed') or 'error' in payload:
+                record['error'] = payload.get('message') or payload.get('error')
+    record['duration'] = time.monotonic() - start
+    return record
+
+
+async def run_scenario(base_url, proposals, concurrency, body, timeout, midway=None):
+    """按 concurrency 并发提交全部评估；midway 在提交一半后调用（用于停止某个上游）"""
+    semaphore = asyncio.Semaphore(concurrency)
+    records = []
+
+    async def worker(index, proposal_text):
+        async with semaphore:
+            try:
+                record = await one_evaluation(client, base_url, proposal_text, body)
+            except Exception as e:
+                record = {'calls': [], 'completed': False, 'round_errors': 0, 'error': f'{type(e).__name__}: {e}',
+                          'duration': None}
+        record['index'] = index
+        records.append(record)
+        print(f"  #{index:<3} {'ok    ' if record['completed'] else 'failed'} "
+              f"{record['duration'] or 0:6.2f}s 出错轮次 {record['round_errors']} {record.get('error') or ''}", flush=True)
+
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        half = len(proposals) // 2
+        tasks = [asyncio.ensure_future(worker(index, text)) for index, text in enumerate(proposals[:half])]
+        if midway is not None:
+            # 等第一批开始执行后再触发，使宕机发生在评估流程中途
+            await asyncio.sleep(1.0)
+            midway()
+        tasks += [asyncio.ensure_future(worker(half + index, text)) for index, text in enumerate(proposals[half:])]
+        await asyncio.gather(*tasks)
+    return records
+
+
+def scrape_trips(base_url):
+    """/metrics 中各上游的熔断次数 {endpoint: 次数}"""
+    text = httpx.get(f'{base_url}/metrics', timeout=10).text
+    trips = {}
+    for endpoint, value in re.findall(r'benzieval_gateway_circuit_trips_total\{endpoint="([^"]+)",[^}]*\} (\S+)', text):
+        trips[endpoint] = trips.get(endpoint, 0) + float(value)
+    return trips
+
+
+def summarize(records, names, trips):
+    durations = [r['duration'] for r in records if r['completed']]
+    endpoints = collections.Counter()
+    paths = collections.Counter()
+    for record in records:
+        for endpoint, path, _ in record['calls']:
+            endpoints[names.get((endpoint or '').rstrip('/'), endpoint)] += 1
+            paths[path] += 1
+    calls = sum(endpoints.values())
+    return {
+        'completed': len(durations),
+        'failed': len(records) - len(durations),
+        'p50': percentile(durations, 50) if durations else None,
+        'p95': percentile(durations, 95) if durations else None,
+        'calls': calls,
+        'round_errors': sum(r['round_errors'] for r in records),
+        'share': {name: count / calls for name, count in endpoints.most_common()} if calls else {},
+        'paths': dict(paths),
+        'trips': {names.get(endpoint.rstrip('/'), endpoint): count for endpoint, count in trips.items() if count},
+    }
+
+
+def print_summary(summary):
+    print(f"{'scenario':<9}{'完成':>6}{'失败':>6}{'出错轮次':>8}{'p50':>8}{'p95':>8}  上游调用占比 / 服务路径 / 熔断次数")
+    for scenario, s in summary.items():
+        p50 = f"{s['p50']:.2f}" if s['p50'] is not None else '-'
+        p95 = f"{s['p95']:.2f}" if s['p95'] is not None else '-'
+        share = ' '.join(f"{name} {value:.0%}" for name, value in s['share'].items())
+        print(f"{scenario:<9}{s['completed']:>6}{s['failed']:>6}{s['round_errors']:>8}{p50:>8}{p95:>8}  "
+              f"{share} / {s['paths']} / {s['trips'] or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多网关负载均衡基准（多个延迟不同的模拟上游）')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"逗号分隔，可选 {', '.join(SCENARIOS)}")
+    parser.add_argument('--evaluations', type=int, default=12, help='每个场景的评估份数')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--proposals', default=None, help='JSONL 文件，每行包含 proposal_text（默认使用内置样例）')
+    parser.add_argument('--mode', choices=['wsgi', 'asgi'], default='wsgi', help='自动启动的服务入口')
+    parser.add_argument('--timeout', type=float, default=900.0)
+    parser.add_argument('--json', default=None, help='将汇总写入 JSON 文件')
+    # 模拟上游参数
+    parser.add_argument('--fast-ttft', type=float, default=0.2)
+    parser.add_argument('--fast-tokens-per-second', type=float, default=400.0)
+    parser.add_argument('--slow-ttft', type=float, default=1.5)
+    parser.add_argument('--slow-tokens-per-second', type=float, default=80.0)
+    parser.add_argument('--output-chars', type=int, default=400)
+    args = parser.parse_args()
+
+    scenarios = [name for name in args.scenarios.split(',') if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    proposals = load_proposals(args.proposals, args.evaluations)
+    summary = {}
+    for scenario in scenarios:
+        mocks = {}
+        server = None
+        try:
+            ports = {name: free_port() for name in ('fast', 'slow', 'broken')}
+            mocks['fast'] = start_mock(ports['fast'], args.fast_ttft, args.fast_tokens_per_second, args.output_chars)
+            mocks['slow'] = start_mock(ports['slow'], args.slow_ttft, args.slow_tokens_per_second, args.output_chars)
+            mocks['broken'] = start_mock(ports['broken'], args.fast_ttft, args.fast_tokens_per_second, args.output_chars,
+                                         error_rate=1.0)
+            for port in ports.values():
+                wait_for_port(port)
+            urls = {name: f'http://127.0.0.1:{port}/v1' for name, port in ports.items()}
+            names = {url: name for name, url in urls.items()}
+
+            members = ('fast', 'slow') if scenario == 'outage' else ('fast', 'slow', 'broken')
+            extra_env = {'LLM_BREAKER_COOLDOWN': '60'}
+            if scenario != 'single':
+                pool = [{'base_url': urls[name]} for name in members]
+                extra_env['LLM_GATEWAYS'] = json.dumps({'main': pool, 'structured': pool,
+                                                        'policy': [{'base_url': urls[name]} for name in members]})
+            port = free_port()
+            # 默认网关（未配置网关池的角色与 single 场景）为慢速网关
+            server = start_server(args.mode, port, ports['slow'], extra_env)
+            wait_for_port(port)
+            base_url = f'http://127.0.0.1:{port}'
+
+            body = {'api_base': urls['slow'], 'api_key': 'mock'} if scenario == 'pinned' else {}
+            midway = None
+            if scenario == 'outage':
+                def midway():
+                    print('  停止快速网关', flush=True)
+                    mocks['fast'].terminate()
+            print(f"{scenario}:", flush=True)
+            records = asyncio.run(run_scenario(base_url, proposals, args.concurrency, body, args.timeout, midway))
+            summary[scenario] = summarize(records, names, scrape_trips(base_url))
+        finally:
+            for process in [server, *mocks.values()]:
+                if process is not None:
+                    process.terminate()
+                    process.wait()
+
+    print()
+    print_summary(summary)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'summary': summary}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""近似重复检测基准：索引规模下的查询延迟、修改后材料的召回率与端到端节省的上游调用
+
+索引部分（不需要服务）：
+- 用随机签名（相当于互不相关的材料）把索引填充到 --entries 条，报告登记吞吐与查询延迟的分位数；
+- 登记 --proposals 份合成申请材料，对每份按不同比例改写段落后查询，报告召回率与估算相似度；
+  另查询同样数量的全新材料，报告误报率。
+端到端部分（--e2e）：启动本地模拟上游与评估服务，先完整评估一份材料，再分别以 off / partial / reuse
+提交改写过一个段落的版本，报告各自的耗时与上游调用次数。
+
+  python benchmarks/bench_near_duplicates.py --entries 100000
+  python benchmarks/bench_near_duplicates.py --entries 20000 --path /tmp/near.db --e2e --json near.json
+"""
+import argparse
+import array
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_e2e import percentile  # noqa: E402
+from load_test import ROOT, free_port, start_server, wait_for_port  # noqa: E402
+from near_duplicates import NearDuplicateIndex  # noqa: E402
+from prompts import DIMENSION_KEYWORDS  # noqa: E402
+
+# 合成材料的字表：常用汉字区段内的随机字，避免 load_test 样例那样的大段重复（重复文本的 shingle 很少）
+VOCAB = [chr(code) for code in range(0x4E00, 0x4E00 + 3000)]
+EDIT_FRACTIONS = (0.0, 0.05, 0.1, 0.2, 0.3, 0.5)
+
+
+def synthetic_proposal(rng, paragraphs=30, length=120):
+    """合成申请材料：每段以某一维度的关键词开头，后接随机汉字"""
+    lines = ['申请人博士毕业于海外知名大学，现任助理教授，发表论文二十余篇。']
+    for index in range(paragraphs):
+        keywords = DIMENSION_KEYWORDS[index % len(DIMENSION_KEYWORDS)]
+        lines.append(rng.choice(keywords) + ''.join(rng.choice(VOCAB) for _ in range(length)))
+    return '\n'.join(lines)
+
+
+def edit_proposal(text, fraction, rng):
+    """改写 fraction 比例的段落（保留段首关键词，正文换成新的随机字）"""
+    lines = text.split('\n')
+    count = round((len(lines) - 1) * fraction)
+    for index in rng.sample(range(1, len(lines)), count):
+        keyword_length = len(lines[index]) - 120
+        lines[index] = lines[index][:keyword_length] + ''.join(rng.choice(VOCAB) for _ in range(120))
+    return '\n'.join(lines)
+
+
+def bench_index(args, rng):
+    index = NearDuplicateIndex(args.path, threshold=args.threshold, max_entries=args.entries + args.proposals + 1)
+    summary = {'bands': index.bands, 'rows': index.rows}
+
+    start = time.perf_counter()
+    filler = args.entries - len(index)
+    for position in range(max(0, filler)):
+        signature = array.array('I', (rng.getrandbits(32) for _ in range(index.hasher.num_perm)))
+        index.add_signature(f'filler-{position}', signature, meta={'filler': True})
+    elapsed = time.perf_counter() - start
+    summary['entries'] = len(index)
+    summary['insert_per_second'] = filler / elapsed if filler > 0 else None
+    print(f"索引 {len(index)} 条（LSH {index.bands}×{index.rows}），登记 {max(0, filler)} 条用时 {elapsed:.1f}s", flush=True)
+
+    proposals = [synthetic_proposal(rng) for _ in range(args.proposals)]
+    signature_times = []
+    for number, text in enumerate(proposals):
+        start = time.perf_counter()
+        index.add(f'proposal-{number}', text, {'number': number}, DIMENSION_KEYWORDS)
+        signature_times.append(time.perf_counter() - start)
+    summary['add_p50_ms'] = percentile(signature_times, 50) * 1000
+
+    recall = {}
+    latencies = []
+    for fraction in EDIT_FRACTIONS:
+        found = 0
+        similarities = []
+        for number, text in enumerate(proposals):
+            variant = edit_proposal(text, fraction, rng)
+            start = time.perf_counter()
+            match = index.query(variant, DIMENSION_KEYWORDS)
+            latencies.append(time.perf_counter() - start)
+            if match is not None and match['key'] == f'proposal-{number}':
+                found += 1
+                similarities.append(match['similarity'])
+        recall[str(fraction)] = {
+            'recall': found / len(proposals),
+            'similarity_mean': sum(similarities) / len(similarities) if similarities else None,
+        }
+    false_positives = 0
+    for _ in range(args.proposals):
+        start = time.perf_counter()
+        match = index.query(synthetic_proposal(rng), DIMENSION_KEYWORDS)
+        latencies.append(time.perf_counter() - start)
+        false_positives += match is not None
+    summary.update(
+        query_p50_ms=percentile(latencies, 50) * 1000,
+        query_p99_ms=percentile(latencies, 99) * 1000,
+        recall=recall,
+        false_positive_rate=false_positives / args.proposals,
+    )
+    return summary
+
+
+def print_index_summary(summary):
+    print(f"登记一份材料（签名 + 段落指纹 + 写入）p50 {summary['add_p50_ms']:.1f}ms")
+    print(f"查询 p50 {summary['query_p50_ms']:.1f}ms  p99 {summary['query_p99_ms']:.1f}ms（索引 {summary['entries']} 条）")
+    print(f"{'改写段落比例':<10}{'召回率':>8}{'平均估算相似度':>16}")
+    for fraction, item in summary['recall'].items():
+        similarity = item['similarity_mean']
+        print(f"{float(fraction):<14.0%}{item['recall']:>8.0%}{similarity if similarity is not None else float('nan'):>16.3f}")
+    print(f"全新材料误报率 {summary['false_positive_rate']:.1%}")
+
+
+async def one_evaluation(client, base_url, proposal_text, mode):
+    """运行一次评估，返回耗时、上游调用次数与近似重复事件"""
+    start = time.monotonic()
+    record = {'mode': mode}
+    body = {'proposal_text': proposal_text, 'near_duplicate': mode}
+    async with client.stream('POST', f'{base_url}/evaluate_stream', json=body) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith('data: '):
+                continue
+            payload = json.loads(line[len('data: '):])
+            status = payload.get('status')
+            if status == 'near_duplicate':
+                record['reused'] = payload['reused']
+                record['reused_dimensions'] = payload['reused_dimensions']
+                record['similarity'] = payload['similarity']
+            elif status == 'timings':
+                record['upstream_calls'] = len(payload.get('timings') or [])
+            elif status == 'complete' and 'review' in payload:
+                record['cache'] = payload.get('cache')
+            elif status in ('error', 'validation_failed') or 'error' in payload:
+                raise RuntimeError(payload.get('message') or payload.get('error'))
+    record['duration'] = time.monotonic() - start
+    return record
+
+
+async def run_e2e(base_url, rng, timeout):
+    records = []
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        for mode in ('off', 'partial', 'reuse'):
+            # 每种方式各用一份新材料：先完整评估原稿，再提交改写了一个段落的版本
+            original = synthetic_proposal(rng)
+            await one_evaluation(client, base_url, original, 'off')
+            lines = original.split('\n')
+            lines[1] = lines[1][:-20] + ''.join(rng.choice(VOCAB) for _ in range(20))
+            record = await one_evaluation(client, base_url, '\n'.join(lines), mode)
+            records.append(record)
+            print(f"{mode:<8} {record['duration']:.2f}s 上游调用 {record.get('upstream_calls')} "
+                  f"复用 {record.get('reused', [])} 维度 {record.get('reused_dimensions', [])}", flush=True)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description='近似重复检测基准（索引查询延迟、召回率与端到端复用）')
+    parser.add_argument('--entries', type=int, default=100000, help='索引填充到的记录数')
+    parser.add_argument('--proposals', type=int, default=50, help='用于召回率测试的合成材料份数')
+    parser.add_argument('--threshold', type=float, default=0.6)
+    parser.add_argument('--path', default=None, help='索引的 SQLite 路径（默认内存；已存在时在其基础上补足记录）')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--e2e', action='store_true', help='同时运行端到端对比（启动模拟上游与评估服务）')
+    parser.add_argument('--mode', choices=['wsgi', 'asgi'], default='wsgi', help='端到端对比自动启动的服务入口')
+    parser.add_argument('--timeout', type=float, default=900.0)
+    parser.add_argument('--json', default=None, help='将汇总写入 JSON 文件')
+    # 模拟上游参数
+    parser.add_argument('--tokens-per-second', type=float, default=200.0)
+    parser.add_argument('--ttft', type=float, default=0.3)
+    parser.add_argument('--output-chars', type=int, default=600)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    summary = {'index': bench_index(args, rng)}
+    print()
+    print_index_summary(summary['index'])
+
+    if args.e2e:
+        processes = []
+        try:
+            upstream_port = free_port()
+            processes.append(subprocess.Popen(
+                [sys.executable, os.path.join(ROOT, 'benchmarks', 'mock_upstream.py'), '--port', str(upstream_port),
+                 '--tokens-per-second', str(args.tokens_per_second), '--ttft', str(args.ttft),
+                 '--output-chars', str(args.output_chars)],
+                stdout=subprocess.DEVNULL))
+            wait_for_port(upstream_port)
+            port = free_port()
+            # 近似重复复用依赖结果缓存；按维度拆分第三轮，partial 模式可以只重跑受修改影响的维度
+            processes.append(start_server(args.mode, port, upstream_port,
+                                          {'RESULT_CACHE_ENABLED': '1', 'DIMENSION_FANOUT': '1'}))
+            wait_for_port(port)
+            print()
+            summary['e2e'] = asyncio.run(run_e2e(f'http://127.0.0.1:{port}', rng, args.timeout))
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                process.wait()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'summary': summary}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
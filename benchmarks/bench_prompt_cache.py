@@ -0,0 +1,150 @@
+"""前缀缓存基准：依次评估多份不同的申请材料，按轮次报告上游前缀缓存命中的提示 token 比例与首 token 时间
+
+提示词模板把静态要求放在前面、本次请求的内容放在最后，第一份材料之后各轮的静态前缀应命中上游缓存。
+默认启动本地模拟上游（按 64 字符分块模拟前缀缓存，--prefill-tokens-per-second 模拟预填充耗时）与评估服务；
+对真实网关运行时命中数取自上游 usage（DeepSeek 的 prompt_cache_hit_tokens 或 OpenAI 的 cached_tokens）：
+  python benchmarks/bench_prompt_cache.py --count 5
+  python benchmarks/bench_prompt_cache.py --url http://127.0.0.1:4091 --proposals proposals.jsonl --json cache.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+import httpx
+
+from bench_e2e import percentile
+from bench_fused import load_proposals
+from load_test import PROPOSAL, ROOT, free_port, start_server, wait_for_port
+
+
+async def one_evaluation(client, base_url, proposal_text, api_settings):
+    """运行一次评估，返回 timings 事件中的各轮记录"""
+    body = dict(api_settings, proposal_text=proposal_text, use_cache=False)
+    timings = None
+    async with client.stream('POST', f'{base_url}/evaluate_stream', json=body) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith('data: '):
+                continue
+            payload = json.loads(line[len('data: '):])
+            if payload.get('status') == 'timings':
+                timings = payload.get('timings') or []
+            elif payload.get('status') in ('error', 'validation_failed') or 'error' in payload:
+                raise RuntimeError(payload.get('message') or payload.get('error'))
+    if timings is None:
+        raise RuntimeError('stream ended without timings')
+    return timings
+
+
+def summarize(runs):
+    """按轮次汇总：冷启动（第一份材料）与之后各份的命中比例、首 token 时间"""
+    summary = {}
+    for phase, items in (('cold', runs[:1]), ('warm', runs[1:])):
+        rounds = {}
+        for timings in items:
+            for timing in timings:
+                entry = rounds.setdefault(str(timing['round']), {'prompt': 0, 'cached': 0, 'ttft': []})
+                entry['prompt'] += timing.get('prompt_tokens') or 0
+                entry['cached'] += timing.get('cached_tokens') or 0
+                if timing.get('ttft') is not None:
+                    entry['ttft'].append(timing['ttft'])
+        summary[phase] = {
+            round_label: {
+                'prompt_tokens': entry['prompt'],
+                'cached_tokens': entry['cached'],
+                'hit_ratio': entry['cached'] / entry['prompt'] if entry['prompt'] else float('nan'),
+                'ttft_p50': percentile(entry['ttft'], 50),
+            }
+            for round_label, entry in sorted(rounds.items())
+        }
+    return summary
+
+
+def print_summary(summary):
+    for phase, rounds in summary.items():
+        if not rounds:
+            continue
+        print(f"[{phase}] {'round':<7}{'提示tok':>10}{'命中tok':>10}{'命中率':>9}{'TTFT p50':>10}")
+        for round_label, s in rounds.items():
+            print(f"[{phase}] {round_label:<7}{s['prompt_tokens']:>10}{s['cached_tokens']:>10}"
+                  f"{s['hit_ratio']:>9.0%}{s['ttft_p50']:>10.2f}")
+        prompt = sum(s['prompt_tokens'] for s in rounds.values())
+        cached = sum(s['cached_tokens'] for s in rounds.values())
+        print(f"[{phase}] 合计命中率 {cached / prompt if prompt else float('nan'):.0%}")
+
+
+async def run(base_url, proposals, api_settings, timeout):
+    runs = []
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        for index, proposal_text in enumerate(proposals):
+            try:
+                timings = await one_evaluation(client, base_url, proposal_text, api_settings)
+            except Exception as e:
+                print(f"proposal {index}: {type(e).__name__}: {e}", file=sys.stderr)
+                continue
+            runs.append(timings)
+            prompt = sum(t.get('prompt_tokens') or 0 for t in timings)
+            cached = sum(t.get('cached_tokens') or 0 for t in timings)
+            print(f"proposal {index}: prompt {prompt} cached {cached}", flush=True)
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='前缀缓存基准（各轮命中率与首 token 时间）')
+    parser.add_argument('--url', default=None, help='使用已启动的服务，例如 http://127.0.0.1:4091')
+    parser.add_argument('--proposals', default=None, help='JSONL 文件，每行包含 proposal_text（默认使用内置样例）')
+    parser.add_argument('--count', type=int, default=5, help='评估的申请材料份数（--proposals 时 0 表示全部）')
+    parser.add_argument('--mode', choices=['wsgi', 'asgi'], default='wsgi', help='自动启动的服务入口')
+    parser.add_argument('--api-base', default='')
+    parser.add_argument('--api-key', default='')
+    parser.add_argument('--model', default='')
+    parser.add_argument('--timeout', type=float, default=900.0)
+    parser.add_argument('--json', default=None, help='将逐次 timings 与汇总写入 JSON 文件')
+    # 模拟上游参数
+    parser.add_argument('--tokens-per-second', type=float, default=200.0)
+    parser.add_argument('--ttft', type=float, default=0.2)
+    parser.add_argument('--output-chars', type=int, default=600)
+    parser.add_argument('--prefill-tokens-per-second', type=float, default=5000.0)
+    args = parser.parse_args()
+
+    api_settings = {key: value for key, value in
+                    (('api_base', args.api_base), ('api_key', args.api_key), ('api_name', args.model)) if value}
+    # 内置样例在开头即互不相同，命中部分只来自提示词模板本身（模拟上游各轮的输出固定，第 4、5 轮嵌入的前几轮输出会整段命中）
+    proposals = (load_proposals(args.proposals, args.count) if args.proposals
+                 else [f'（第{index + 1}份）{PROPOSAL}' for index in range(args.count)])
+    processes = []
+    try:
+        base_url = args.url
+        if base_url is None:
+            upstream_port = free_port()
+            processes.append(subprocess.Popen(
+                [sys.executable, os.path.join(ROOT, 'benchmarks', 'mock_upstream.py'), '--port', str(upstream_port),
+                 '--tokens-per-second', str(args.tokens_per_second), '--ttft', str(args.ttft),
+                 '--output-chars', str(args.output_chars),
+                 '--prefill-tokens-per-second', str(args.prefill_tokens_per_second)],
+                stdout=subprocess.DEVNULL))
+            wait_for_port(upstream_port)
+            port = free_port()
+            # 共享政策缓存会让第 6 轮在第一份之后不再调用上游，关闭以便观察该轮的前缀命中
+            processes.append(start_server(args.mode, port, upstream_port, {'POLICY_CACHE_ENABLED': '0'}))
+            wait_for_port(port)
+            base_url = f'http://127.0.0.1:{port}'
+
+        runs = asyncio.run(run(base_url, proposals, api_settings, args.timeout))
+        summary = summarize(runs)
+        print()
+        print_summary(summary)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump({'args': vars(args), 'summary': summary, 'runs': runs}, f, ensure_ascii=False, indent=2)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
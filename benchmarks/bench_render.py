@@ -0,0 +1,116 @@
+"""前端渲染基准的录制与托管：录制一次完整评估的原始 SSE 数据块，并启动静态服务器打开 bench_render.html
+
+录制时启动本地模拟上游（小数据块、长输出）与评估服务，按到达顺序保存 /evaluate_stream 的原始数据块及其
+相对时间（毫秒），写入 benchmarks/render_stream.json；随后以仓库根目录启动静态服务器并打印基准页面地址，
+在浏览器中打开即可（页面说明与参数见 bench_render.html 顶部注释）。
+
+  python benchmarks/bench_render.py
+  python benchmarks/bench_render.py --output-chars 6000 --chunk-chars 1 --dimension-fanout
+  python benchmarks/bench_render.py --no-record --serve-port 8000
+"""
+import argparse
+import codecs
+import functools
+import http.server
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from bench_fused import load_proposals
+from load_test import ROOT, free_port, start_server, wait_for_port
+
+DEFAULT_RECORDING = os.path.join(ROOT, 'benchmarks', 'render_stream.json')
+
+
+def record(base_url, proposal_text, dimension_fanout, timeout):
+    """运行一次评估，返回 [[相对毫秒, 文本], ...]（按到达顺序的原始数据块，跨块的多字节字符按增量解码拼接）"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = []
+    body = {'proposal_text': proposal_text, 'dimension_fanout': dimension_fanout, 'use_cache': False}
+    start = time.monotonic()
+    with httpx.Client(timeout=timeout) as client:
+        with client.stream('POST', f'{base_url}/evaluate_stream', json=body) as response:
+            response.raise_for_status()
+            for data in response.iter_raw():
+                text = decoder.decode(data)
+                if text:
+                    chunks.append([round((time.monotonic() - start) * 1000, 1), text])
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        chunks.append([round((time.monotonic() - start) * 1000, 1), tail])
+    stream = ''.join(text for _, text in chunks)
+    if '"review"' not in stream:
+        raise RuntimeError('stream ended without final result')
+    return chunks
+
+
+def serve(port):
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=ROOT)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), handler)
+    print(f"基准页面：http://127.0.0.1:{port}/benchmarks/bench_render.html（Ctrl+C 退出）", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='前端渲染基准：录制评估流并托管基准页面')
+    parser.add_argument('--output', default=DEFAULT_RECORDING, help='录制文件路径（页面默认读取 render_stream.json）')
+    parser.add_argument('--no-record', action='store_true', help='沿用已有的录制文件，只启动静态服务器')
+    parser.add_argument('--no-serve', action='store_true', help='只录制，不启动静态服务器')
+    parser.add_argument('--serve-port', type=int, default=0, help='静态服务器端口（默认随机）')
+    parser.add_argument('--url', default=None, help='录制已启动的服务，例如 http://127.0.0.1:4091')
+    parser.add_argument('--proposals', default=None, help='JSONL 文件，取第一行的 proposal_text（默认使用内置样例）')
+    parser.add_argument('--mode', choices=['wsgi', 'asgi'], default='wsgi', help='自动启动的服务入口')
+    parser.add_argument('--dimension-fanout', action='store_true', help='第三轮按维度拆分（五个子轮次并发输出）')
+    parser.add_argument('--timeout', type=float, default=900.0)
+    # 模拟上游参数：默认每轮数千字、每个数据块两个字，接近真实模型的流式输出
+    parser.add_argument('--tokens-per-second', type=float, default=400.0)
+    parser.add_argument('--ttft', type=float, default=0.3)
+    parser.add_argument('--output-chars', type=int, default=4000)
+    parser.add_argument('--chunk-chars', type=int, default=2)
+    args = parser.parse_args()
+
+    if not args.no_record:
+        proposal_text = load_proposals(args.proposals, 1)[0]
+        processes = []
+        try:
+            base_url = args.url
+            if base_url is None:
+                upstream_port = free_port()
+                processes.append(subprocess.Popen(
+                    [sys.executable, os.path.join(ROOT, 'benchmarks', 'mock_upstream.py'), '--port', str(upstream_port),
+                     '--tokens-per-second', str(args.tokens_per_second), '--ttft', str(args.ttft),
+                     '--output-chars', str(args.output_chars), '--chunk-chars', str(args.chunk_chars)],
+                    stdout=subprocess.DEVNULL))
+                wait_for_port(upstream_port)
+                port = free_port()
+                processes.append(start_server(args.mode, port, upstream_port))
+                wait_for_port(port)
+                base_url = f'http://127.0.0.1:{port}'
+            chunks = record(base_url, proposal_text, args.dimension_fanout, args.timeout)
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                process.wait()
+        stream = ''.join(text for _, text in chunks)
+        meta = {'args': vars(args), 'chunks': len(chunks), 'frames': stream.count('\n\n'),
+                'bytes': len(stream.encode('utf-8')), 'duration_ms': chunks[-1][0] if chunks else 0}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'meta': meta, 'chunks': chunks}, f, ensure_ascii=False)
+        print(f"录制 {meta['chunks']} 个数据块、{meta['frames']} 个事件（{meta['bytes']} 字节，"
+              f"{meta['duration_ms'] / 1000:.1f}s）-> {args.output}", flush=True)
+
+    if not args.no_serve:
+        serve(args.serve_port or free_port())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""流式缓冲微基准：对比旧版（+= 拼接、全缓冲区扫描、消费方重新解析SSE帧）与当前实现的每 token CPU 耗时
+
+用法：python benchmarks/bench_stream_buffer.py [--tokens 3000] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app_overseas_young_scholar import safe_json_dumps, stream_response_with_buffer  # noqa: E402
+
+SAMPLE = "申请人在海外顶级机构从事博士后研究，发表多篇高水平论文；研究方向与国家重大需求契合。\n"
+
+
+def make_chunks(n_tokens):
+    """模拟上游流式返回：每个 chunk 1-3 个字符"""
+    chunks = []
+    pos = 0
+    for i in range(n_tokens):
+        size = 1 + i % 3
+        text = (SAMPLE * 2)[pos % len(SAMPLE):pos % len(SAMPLE) + size]
+        pos += size
+        delta = types.SimpleNamespace(content=text)
+        chunks.append(types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)]))
+    return chunks
+
+
+def legacy_stream_response_with_buffer(response, round_num, reviewer):
+    """优化前的实现（保留作对照）"""
+    result = ""
+    content_buffer = ""
+    for chunk in response:
+        if hasattr(chunk, 'choices') and len(chunk.choices) > 0:
+            if hasattr(chunk.choices[0], 'delta') and hasattr(chunk.choices[0].delta, 'content'):
+                if chunk.choices[0].delta.content:
+                    content_buffer += chunk.choices[0].delta.content
+                    result += chunk.choices[0].delta.content
+                    if len(content_buffer) >= 50 or any(char in content_buffer for char in ['。', '！', '？', '；', '\n']):
+                        json_data = safe_json_dumps({'round': round_num, 'reviewer': reviewer, 'status': 'streaming', 'content': content_buffer})
+                        yield f"data: {json_data}\n\n"
+                        content_buffer = ""
+    if content_buffer:
+        json_data = safe_json_dumps({'round': round_num, 'reviewer': reviewer, 'status': 'streaming', 'content': content_buffer})
+        yield f"data: {json_data}\n\n"
+    return result
+
+
+def legacy_consumer(chunks):
+    result = ""
+    for chunk_data in legacy_stream_response_with_buffer(chunks, 3, '各维度评估专家'):
+        if isinstance(chunk_data, str) and 'content' in chunk_data:
+            try:
+                data = json.loads(chunk_data.replace('data: ', ''))
+                if 'content' in data:
+                    result += data['content']
+            except Exception:
+                pass
+    return result
+
+
+async def aiter_chunks(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def current_consumer(chunks):
+    async def emit(frame):
+        pass
+
+    async def drive():
+        return await stream_response_with_buffer(aiter_chunks(chunks), 3, '各维度评估专家', emit)
+
+    # 用同步驱动协程，避免把事件循环的调度开销计入每 token 耗时
+    coro = drive()
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError('stream_response_with_buffer 意外挂起')
+
+
+def measure(consumer, chunks, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.process_time()
+        consumer(chunks)
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tokens', type=int, default=3000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    chunks = make_chunks(args.tokens)
+    assert legacy_consumer(chunks) == current_consumer(chunks)
+
+    legacy = measure(legacy_consumer, chunks, args.repeat)
+    current = measure(current_consumer, chunks, args.repeat)
+    print(f"tokens per round: {args.tokens}")
+    print(f"legacy : {legacy * 1e6 / args.tokens:8.2f} us/token")
+    print(f"current: {current * 1e6 / args.tokens:8.2f} us/token")
+    print(f"speedup: {legacy / current:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""并发压测：对比 Flask 线程服务器（WSGI）与 ASGI 入口在单个工作进程下能同时保持多少个评估流
+
+启动本地模拟上游与评估服务（子进程），按给定并发数同时发起 /evaluate_stream 请求，
+统计成功数、延迟与服务进程的线程数/内存峰值。
+
+用法：python benchmarks/load_test.py --mode wsgi asgi --concurrency 50 200 1000
+"""
+import argparse
+import asyncio
+import collections
+import os
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROPOSAL = "申请人博士毕业于海外知名大学，现任助理教授，发表论文二十余篇，主持多项科研项目。研究方向为人工智能。" * 10
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"port {port} did not open")
+
+
+def process_stats(pid):
+    """读取进程当前线程数与常驻内存（MB）"""
+    threads = rss = 0
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('Threads:'):
+                threads = int(line.split()[1])
+            elif line.startswith('VmRSS:'):
+                rss = int(line.split()[1]) / 1024
+    return threads, rss
+
+
+def start_server(mode, port, upstream_port, extra_env=None):
+    env = dict(os.environ,
+               OPENAI_BASE_URL=f'http://127.0.0.1:{upstream_port}/v1',
+               OPENAI_API_KEY='mock',
+               RESULT_CACHE_ENABLED='0',
+               LLM_MAX_CONNECTIONS='10000',
+               LLM_MAX_KEEPALIVE_CONNECTIONS='1000')
+    env.update(extra_env or {})
+    if mode == 'asgi':
+        cmd = [sys.executable, '-m', 'uvicorn', 'asgi_app:app', '--host', '127.0.0.1', '--port', str(port),
+               '--log-level', 'warning', '--backlog', '4096']
+    else:
+        cmd = [sys.executable, '-c',
+               'from app_overseas_young_scholar import app; '
+               f'app.run(host="127.0.0.1", port={port}, threaded=True)']
+    return subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def one_evaluation(client, url, index):
+    start = time.monotonic()
+    completed = False
+    async with client.stream('POST', url, json={'proposal_text': f'{PROPOSAL}#{index}'}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith('data: ') and '"review"' in line:
+                completed = True
+    if not completed:
+        raise RuntimeError('stream ended without final result')
+    return time.monotonic() - start
+
+
+async def run_level(port, server_pid, concurrency, timeout):
+    url = f'http://127.0.0.1:{port}/evaluate_stream'
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    peak = {'threads': 0, 'rss': 0.0}
+
+    async def sample():
+        while True:
+            threads, rss = process_stats(server_pid)
+            peak['threads'] = max(peak['threads'], threads)
+            peak['rss'] = max(peak['rss'], rss)
+            await asyncio.sleep(0.2)
+
+    sampler = asyncio.ensure_future(sample())
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        start = time.monotonic()
+        outcomes = await asyncio.gather(*(one_evaluation(client, url, i) for i in range(concurrency)),
+                                        return_exceptions=True)
+        wall = time.monotonic() - start
+    sampler.cancel()
+    latencies = sorted(o for o in outcomes if isinstance(o, float))
+    failed = len(outcomes) - len(latencies)
+    errors = collections.Counter(type(o).__name__ for o in outcomes if not isinstance(o, float))
+    return {
+        'concurrency': concurrency,
+        'ok': len(latencies),
+        'failed': failed,
+        'p50': statistics.median(latencies) if latencies else float('nan'),
+        'max': latencies[-1] if latencies else float('nan'),
+        'wall': wall,
+        'threads': peak['threads'],
+        'rss': peak['rss'],
+        'errors': dict(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='WSGI / ASGI 并发压测')
+    parser.add_argument('--mode', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[50, 200, 1000])
+    parser.add_argument('--tokens-per-second', type=float, default=50.0)
+    parser.add_argument('--ttft', type=float, default=0.5)
+    parser.add_argument('--chunk-chars', type=int, default=2)
+    parser.add_argument('--output-chars', type=int, default=600)
+    parser.add_argument('--timeout', type=float, default=300.0)
+    args = parser.parse_args()
+
+    # 上千个长连接需要足够的文件描述符
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    upstream_port = free_port()
+    upstream = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'benchmarks', 'mock_upstream.py'), '--port', str(upstream_port),
+         '--tokens-per-second', str(args.tokens_per_second), '--ttft', str(args.ttft),
+         '--chunk-chars', str(args.chunk_chars), '--output-chars', str(args.output_chars)],
+        stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(upstream_port)
+        print(f"{'mode':<6}{'conc':>6}{'ok':>6}{'fail':>6}{'p50(s)':>9}{'max(s)':>9}{'wall(s)':>9}{'threads':>9}{'rss(MB)':>9}")
+        for mode in args.mode:
+            port = free_port()
+            server = start_server(mode, port, upstream_port)
+            try:
+                wait_for_port(port)
+                for concurrency in args.concurrency:
+                    r = asyncio.run(run_level(port, server.pid, concurrency, args.timeout))
+                    print(f"{mode:<6}{r['concurrency']:>6}{r['ok']:>6}{r['failed']:>6}{r['p50']:>9.2f}"
+                          f"{r['max']:>9.2f}{r['wall']:>9.2f}{r['threads']:>9}{r['rss']:>9.1f}"
+                          + (f"  errors: {r['errors']}" if r['errors'] else ''))
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        upstream.terminate()
+        upstream.wait()
+
+
+if __name__ == '__main__':
+    main()
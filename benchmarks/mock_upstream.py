@@ -0,0 +1,278 @@
+"""本地模拟的 OpenAI 兼容上游（仅 /v1/chat/completions），用于离线压测评估流程
+
+用法：python benchmarks/mock_upstream.py --port 9100 --tokens-per-second 50 --ttft 0.5
+然后以 OPENAI_BASE_URL=http://127.0.0.1:9100/v1 OPENAI_API_KEY=mock 启动评估服务。
+
+故障注入：--error-rate 按比例返回 HTTP 500，--stream-error-rate 按比例在流式输出中途断开连接；
+--empty-stream-models 中列出的模型流式返回空内容，只有非流式请求才有结果（模拟部分 qwen* 模型，触发回退逻辑）；
+--slow-rate 按比例将首 token 延迟改为 --slow-ttft（模拟长尾延迟，用于验证对冲与首 token 看门狗）；
+--no-json-mode 对带 response_format 的请求返回 HTTP 400（模拟不支持 JSON 模式的网关，触发融合流程的回退）；
+--nested-json 对融合请求返回 {"summary": ..., "review": {...}}（接受 JSON 模式却没有按约定的结构输出，同样触发回退）。
+
+前缀缓存：按 DeepSeek 的方式模拟上下文缓存，与此前请求开头相同的部分（以 64 字符为单位）计为命中，
+usage 中返回 prompt_cache_hit_tokens / prompt_cache_miss_tokens 与 prompt_tokens_details.cached_tokens；
+--prefill-tokens-per-second 大于 0 时首 token 延迟另加“未命中部分 / 该速率”，用于观察前缀缓存对预填充耗时的影响。
+"""
+import argparse
+import asyncio
+import collections
+import hashlib
+import json
+import random
+import time
+
+STRUCTURED_RESULT = {
+    "meta": {"title": "国内青年人才申请评估结果", "version": "v1.0", "review_time": "2025-01-01T00:00:00"},
+    "scores": [
+        {"dimension": name, "weight": weight, "score_1_to_5": 3,
+         "evidence": ["模拟证据"], "issues": ["模拟问题"], "suggestion": "模拟建议"}
+        for name, weight in [
+            ("教育、学术与科研工作经历", 15),
+            ("已取得科学研究及技术创新的成果及贡献", 30),
+            ("学术见解及技术成果独特性和原始创新性评价", 20),
+            ("发展潜力的评价", 20),
+            ("申请工作设想和国内依托单位支持情况", 15),
+        ]
+    ],
+    "aggregate": {
+        "weighted_total_100": 60,
+        "strengths": ["模拟优势"],
+        "risks": ["模拟风险"],
+        "priority_fixes_top5": ["模拟建议"],
+    },
+}
+
+PREFIX_BLOCK = 64
+
+NARRATIVE = "这是模拟上游返回的评审意见，用于压测评估流程。申请人的研究方向明确，成果具有一定影响力；"
+
+
+class MockConfig:
+    def __init__(self, tokens_per_second=50.0, ttft=0.5, chunk_chars=2, output_chars=600,
+                 error_rate=0.0, stream_error_rate=0.0, empty_stream_models=(), seed=None,
+                 slow_rate=0.0, slow_ttft=10.0, json_mode=True, prefill_tokens_per_second=0.0,
+                 prefix_cache_blocks=200000, nested_json=False):
+        self.tokens_per_second = tokens_per_second
+        self.ttft = ttft
+        self.chunk_chars = chunk_chars
+        self.output_chars = output_chars
+        self.error_rate = error_rate
+        self.stream_error_rate = stream_error_rate
+        self.empty_stream_models = frozenset(empty_stream_models)
+        self.slow_rate = slow_rate
+        self.slow_ttft = slow_ttft
+        self.json_mode = json_mode
+        self.nested_json = nested_json
+        self.prefill_tokens_per_second = prefill_tokens_per_second
+        self.prefix_cache = PrefixCache(prefix_cache_blocks)
+        self.random = random.Random(seed)
+
+
+class PrefixCache:
+    """已见过的请求前缀（按 PREFIX_BLOCK 字符分块的累积哈希），超出容量时按 LRU 淘汰"""
+
+    def __init__(self, max_blocks):
+        self.max_blocks = max_blocks
+        self._blocks = collections.OrderedDict()
+
+    def lookup(self, request_body):
+        """返回命中缓存的前缀字符数，并把本次请求的各块前缀加入缓存"""
+        text = ''.join(f"{message.get('role')}\n{message.get('content') or ''}\n"
+                       for message in request_body.get('messages') or [])
+        digest = hashlib.sha1(request_body.get('model', '').encode('utf-8'))
+        hit = 0
+        matching = True
+        for start in range(0, len(text) - PREFIX_BLOCK + 1, PREFIX_BLOCK):
+            digest.update(text[start:start + PREFIX_BLOCK].encode('utf-8'))
+            key = digest.copy().digest()
+            if matching and key in self._blocks:
+                hit = start + PREFIX_BLOCK
+                self._blocks.move_to_end(key)
+            else:
+                matching = False
+                self._blocks[key] = None
+        while len(self._blocks) > self.max_blocks:
+            self._blocks.popitem(last=False)
+        return hit
+
+
+def completion_text(request_body, config):
+    """结构化评估请求返回合法 JSON（JSON 模式的融合请求另含定长的 summary 发言），其余请求返回定长的叙述文本
+
+    叙述文本不超过请求的 max_tokens（按 chunk_chars 个字符一个 token 计），模拟生成上限截断。
+    """
+    messages = request_body.get('messages') or []
+    system = messages[0].get('content', '') if messages else ''
+    output_chars = config.output_chars
+    if request_body.get('max_tokens'):
+        output_chars = min(output_chars, request_body['max_tokens'] * config.chunk_chars)
+    repeat = output_chars // len(NARRATIVE) + 1
+    narrative = (NARRATIVE * repeat)[:output_chars]
+    if '结构化' in system:
+        if request_body.get('response_format'):
+            if config.nested_json:
+                return json.dumps({'summary': narrative, 'review': STRUCTURED_RESULT}, ensure_ascii=False)
+            return json.dumps(dict(summary=narrative, **STRUCTURED_RESULT), ensure_ascii=False)
+        return json.dumps(STRUCTURED_RESULT, ensure_ascii=False)
+    return narrative
+
+
+def usage_payload(request_body, text, config, cached_chars=0):
+    """按字符数粗略估算的 token 用量（提示部分一个字符计一个 token），含前缀缓存命中数"""
+    prompt_chars = sum(len(message.get('content') or '') for message in request_body.get('messages') or [])
+    cached = min(cached_chars, prompt_chars)
+    completion_tokens = -(-len(text) // config.chunk_chars)
+    return {'prompt_tokens': prompt_chars, 'completion_tokens': completion_tokens,
+            'total_tokens': prompt_chars + completion_tokens,
+            'prompt_cache_hit_tokens': cached, 'prompt_cache_miss_tokens': prompt_chars - cached,
+            'prompt_tokens_details': {'cached_tokens': cached}}
+
+
+def prefill_delay(request_body, config, cached_chars):
+    if not config.prefill_tokens_per_second:
+        return 0.0
+    prompt_chars = sum(len(message.get('content') or '') for message in request_body.get('messages') or [])
+    return max(0, prompt_chars - cached_chars) / config.prefill_tokens_per_second
+
+
+def chunk_payload(request_body, content, finish_reason=None):
+    return {
+        'id': 'chatcmpl-mock',
+        'object': 'chat.completion.chunk',
+        'created': int(time.time()),
+        'model': request_body.get('model', 'mock'),
+        'choices': [{'index': 0, 'delta': {'content': content} if content else {}, 'finish_reason': finish_reason}],
+    }
+
+
+async def write_chunk(writer, data):
+    writer.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+    await writer.drain()
+
+
+async def write_error(writer, status, message):
+    body = json.dumps({'error': {'message': message, 'type': 'mock_error'}}).encode('utf-8')
+    writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n".encode('ascii')
+                 + f"Content-Length: {len(body)}\r\n\r\n".encode('ascii') + body)
+    await writer.drain()
+
+
+async def handle_completion(writer, request_body, config):
+    """返回 False 表示已模拟中途断开，调用方应关闭连接"""
+    if config.random.random() < config.error_rate:
+        await asyncio.sleep(config.ttft)
+        await write_error(writer, '500 Internal Server Error', 'injected upstream error')
+        return True
+    if request_body.get('response_format') and not config.json_mode:
+        await write_error(writer, '400 Bad Request', 'response_format is not supported')
+        return True
+
+    text = completion_text(request_body, config)
+    cached_chars = config.prefix_cache.lookup(request_body)
+    if not request_body.get('stream'):
+        await asyncio.sleep(config.ttft + prefill_delay(request_body, config, cached_chars)
+                            + len(text) / config.chunk_chars / config.tokens_per_second)
+        body = json.dumps({
+            'id': 'chatcmpl-mock',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request_body.get('model', 'mock'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+            'usage': usage_payload(request_body, text, config, cached_chars),
+        }, ensure_ascii=False).encode('utf-8')
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                     + f"Content-Length: {len(body)}\r\n\r\n".encode('ascii') + body)
+        await writer.drain()
+        return True
+
+    if request_body.get('model') in config.empty_stream_models:
+        text = ''
+    # 中途断开的位置在输出的 10%-90% 之间随机选取
+    cut = len(text) * config.random.uniform(0.1, 0.9) if config.random.random() < config.stream_error_rate else None
+
+    ttft = config.slow_ttft if config.random.random() < config.slow_rate else config.ttft
+    ttft += prefill_delay(request_body, config, cached_chars)
+
+    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+    await asyncio.sleep(ttft)
+    interval = 1.0 / config.tokens_per_second
+    for i in range(0, len(text), config.chunk_chars):
+        if cut is not None and i >= cut:
+            return False
+        payload = chunk_payload(request_body, text[i:i + config.chunk_chars])
+        await write_chunk(writer, f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8'))
+        await asyncio.sleep(interval)
+    payload = chunk_payload(request_body, None, 'stop')
+    await write_chunk(writer, f"data: {json.dumps(payload)}\n\n".encode('utf-8'))
+    if (request_body.get('stream_options') or {}).get('include_usage'):
+        payload = dict(chunk_payload(request_body, None), choices=[], usage=usage_payload(request_body, text, config, cached_chars))
+        await write_chunk(writer, f"data: {json.dumps(payload)}\n\n".encode('utf-8'))
+    await write_chunk(writer, b"data: [DONE]\n\n")
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+    return True
+
+
+async def handle_connection(reader, writer, config):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, path, _ = request_line.decode('latin-1').split(' ', 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            if method == 'POST' and path.endswith('/chat/completions'):
+                if not await handle_completion(writer, json.loads(body or b'{}'), config):
+                    return
+            else:
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+                await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host, port, config):
+    server = await asyncio.start_server(lambda r, w: handle_connection(r, w, config), host, port, backlog=4096)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟的 OpenAI 兼容上游')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--tokens-per-second', type=float, default=50.0)
+    parser.add_argument('--ttft', type=float, default=0.5, help='首个 token 前的等待秒数')
+    parser.add_argument('--chunk-chars', type=int, default=2, help='每个流式 chunk 的字符数')
+    parser.add_argument('--output-chars', type=int, default=600, help='叙述类回复的字符数')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 HTTP 500 的请求比例')
+    parser.add_argument('--stream-error-rate', type=float, default=0.0, help='流式输出中途断开的请求比例')
+    parser.add_argument('--empty-stream-models', default='', help='流式返回空内容的模型（逗号分隔）')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='首 token 延迟为 --slow-ttft 的流式请求比例')
+    parser.add_argument('--slow-ttft', type=float, default=10.0, help='长尾请求的首 token 延迟秒数')
+    parser.add_argument('--no-json-mode', action='store_true', help='拒绝带 response_format 的请求（HTTP 400）')
+    parser.add_argument('--nested-json', action='store_true', help='融合请求返回 {"summary", "review"} 嵌套结构')
+    parser.add_argument('--prefill-tokens-per-second', type=float, default=0.0,
+                        help='预填充速率：首 token 延迟另加未命中前缀缓存的提示 token 数 / 该速率（0 不模拟）')
+    parser.add_argument('--seed', type=int, default=None, help='故障注入的随机种子')
+    args = parser.parse_args()
+    config = MockConfig(args.tokens_per_second, args.ttft, args.chunk_chars, args.output_chars,
+                        args.error_rate, args.stream_error_rate,
+                        [name.strip() for name in args.empty_stream_models.split(',') if name.strip()], args.seed,
+                        args.slow_rate, args.slow_ttft, not args.no_json_mode, args.prefill_tokens_per_second,
+                        nested_json=args.nested_json)
+    print(f"mock upstream listening on http://{args.host}:{args.port}/v1")
+    asyncio.run(serve(args.host, args.port, config))
+
+
+if __name__ == '__main__':
+    main()
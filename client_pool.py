@@ -0,0 +1,138 @@
+"""OpenAI 客户端池：按 (base_url, api_key 哈希) 复用客户端，并按网关共享 keep-alive 连接池"""
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+
+
+def credential_hash(api_key):
+    """API密钥的摘要，用作池键，避免明文密钥常驻在键中"""
+    return hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:16]
+
+
+class ClientPool:
+    """有界的 OpenAI 客户端注册表，LRU + TTL 淘汰
+
+    同一网关（base_url）的所有客户端共享一个 httpx 连接池，不同密钥只是请求头不同，
+    因此自定义密钥的请求也能复用已建立的 TCP/TLS 连接。最后一个使用某连接池的客户端被淘汰后，
+    该连接池在 close_delay 秒后关闭（异步连接池在其所属事件循环上关闭），留给仍持有客户端的请求完成。
+    """
+
+    def __init__(self, max_size=32, ttl=1800, max_connections=100,
+                 max_keepalive_connections=20, keepalive_expiry=30.0, max_retries=2, close_delay=120.0):
+        # max_retries 为 OpenAI SDK 自身的重试次数；由上游调度器负责重试时设为 0
+        self.max_size = max_size
+        self.ttl = ttl
+        self.close_delay = close_delay
+        self.max_retries = max_retries
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._clients = OrderedDict()  # (事件循环, base_url, 密钥哈希) -> (客户端, 最近使用时间)
+        self._transports = {}  # (事件循环, base_url) -> (httpx 客户端, 引用计数, 所属事件循环)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.closed = 0
+
+    def get(self, base_url, api_key):
+        """获取（或创建）指定网关与密钥对应的同步客户端"""
+        return self._lookup(None, base_url, api_key)
+
+    def get_async(self, base_url, api_key):
+        """获取异步客户端；httpx 异步连接池绑定事件循环，因此按当前事件循环分别缓存"""
+        return self._lookup(asyncio.get_running_loop(), base_url, api_key)
+
+    def _lookup(self, loop, base_url, api_key):
+        loop_id = id(loop) if loop is not None else None
+        key = (loop_id, base_url, credential_hash(api_key))
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            entry = self._clients.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._clients[key] = (entry[0], now)
+                self._clients.move_to_end(key)
+                return entry[0]
+
+            self.misses += 1
+            transport_key = (loop_id, base_url)
+            http_client, refs, _ = self._transports.get(transport_key, (None, 0, loop))
+            if http_client is None:
+                if loop is not None:
+                    http_client = DefaultAsyncHttpxClient(limits=self.limits)
+                else:
+                    http_client = DefaultHttpxClient(limits=self.limits)
+            self._transports[transport_key] = (http_client, refs + 1, loop)
+            client_class = AsyncOpenAI if loop is not None else OpenAI
+            llm_client = client_class(base_url=base_url, api_key=api_key, http_client=http_client,
+                                      max_retries=self.max_retries)
+            self._clients[key] = (llm_client, now)
+            while len(self._clients) > self.max_size:
+                self._drop(next(iter(self._clients)))
+            return llm_client
+
+    def _evict_expired(self, now):
+        expired = [key for key, (_, last_used) in self._clients.items() if now - last_used > self.ttl]
+        for key in expired:
+            self._drop(key)
+
+    def _drop(self, key):
+        # 正在使用该客户端的请求仍持有它，因此连接池在最后一个客户端淘汰 close_delay 秒后才关闭
+        self._clients.pop(key)
+        self.evictions += 1
+        transport_key = key[:2]
+        http_client, refs, loop = self._transports[transport_key]
+        if refs <= 1:
+            del self._transports[transport_key]
+            self._close(http_client, loop)
+        else:
+            self._transports[transport_key] = (http_client, refs - 1, loop)
+
+    def _close(self, http_client, loop):
+        """延迟关闭连接池：同步连接池在后台定时器中关闭，异步连接池调度到所属事件循环上关闭"""
+        if loop is None:
+            timer = threading.Timer(self.close_delay, http_client.close)
+            timer.daemon = True
+            timer.start()
+        else:
+            if loop.is_closed():
+                # 事件循环已关闭，其上的连接随之失效，无法再关闭
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._aclose_later(http_client), loop)
+            except RuntimeError:
+                return
+        self.closed += 1
+
+    async def _aclose_later(self, http_client):
+        await asyncio.sleep(self.close_delay)
+        await http_client.aclose()
+
+    def stats(self):
+        """池状态：客户端数量、命中率与连接池限制"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'clients': len(self._clients),
+                'transports': len(self._transports),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'closed': self.closed,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'max_connections': self.limits.max_connections,
+                'max_keepalive_connections': self.limits.max_keepalive_connections,
+                'keepalive_expiry': self.limits.keepalive_expiry,
+                'max_retries': self.max_retries,
+            }
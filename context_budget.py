@@ -0,0 +1,131 @@
+"""按 token 预算组装后续轮次的上下文：前几轮输出与申请材料超出预算时先提炼、再截断"""
+import re
+
+ELLIPSIS = "\n……（中间内容已省略）……\n"
+
+# 第三轮输出中携带评分信息的行：维度标题、评分/得分字样或 "x分"、"x/5" 形式的分数
+SCORE_LINE = re.compile(r'维度|评分|得分|分数|总分|\d+(?:\.\d+)?\s*(?:分|/\s*5)')
+
+
+def estimate_tokens(text):
+    """本地估算 token 数：非 ASCII 字符（中文等）按 1 个 token，ASCII 按 4 个字符 1 个 token
+
+    对中文偏保守（主流分词器通常 1 个汉字不足 1 个 token），因此按估算值裁剪后不会超出真实预算。
+    """
+    if not text:
+        return 0
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    return len(text) - ascii_chars + (ascii_chars + 3) // 4
+
+
+def _prefix_chars(text, max_tokens):
+    """前缀估算 token 数不超过 max_tokens 的最大字符数"""
+    tokens = 0.0
+    for i, char in enumerate(text):
+        tokens += 0.25 if ord(char) < 128 else 1
+        if tokens > max_tokens:
+            return i
+    return len(text)
+
+
+def truncate_tokens(text, max_tokens):
+    """截断到 max_tokens 以内：保留开头约 2/3 与结尾约 1/3，中间以省略标记代替"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max(0, max_tokens - estimate_tokens(ELLIPSIS))
+    head = text[:_prefix_chars(text, budget * 2 // 3)]
+    tail_budget = budget - estimate_tokens(head)
+    tail = text[len(text) - _prefix_chars(text[::-1], tail_budget):] if tail_budget > 0 else ''
+    return head.rstrip() + ELLIPSIS + tail.lstrip()
+
+
+def score_lines(text):
+    """只保留携带评分信息的行（用于第三轮各维度评估）；没有匹配的行时返回原文"""
+    lines = [line for line in text.splitlines() if SCORE_LINE.search(line)]
+    return '\n'.join(lines) if lines else text
+
+
+def relevant_paragraphs(text, keywords, max_tokens):
+    """按关键词命中次数挑选段落，直到 max_tokens 为止，按原文顺序拼接（被跳过的位置以省略标记代替）
+
+    用于按维度拆分的第三轮：每个调用只保留申请材料中与本维度相关的段落。未超出预算时返回原文。
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    paragraphs = [paragraph for paragraph in text.splitlines() if paragraph.strip()]
+    lowered = [paragraph.lower() for paragraph in paragraphs]
+    hits = [sum(paragraph.count(keyword.lower()) for keyword in keywords) for paragraph in lowered]
+    # 命中多的优先；命中相同时靠前的段落优先（通常是概述）
+    ranked = sorted((index for index in range(len(paragraphs)) if hits[index]), key=lambda index: (-hits[index], index))
+    chosen = set()
+    remaining = max_tokens
+    for index in ranked:
+        tokens = estimate_tokens(paragraphs[index]) + 1
+        if tokens <= remaining:
+            chosen.add(index)
+            remaining -= tokens
+    if not chosen:
+        return text
+    parts = []
+    for index, paragraph in enumerate(paragraphs):
+        if index in chosen:
+            parts.append(paragraph)
+        elif parts and parts[-1] is not None:
+            parts.append(None)
+    return '\n'.join(ELLIPSIS.strip() if part is None else part for part in parts)
+
+
+class ContextSection:
+    """上下文中的一段：condense 为可选的提炼函数，超预算时优先使用；min_tokens 为截断时至少保留的 token 数"""
+
+    def __init__(self, name, text, condense=None, min_tokens=200):
+        self.name = name
+        self.text = text or ''
+        self.condense = condense
+        self.min_tokens = min_tokens
+
+
+def fit_sections(sections, budget):
+    """使各段合计不超过 budget（估算 token），返回 ({段名: 文本}, 报告)
+
+    依次尝试：原文 → 按顺序对有提炼函数的段提炼 → 按最大最小公平分配预算并截断超出份额的段。
+    budget 为 None 或 0 时不做处理。报告包含 original_tokens、final_tokens、saved_tokens 与被改写的段名。
+    """
+    texts = {section.name: section.text for section in sections}
+    original = sum(estimate_tokens(text) for text in texts.values())
+    changed = []
+
+    def total():
+        return sum(estimate_tokens(text) for text in texts.values())
+
+    if budget:
+        for section in sections:
+            if total() <= budget:
+                break
+            if section.condense is not None:
+                condensed = section.condense(texts[section.name])
+                if estimate_tokens(condensed) < estimate_tokens(texts[section.name]):
+                    texts[section.name] = condensed
+                    changed.append(section.name)
+
+        if total() > budget:
+            # 最大最小公平：较短的段保留原文，剩余预算在较长的段之间平分
+            remaining = budget
+            ordered = sorted(sections, key=lambda s: estimate_tokens(texts[s.name]))
+            for i, section in enumerate(ordered):
+                share = max(section.min_tokens, remaining // (len(ordered) - i))
+                tokens = estimate_tokens(texts[section.name])
+                if tokens > share:
+                    texts[section.name] = truncate_tokens(texts[section.name], share)
+                    if section.name not in changed:
+                        changed.append(section.name)
+                remaining = max(0, remaining - estimate_tokens(texts[section.name]))
+
+    final = total()
+    return texts, {
+        'budget': budget or None,
+        'original_tokens': original,
+        'final_tokens': final,
+        'saved_tokens': original - final,
+        'changed': changed,
+    }
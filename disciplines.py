@@ -0,0 +1,77 @@
+"""学科分类：按关键词把申请材料归入国家自然科学基金的科学部，用于按学科共享政策分析
+
+纯本地计算，不调用模型；关键词命中次数加权求和，最高分不足 min_score 或与次高分相同时归入“综合”。
+"""
+import collections
+
+# (代码, 名称, 关键词)；关键词越长越具体，权重越高（见 _weight）
+DISCIPLINES = (
+    ('math_physics', '数理科学', (
+        '数学', '代数', '几何', '拓扑', '数论', '偏微分方程', '概率论', '统计学', '物理', '量子', '凝聚态', '粒子物理',
+        '天文', '天体物理', '宇宙学', '光学', '等离子体', '力学', '超导', '原子分子', 'physics', 'mathematics',
+        'quantum', 'astrophysics',
+    )),
+    ('chemistry', '化学科学', (
+        '化学', '催化', '合成化学', '有机合成', '无机化学', '分析化学', '物理化学', '高分子', '聚合物', '电化学',
+        '配位化学', '化学生物学', '光化学', '分子筛', 'chemistry', 'catalysis', 'polymer',
+    )),
+    ('life_sciences', '生命科学', (
+        '生物', '基因', '蛋白', '细胞', '分子生物学', '遗传', '进化', '生态', '神经科学', '免疫', '微生物', '植物',
+        '动物', '农业', '作物', '育种', '结构生物学', '基因组', '合成生物学', 'biology', 'genome', 'protein', 'cell',
+    )),
+    ('earth_sciences', '地球科学', (
+        '地球', '地质', '地球物理', '地球化学', '海洋', '大气', '气候', '气象', '水文', '地理', '遥感', '冰川',
+        '环境科学', '土壤', '地震', '古生物', 'geology', 'climate', 'ocean', 'atmospheric',
+    )),
+    ('engineering_materials', '工程与材料科学', (
+        '材料', '工程', '机械', '制造', '能源', '电池', '储能', '新能源', '电力', '电气', '土木', '建筑', '交通',
+        '航空', '航天', '冶金', '纳米材料', '复合材料', '半导体材料', '热能', '流体', '结构工程', '水利', '核能',
+        'materials', 'engineering', 'battery', 'manufacturing',
+    )),
+    ('information_sciences', '信息科学', (
+        '人工智能', '机器学习', '深度学习', '计算机', '软件', '算法', '网络', '通信', '芯片', '集成电路', '半导体',
+        '电子', '信号处理', '自动化', '控制', '机器人', '计算机视觉', '自然语言处理', '大模型', '信息安全',
+        '密码', '光电', '雷达', '量子计算', 'artificial intelligence', 'machine learning', 'deep learning',
+        'computer', 'algorithm', 'robot',
+    )),
+    ('management', '管理科学', (
+        '管理', '经济', '金融', '管理科学', '运筹', '决策', '供应链', '政策研究', '公共管理', '企业管理', '市场',
+        '博弈', '风险管理', '组织行为', 'economics', 'management', 'finance',
+    )),
+    ('medicine', '医学科学', (
+        '医学', '临床', '疾病', '肿瘤', '癌症', '药物', '医院', '患者', '诊断', '治疗', '病理', '影像', '流行病',
+        '公共卫生', '心血管', '神经退行', '药理', '中医', '疫苗', '医疗器械', 'clinical', 'cancer', 'disease',
+        'drug', 'medicine',
+    )),
+)
+
+GENERAL = ('general', '综合')
+
+Discipline = collections.namedtuple('Discipline', 'code name score keywords')
+
+
+def _weight(keyword):
+    """中文关键词二字为 1、每多一个字加 0.5；英文关键词一个词为 1、每多一个词加 0.5"""
+    if keyword.isascii():
+        return 1 + 0.5 * (len(keyword.split()) - 1)
+    return 1 + 0.5 * max(0, len(keyword) - 2)
+
+
+def classify(text, min_score=3):
+    """返回 Discipline（代码、名称、得分、命中最多的关键词）；无法判断时为“综合”"""
+    lowered = (text or '').lower()
+    scored = []
+    for code, name, keywords in DISCIPLINES:
+        hits = collections.Counter()
+        for keyword in keywords:
+            count = lowered.count(keyword)
+            if count:
+                hits[keyword] = count
+        # 同一关键词最多计 5 次，避免单个高频词主导
+        score = sum(min(count, 5) * _weight(keyword) for keyword, count in hits.items())
+        scored.append((score, code, name, [keyword for keyword, _ in hits.most_common(5)]))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    best, runner_up = scored[0], scored[1]
+    if best[0] < min_score or best[0] == runner_up[0]:
+        return Discipline(*GENERAL, best[0], [])
+    return Discipline(best[1], best[2], best[0], best[3])
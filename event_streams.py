@@ -0,0 +1,276 @@
+"""可续传的 SSE 事件流：评估流程与客户端连接解耦，断线后凭 Last-Event-ID 从断点继续
+
+每个评估流有一个 ID，事件帧带 `id: <流 ID>:<序号>`；事件写入有界的重放缓冲区（内存中保留最近的事件，
+配置目录后全部事件同时追加到磁盘文件，内存中淘汰的部分从文件读取）。评估流程在后台运行，读取快慢不影响上游读取；
+最后一个连接断开时开始计时，grace 秒内没有重连即取消评估流程（grace 为 0 时立即取消）。已结束的流保留 ttl 秒供迟到的重连回放。
+"""
+import asyncio
+import collections
+import os
+import threading
+import time
+import uuid
+
+
+class ResumeGap(Exception):
+    """请求续传的事件已从重放缓冲区淘汰（未配置磁盘溢出时）"""
+
+
+def parse_event_id(value):
+    """解析 Last-Event-ID（`<流 ID>:<序号>`），返回 (流 ID, 序号)；只有流 ID 时序号为 -1（从头回放）"""
+    stream_id, _, seq = (value or '').strip().partition(':')
+    try:
+        return stream_id, int(seq) if seq else -1
+    except ValueError:
+        return stream_id, -1
+
+
+# SSE 注释帧：长时间没有事件时发送，使断开的连接在下一次写入时即被发现
+HEARTBEAT_FRAME = ': keep-alive\n\n'
+
+
+class EventStream:
+    """一个评估流的事件缓冲区；由所在事件循环上的任务写入，可从任意线程、任意事件循环读取"""
+
+    def __init__(self, stream_id, max_bytes=512 * 1024, spill_path=None):
+        self.id = stream_id
+        self.max_bytes = max_bytes
+        self.created_at = time.time()
+        self.finished_at = None
+        self.task = None
+        self.loop = None
+        self.subscribers = 0
+        self.on_subscribers = None  # 连接数变化时调用（参数为本流），由 StreamRegistry 设置
+        self.abandon_handle = None
+        self._frames = collections.deque()  # (序号, 帧)
+        self._bytes = 0
+        self._next_seq = 0
+        self._spill_path = spill_path
+        self._spill = open(spill_path, 'w+b') if spill_path else None
+        self._offsets = []  # 序号 -> (文件偏移, 长度)
+        self._waiters = set()  # (事件循环, asyncio.Event)
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    def append(self, frame):
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            framed = f"id: {self.id}:{seq}\n{frame}"
+            if self._spill is not None:
+                data = framed.encode('utf-8')
+                self._spill.seek(0, os.SEEK_END)
+                self._offsets.append((self._spill.tell(), len(data)))
+                self._spill.write(data)
+            self._frames.append((seq, framed))
+            self._bytes += len(framed)
+            # 至少保留最后一个事件
+            while self._bytes > self.max_bytes and len(self._frames) > 1:
+                self._bytes -= len(self._frames.popleft()[1])
+        self._notify()
+
+    def finish(self):
+        with self._lock:
+            self.finished_at = time.time()
+            if self._spill is not None:
+                self._spill.flush()
+        self._notify()
+
+    def available(self, after):
+        """序号 after 之后的事件是否仍可回放"""
+        with self._lock:
+            return self._spill is not None or not self._frames or self._frames[0][0] <= after + 1
+
+    def read(self, after):
+        """序号 after 之后已写入的事件 [(序号, 帧)]；已淘汰且无法从磁盘读取时抛出 ResumeGap"""
+        with self._lock:
+            if not self._frames or after + 1 >= self._next_seq:
+                return []
+            first = self._frames[0][0]
+            if after + 1 >= first:
+                return list(self._frames)[after + 1 - first:]
+            if self._spill is None:
+                raise ResumeGap(self.id)
+            self._spill.flush()
+            start = self._offsets[after + 1][0]
+            end_offset, end_length = self._offsets[first - 1]
+            self._spill.seek(start)
+            data = self._spill.read(end_offset + end_length - start)
+            spilled = []
+            for seq in range(after + 1, first):
+                offset, length = self._offsets[seq]
+                spilled.append((seq, data[offset - start:offset - start + length].decode('utf-8')))
+            return spilled + list(self._frames)
+
+    async def subscribe(self, after=-1, heartbeat=None, gap_frame=None):
+        """依次产出序号 after 之后的事件帧，直到流结束；可随时关闭，不影响评估流程
+
+        heartbeat 为秒数时，超过该时间没有新事件即产出一个 HEARTBEAT_FRAME。读取落后于缓冲区、尚未读取的事件
+        已被淘汰时，提供 gap_frame 则产出它并结束（未提供时抛出 ResumeGap）。
+        """
+        waiter = asyncio.Event()
+        entry = (asyncio.get_running_loop(), waiter)
+        with self._lock:
+            self._waiters.add(entry)
+            self.subscribers += 1
+        self._subscribers_changed()
+        try:
+            while True:
+                waiter.clear()
+                finished = self.finished
+                try:
+                    frames = self.read(after)
+                except ResumeGap:
+                    if gap_frame is None:
+                        raise
+                    yield gap_frame
+                    return
+                for seq, frame in frames:
+                    yield frame
+                    after = seq
+                if not frames:
+                    if finished:
+                        return
+                    try:
+                        await asyncio.wait_for(waiter.wait(), heartbeat)
+                    except asyncio.TimeoutError:
+                        yield HEARTBEAT_FRAME
+        finally:
+            with self._lock:
+                self._waiters.discard(entry)
+                self.subscribers -= 1
+            self._subscribers_changed()
+
+    def _subscribers_changed(self):
+        if self.on_subscribers is not None:
+            self.on_subscribers(self)
+
+    def _notify(self):
+        with self._lock:
+            waiters = list(self._waiters)
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(waiter.set)
+            except RuntimeError:
+                # 订阅方的事件循环已关闭
+                pass
+
+    def close(self):
+        with self._lock:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+                try:
+                    os.remove(self._spill_path)
+                except OSError:
+                    pass
+            self._frames.clear()
+            self._bytes = 0
+
+
+class StreamRegistry:
+    """评估流登记表：start() 在当前事件循环上运行事件源并写入新流；按 ttl 与数量清理已结束的流
+
+    on_event(name) 为可选的计数回调（started / resumed / abandoned / expired）；attach_timeout 为新流等待
+    第一个连接的最长秒数（不短于 grace）。
+    """
+
+    def __init__(self, max_bytes=512 * 1024, spill_dir=None, ttl=600, grace=20, max_streams=1000, on_event=None,
+                 attach_timeout=10):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.ttl = ttl
+        self.grace = grace
+        self.attach_timeout = attach_timeout
+        self.max_streams = max_streams
+        self.on_event = on_event
+        self._streams = {}
+        self._lock = threading.Lock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def get(self, stream_id):
+        with self._lock:
+            self._prune(time.time())
+            return self._streams.get(stream_id)
+
+    async def start(self, events, abandoned_frame=None):
+        """在当前事件循环上运行异步迭代器 events，返回新建的 EventStream
+
+        abandoned_frame 为没有连接、评估被取消时写入的最后一个事件帧。
+        """
+        stream_id = uuid.uuid4().hex
+        spill_path = os.path.join(self.spill_dir, f'{stream_id}.sse') if self.spill_dir else None
+        stream = EventStream(stream_id, self.max_bytes, spill_path)
+        with self._lock:
+            self._prune(time.time())
+            self._streams[stream_id] = stream
+        stream.loop = asyncio.get_running_loop()
+        stream.task = asyncio.ensure_future(self._pump(stream, events, abandoned_frame))
+        stream.on_subscribers = self._watch
+        # 第一个连接建立前同样计时，避免客户端在订阅前断开时评估无人取消
+        stream.abandon_handle = stream.loop.call_later(max(self.grace, self.attach_timeout), self._abandon, stream)
+        self._count('started')
+        return stream
+
+    async def _pump(self, stream, events, abandoned_frame):
+        try:
+            async for frame in events:
+                stream.append(frame)
+        except asyncio.CancelledError:
+            if abandoned_frame is not None:
+                stream.append(abandoned_frame)
+        finally:
+            self._disarm(stream)
+            stream.finish()
+            await events.aclose()
+
+    def _watch(self, stream):
+        """连接数变化时（可能在其他线程）转到评估流所在的事件循环上重新计时"""
+        try:
+            stream.loop.call_soon_threadsafe(self._rearm, stream)
+        except RuntimeError:
+            pass
+
+    def _rearm(self, stream):
+        if stream.finished or stream.task.done():
+            return
+        if stream.subscribers:
+            self._disarm(stream)
+        elif stream.abandon_handle is None:
+            if self.grace:
+                stream.abandon_handle = stream.loop.call_later(self.grace, self._abandon, stream)
+            else:
+                self._abandon(stream)
+
+    def _disarm(self, stream):
+        if stream.abandon_handle is not None:
+            stream.abandon_handle.cancel()
+            stream.abandon_handle = None
+
+    def _abandon(self, stream):
+        """没有任何连接时取消评估流程：进行中的上游请求随之关闭，尚未开始的轮次不再发出"""
+        stream.abandon_handle = None
+        if stream.subscribers or stream.task.done():
+            return
+        self._count('abandoned')
+        stream.task.cancel()
+
+    def resumed(self):
+        self._count('resumed')
+
+    def _count(self, name):
+        if self.on_event is not None:
+            self.on_event(name)
+
+    def _prune(self, now):
+        finished = sorted((stream.finished_at, stream_id) for stream_id, stream in self._streams.items()
+                          if stream.finished)
+        excess = len(self._streams) - self.max_streams + 1
+        for index, (finished_at, stream_id) in enumerate(finished):
+            if index < excess or now - finished_at > self.ttl:
+                self._streams.pop(stream_id).close()
+                self._count('expired')
@@ -0,0 +1,207 @@
+"""多网关负载均衡：按角色（主评估、结构化 JSON、政策分析）配置多个上游 (网关, 密钥, 模型)，按近期延迟选路并熔断故障上游
+
+- 每个上游记录首 token 时间与生成速度（输出字符/秒）的指数加权移动平均（EWMA）及进行中的调用数；
+- 选路时按“预计耗时 = 首 token 时间 + 预计输出 / 生成速度”乘以 (1 + 进行中调用数) / 权重 排序，
+  尚无样本的上游按已知上游中最快的估计参与排序，使新加入或恢复的上游也能分到请求；
+- 熔断器：连续失败 failure_threshold 次后断开 cooldown 秒（再次断开时冷却时间加倍，不超过 max_cooldown），
+  冷却结束后半开，只放行一个探测调用，成功则恢复、失败则重新断开；
+- 同一角色的全部上游都已断开时仍按最早恢复的顺序返回，由调用方照常尝试（不因熔断直接拒绝评估）。
+健康状态按 (网关, 模型) 记录，同一上游出现在多个角色中时共用。线程安全。
+"""
+import os
+import threading
+import time
+
+ROLES = ('main', 'structured', 'policy')
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+def endpoint_key(base_url, model):
+    return ((base_url or '').rstrip('/'), model)
+
+
+class Upstream:
+    """一个上游目标；weight 为相对容量（分到的请求大致与之成正比）"""
+
+    def __init__(self, base_url, api_key, model, weight=1.0):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model = model
+        self.weight = weight
+
+    @property
+    def key(self):
+        return endpoint_key(self.base_url, self.model)
+
+
+class _Health:
+    def __init__(self):
+        self.ttft = None
+        self.throughput = None
+        self.inflight = 0
+        self.failures = 0
+        self.state = CLOSED
+        self.opened_at = None
+        self.cooldown = None
+        self.probing = False
+        self.selected = 0
+        self.successes = 0
+        self.errors = 0
+        self.trips = 0
+
+
+class GatewayPool:
+    """按角色选取上游：ranked(role) 返回按优先级排列的上游列表，调用前后以 begin()/end() 计数，结果以
+    success() / failure() / slow() 反馈
+
+    roles 为 {角色: [Upstream, ...]}；未配置的角色由 from_config 按默认值补齐。clock 为返回秒数的单调时钟。
+    """
+
+    def __init__(self, roles, alpha=0.3, failure_threshold=3, cooldown=30.0, max_cooldown=300.0, clock=time.monotonic):
+        self.roles = {role: list(upstreams) for role, upstreams in roles.items() if upstreams}
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self._health = {}
+        for upstreams in self.roles.values():
+            for upstream in upstreams:
+                self._health.setdefault(upstream.key, _Health())
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, defaults, **options):
+        """config 为 {角色: [{'base_url', 'model', 'api_key' 或 'api_key_env', 'weight'}, ...]}，各字段缺省时取
+        defaults[角色] 的 (base_url, api_key, model)；未配置 structured 时与 main 相同，其余未配置的角色使用默认目标
+        """
+        roles = {}
+        for role in ROLES:
+            base_url, api_key, model = defaults[role]
+            items = config.get(role)
+            if not items:
+                roles[role] = roles['main'] if role == 'structured' else [Upstream(base_url, api_key, model)]
+                continue
+            roles[role] = [
+                Upstream(item.get('base_url') or base_url,
+                         item.get('api_key') or (os.getenv(item['api_key_env']) if item.get('api_key_env') else None) or api_key,
+                         item.get('model') or model,
+                         float(item.get('weight', 1.0)))
+                for item in items
+            ]
+        return cls(roles, **options)
+
+    def label(self, role):
+        """角色的模型标识（结果缓存键使用）：只有一个模型时为该模型名，否则为排序后的模型名以 + 连接"""
+        return '+'.join(sorted({upstream.model for upstream in self.roles[role]}))
+
+    def ranked(self, role, expected_chars=1000):
+        """该角色的上游按优先级排列：可用（闭合或可以探测）的按预计耗时升序，已断开的按恢复时间排在最后"""
+        upstreams = self.roles[role]
+        now = self.clock()
+        with self._lock:
+            known = [self._estimate(self._health[upstream.key], expected_chars) for upstream in upstreams]
+            known = [value for value in known if value is not None]
+            optimistic = min(known) if known else 1.0
+            available, blocked = [], []
+            for position, upstream in enumerate(upstreams):
+                health = self._health[upstream.key]
+                if health.state == OPEN and now - health.opened_at >= health.cooldown:
+                    health.state = HALF_OPEN
+                if health.state == CLOSED or health.state == HALF_OPEN and not health.probing:
+                    estimate = self._estimate(health, expected_chars)
+                    score = (optimistic if estimate is None else estimate) * (1 + health.inflight) / upstream.weight
+                    available.append((score, position, upstream))
+                else:
+                    reopen = health.opened_at + health.cooldown if health.state == OPEN else now
+                    blocked.append((reopen, position, upstream))
+            available.sort(key=lambda item: item[:2])
+            blocked.sort(key=lambda item: item[:2])
+            ordered = [upstream for _, _, upstream in available + blocked]
+            self._health[ordered[0].key].selected += 1
+        return ordered
+
+    def _estimate(self, health, expected_chars):
+        if health.ttft is None:
+            return None
+        if health.throughput:
+            return health.ttft + expected_chars / health.throughput
+        return health.ttft
+
+    def begin(self, base_url, model):
+        """一次调用发出；半开状态下的调用即为探测"""
+        with self._lock:
+            health = self._health.get(endpoint_key(base_url, model))
+            if health is None:
+                return
+            health.inflight += 1
+            if health.state == HALF_OPEN:
+                health.probing = True
+
+    def end(self, base_url, model):
+        with self._lock:
+            health = self._health.get(endpoint_key(base_url, model))
+            if health is not None:
+                health.inflight = max(0, health.inflight - 1)
+
+    def _update(self, current, sample):
+        return sample if current is None else current + self.alpha * (sample - current)
+
+    def success(self, base_url, model, ttft, output_chars=0, generation_time=None):
+        """调用产出了内容：更新首 token 时间与生成速度的 EWMA，并闭合熔断器"""
+        with self._lock:
+            health = self._health.get(endpoint_key(base_url, model))
+            if health is None:
+                return
+            health.ttft = self._update(health.ttft, ttft)
+            if output_chars and generation_time and generation_time > 0:
+                health.throughput = self._update(health.throughput, output_chars / generation_time)
+            health.successes += 1
+            health.failures = 0
+            health.state = CLOSED
+            health.cooldown = None
+            health.probing = False
+
+    def slow(self, base_url, model, elapsed):
+        """调用在首 token 之前被取消（对冲落败等）：elapsed 是首 token 时间的下限，超过当前估计时计入"""
+        with self._lock:
+            health = self._health.get(endpoint_key(base_url, model))
+            if health is None:
+                return
+            if health.ttft is None or elapsed > health.ttft:
+                health.ttft = self._update(health.ttft, elapsed)
+            if health.state == HALF_OPEN:
+                health.probing = False
+
+    def failure(self, base_url, model):
+        """调用失败（重试后仍出错、首 token 超时）；连续失败达到阈值或探测失败时断开"""
+        with self._lock:
+            health = self._health.get(endpoint_key(base_url, model))
+            if health is None:
+                return
+            health.errors += 1
+            health.failures += 1
+            health.probing = False
+            if health.state == HALF_OPEN or health.state == CLOSED and health.failures >= self.failure_threshold:
+                health.cooldown = (min(self.max_cooldown, health.cooldown * 2) if health.cooldown
+                                   else self.base_cooldown)
+                health.state = OPEN
+                health.opened_at = self.clock()
+                health.trips += 1
+
+    def knows(self, base_url, model):
+        return endpoint_key(base_url, model) in self._health
+
+    def stats(self):
+        """各上游的状态：所属角色、EWMA、进行中调用数、熔断状态与累计的选中/成功/失败/断开次数"""
+        with self._lock:
+            roles = {}
+            for role, upstreams in self.roles.items():
+                for upstream in upstreams:
+                    roles.setdefault(upstream.key, []).append(role)
+            return {key: {'roles': roles[key], 'state': health.state, 'ttft': health.ttft,
+                          'throughput': health.throughput, 'inflight': health.inflight,
+                          'selected': health.selected, 'successes': health.successes,
+                          'errors': health.errors, 'trips': health.trips}
+                    for key, health in self._health.items()}
@@ -0,0 +1,73 @@
+"""单轮 LLM 调用的截止时间、首 token 看门狗与对冲请求
+
+同一轮可能同时存在多个上游调用（主调用、对冲调用、看门狗超时后的替换调用），第一个产出内容的调用获胜，
+之后只转发获胜者的输出，其余调用被取消。
+"""
+import collections
+import threading
+
+
+class RoundTimeout(Exception):
+    """本轮（或整个评估）超过截止时间"""
+
+
+class HedgePolicy:
+    """对冲延迟：固定秒数，或按该 (网关, 模型) 最近成功调用的首 token 时间分位数计算
+
+    delay 为 0 时使用分位数，样本数不足 min_samples 时不对冲（首 token 看门狗仍然生效）。
+    """
+
+    def __init__(self, enabled=False, delay=0, percentile=0.95, min_samples=20, window=200, min_delay=1.0):
+        self.enabled = enabled
+        self.fixed_delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self._samples = collections.defaultdict(lambda: collections.deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, model, ttft):
+        with self._lock:
+            self._samples[(endpoint, model)].append(ttft)
+
+    def delay(self, endpoint, model):
+        """主调用发出后多少秒仍无首 token 时发起对冲；None 表示不对冲"""
+        if not self.enabled:
+            return None
+        if self.fixed_delay:
+            return self.fixed_delay
+        with self._lock:
+            samples = sorted(self._samples.get((endpoint, model), ()))
+        if len(samples) < self.min_samples:
+            return None
+        return max(self.min_delay, samples[min(len(samples) - 1, int(self.percentile * len(samples)))])
+
+
+class FirstTokenRace:
+    """多个调用竞争同一轮的输出
+
+    gate(name) 返回该调用使用的 emit：第一个发出内容片段的调用成为获胜者，此后只转发获胜者的事件；
+    未获胜调用的 error 事件暂存（全部失败时由调用方决定是否发送），queued 事件在决出胜负前照常转发。
+    """
+
+    def __init__(self, emit, on_win=None):
+        self.emit = emit
+        self.on_win = on_win
+        self.winner = None
+        self.held = collections.defaultdict(list)
+
+    def gate(self, name):
+        async def emit(chunk_data):
+            payload = getattr(chunk_data, 'payload', None) or {}
+            if self.winner is None and payload.get('status') == 'streaming':
+                self.winner = name
+                if self.on_win is not None:
+                    self.on_win(name)
+            if self.winner == name:
+                await self.emit(chunk_data)
+            elif self.winner is None:
+                if payload.get('status') == 'queued':
+                    await self.emit(chunk_data)
+                else:
+                    self.held[name].append(chunk_data)
+        return emit
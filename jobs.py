@@ -0,0 +1,295 @@
+"""评估任务：/evaluate 的异步任务 API
+
+提交后立即返回任务 ID，有界工作池在后台事件循环上运行六轮评估；任务状态（各轮部分输出、最终 review）
+保存在进程内或 SQLite 中，按数量与保留时间清理已结束的任务。请求体（含 API 密钥）只保存在内存队列中，不写入任务存储。
+"""
+import asyncio
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+FINISHED = ('complete', 'failed', 'cancelled')
+
+
+class QueueFull(Exception):
+    """等待中的任务已达上限"""
+
+
+def new_job():
+    now = time.time()
+    return {
+        'id': uuid.uuid4().hex,
+        'status': 'queued',
+        'created_at': now,
+        'started_at': None,
+        'finished_at': None,
+        'rounds': {},
+        'review': None,
+        'policy_analysis': None,
+        'timings': None,
+        'cache': None,
+        'error': None,
+    }
+
+
+class MemoryJobStore:
+    """进程内任务存储；读写均复制，调用方拿到的是快照"""
+
+    def __init__(self, max_jobs=1000, ttl=86400):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job):
+        with self._lock:
+            self._prune(time.time())
+            self._jobs[job['id']] = copy.deepcopy(job)
+
+    def save(self, job):
+        with self._lock:
+            if job['id'] in self._jobs:
+                self._jobs[job['id']] = copy.deepcopy(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return copy.deepcopy(job) if job is not None else None
+
+    def _prune(self, now):
+        finished = sorted((job['finished_at'], job_id) for job_id, job in self._jobs.items()
+                          if job['status'] in FINISHED)
+        excess = len(self._jobs) - self.max_jobs + 1
+        for index, (finished_at, job_id) in enumerate(finished):
+            if index < excess or now - finished_at > self.ttl:
+                del self._jobs[job_id]
+
+
+class SQLiteJobStore:
+    """SQLite 任务存储；重启时把未结束的任务标记为失败（请求体不落盘，无法恢复执行）"""
+
+    def __init__(self, path, max_jobs=1000, ttl=86400):
+        self.path = path
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, status TEXT NOT NULL, finished_at REAL, data TEXT NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_finished ON jobs(finished_at)')
+        for job_id, data in self._conn.execute(
+                "SELECT id, data FROM jobs WHERE status NOT IN ('complete', 'failed', 'cancelled')").fetchall():
+            job = json.loads(data)
+            job.update(status='failed', error='服务重启，任务中断', finished_at=time.time())
+            self._write(job)
+        self._conn.commit()
+
+    def _write(self, job):
+        self._conn.execute(
+            'INSERT OR REPLACE INTO jobs (id, status, finished_at, data) VALUES (?, ?, ?, ?)',
+            (job['id'], job['status'], job['finished_at'], json.dumps(job, ensure_ascii=False))
+        )
+
+    def create(self, job):
+        with self._lock:
+            now = time.time()
+            self._conn.execute('DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?', (now - self.ttl,))
+            count = self._conn.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+            if count >= self.max_jobs:
+                self._conn.execute(
+                    'DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE finished_at IS NOT NULL '
+                    'ORDER BY finished_at LIMIT ?)', (count - self.max_jobs + 1,)
+                )
+            self._write(job)
+            self._conn.commit()
+
+    def save(self, job):
+        with self._lock:
+            self._write(job)
+            self._conn.commit()
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute('SELECT data FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+
+def apply_event(job, contents, payload):
+    """将一条评估事件并入任务状态；contents 为各轮已收到的内容片段 {轮次: [片段]}
+
+    带 sub_round 的事件（第三轮按维度拆分时的各维度调用）记入该轮的 sub_rounds，内容片段的键为“轮次.子轮次”；
+    该轮本身的状态只由不带 sub_round 的事件决定（全部维度合并完成后才标记为 complete）；retry 事件表示该轮重新输出，
+    清空此前的内容与结果。
+    返回 True 表示状态有实质变化（应立即保存），流式片段返回 False。
+    """
+    status = payload.get('status')
+    if 'round' in payload:
+        key = str(payload['round'])
+        round_state = job['rounds'].setdefault(key, {
+            'round': payload['round'], 'reviewer': payload.get('reviewer'), 'status': 'running', 'content': '',
+        })
+        if payload.get('sub_round') is not None:
+            sub_key = str(payload['sub_round'])
+            key = f'{key}.{sub_key}'
+            round_state = round_state.setdefault('sub_rounds', {}).setdefault(sub_key, {
+                'sub_round': payload['sub_round'], 'dimension': payload.get('dimension'), 'status': 'running',
+                'content': '',
+            })
+        if status == 'streaming':
+            contents.setdefault(key, []).append(payload.get('content', ''))
+            return False
+        if status == 'start':
+            round_state['status'] = 'running'
+            if 'cache' in payload:
+                round_state['cache'] = payload['cache']
+        elif status == 'complete':
+            round_state['status'] = 'complete'
+        elif status == 'error':
+            round_state['status'] = 'error'
+            round_state['error'] = payload.get('message')
+        elif status == 'score':
+            round_state.setdefault('scores', []).append(payload.get('score'))
+        elif status == 'aggregate':
+            round_state['aggregate'] = payload.get('aggregate')
+        elif status == 'retry':
+            contents.pop(key, None)
+            for field in ('scores', 'aggregate', 'error', 'sub_rounds'):
+                round_state.pop(field, None)
+            round_state.update(status='running', content='')
+        return True
+    if status == 'near_duplicate':
+        job['near_duplicate'] = {key: value for key, value in payload.items() if key != 'status'}
+    elif status == 'timings':
+        job['timings'] = {'rounds': payload.get('timings'), 'context': payload.get('context'),
+                          'total_duration': payload.get('total_duration')}
+    elif status == 'complete':
+        job.update(status='complete', review=payload.get('review'), policy_analysis=payload.get('policy_analysis'),
+                   cache=payload.get('cache'), served_by=payload.get('served_by'))
+    elif status == 'validation_failed':
+        job.update(status='failed', error=payload.get('message'), reasons=payload.get('reasons'))
+    elif status == 'error' or 'error' in payload:
+        job.update(status='failed', error=payload.get('message') or payload.get('error'))
+    return True
+
+
+class JobRunner:
+    """有界工作池：workers 个协程在后台事件循环上依次取出任务执行；等待中的任务超过 queue_size 时拒绝提交
+
+    run(data) 返回评估事件（数据字典）的异步迭代器。
+    """
+
+    def __init__(self, store, run, loop_factory, workers=4, queue_size=100, save_interval=0.5):
+        self.store = store
+        self.run = run
+        self.loop_factory = loop_factory
+        self.workers = workers
+        self.queue_size = queue_size
+        self.save_interval = save_interval
+        self._loop = None
+        self._queue = None
+        self._queued = 0
+        self._cancelled = set()
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = self.loop_factory()
+                asyncio.run_coroutine_threadsafe(self._start_workers(), self._loop).result()
+            return self._loop
+
+    async def _start_workers(self):
+        self._queue = asyncio.Queue()
+        for _ in range(self.workers):
+            asyncio.ensure_future(self._worker())
+
+    def submit(self, data):
+        """提交任务，返回任务快照；队列已满时抛出 QueueFull"""
+        loop = self._ensure_started()
+        with self._lock:
+            if self._queued >= self.queue_size:
+                raise QueueFull()
+            self._queued += 1
+        job = new_job()
+        self.store.create(job)
+        loop.call_soon_threadsafe(self._queue.put_nowait, (job, data))
+        return copy.deepcopy(job)
+
+    def cancel(self, job_id):
+        """取消任务：等待中的任务直接标记为已取消，运行中的任务取消其协程（连同进行中的上游请求）"""
+        job = self.store.get(job_id)
+        if job is None or job['status'] in FINISHED:
+            return job
+        with self._lock:
+            self._cancelled.add(job_id)
+            task = self._tasks.get(job_id)
+        if task is not None:
+            self._loop.call_soon_threadsafe(task.cancel)
+        elif job['status'] == 'queued':
+            job.update(status='cancelled', finished_at=time.time())
+            self.store.save(job)
+        return job
+
+    async def _worker(self):
+        while True:
+            job, data = await self._queue.get()
+            with self._lock:
+                self._queued -= 1
+                if job['id'] in self._cancelled:
+                    self._cancelled.discard(job['id'])
+                    continue
+                task = asyncio.ensure_future(self._run_job(job, data))
+                self._tasks[job['id']] = task
+            try:
+                await asyncio.gather(task, return_exceptions=True)
+            finally:
+                with self._lock:
+                    self._tasks.pop(job['id'], None)
+                    self._cancelled.discard(job['id'])
+
+    async def _run_job(self, job, data):
+        contents = {}
+
+        def save():
+            for key, parts in contents.items():
+                round_key, _, sub_key = key.partition('.')
+                state = job['rounds'][round_key]
+                if sub_key:
+                    state = state['sub_rounds'][sub_key]
+                state['content'] = ''.join(parts)
+            self.store.save(job)
+
+        job.update(status='running', started_at=time.time())
+        save()
+        last_save = time.monotonic()
+        try:
+            async for payload in self.run(data):
+                if apply_event(job, contents, payload) or time.monotonic() - last_save >= self.save_interval:
+                    save()
+                    last_save = time.monotonic()
+            if job['status'] == 'running':
+                # 某一轮失败时评估流程提前结束，以该轮的错误信息作为任务的失败原因
+                errors = [state['error'] for state in job['rounds'].values() if state['status'] == 'error']
+                job.update(status='failed', error=errors[-1] if errors else '评估流程未返回结果')
+        except asyncio.CancelledError:
+            job['status'] = 'cancelled'
+            for state in job['rounds'].values():
+                for item in [state, *state.get('sub_rounds', {}).values()]:
+                    if item['status'] == 'running':
+                        item['status'] = 'cancelled'
+        except Exception as e:
+            job.update(status='failed', error=f'评估过程中出现错误: {str(e)}')
+        finally:
+            job['finished_at'] = time.time()
+            save()
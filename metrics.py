@@ -0,0 +1,339 @@
+"""评估流程的运行指标：各轮 LLM 调用的排队时间、首 token 时间、耗时与用量，以 Prometheus 文本格式导出"""
+import threading
+import time
+
+# 秒级延迟直方图的桶边界
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+ROUND_LABELS = ('round', 'reviewer', 'model', 'endpoint')
+
+# 网关池熔断器状态的数值表示
+GATEWAY_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+class RoundTiming:
+    """单轮 LLM 调用的计时与用量记录
+
+    各时间点取自 time.monotonic()；queued_at 为该轮所属阶段进入就绪状态（依赖全部完成）的时间。
+    """
+
+    def __init__(self, round_num, reviewer, model, endpoint, queued_at=None):
+        self.round = round_num
+        self.reviewer = reviewer
+        self.model = model
+        self.endpoint = endpoint
+        self.queued_at = queued_at
+        self.started_at = None
+        self.first_token_at = None
+        self.finished_at = None
+        self.chunks = 0
+        self.output_chars = 0
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.cached_tokens = None
+        self.fallback = False
+        self.retries = 0
+        self.path = 'primary'
+        self.status = 'ok'
+
+    def start(self):
+        self.started_at = time.monotonic()
+        if self.queued_at is None:
+            self.queued_at = self.started_at
+
+    def chunk(self, content):
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+        self.chunks += 1
+        self.output_chars += len(content)
+
+    def usage(self, usage):
+        """记录上游返回的 usage（可能为 None）"""
+        if usage is None:
+            return
+        if getattr(usage, 'prompt_tokens', None) is not None:
+            self.prompt_tokens = usage.prompt_tokens
+        if getattr(usage, 'completion_tokens', None) is not None:
+            self.completion_tokens = usage.completion_tokens
+        # 命中上游前缀缓存的提示 token：DeepSeek 为 prompt_cache_hit_tokens，OpenAI 为 prompt_tokens_details.cached_tokens
+        cached = getattr(usage, 'prompt_cache_hit_tokens', None)
+        if cached is None:
+            cached = getattr(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens', None)
+        if cached is not None:
+            self.cached_tokens = cached
+
+    def adopt(self, attempt, path):
+        """以实际产出本轮结果的调用（对冲、替换调用等）的记录为准（发出请求的时间由调用方取最早的一次）"""
+        self.model = attempt.model
+        self.endpoint = attempt.endpoint
+        self.first_token_at = attempt.first_token_at
+        self.chunks = attempt.chunks
+        self.output_chars = attempt.output_chars
+        self.prompt_tokens = attempt.prompt_tokens
+        self.completion_tokens = attempt.completion_tokens
+        self.cached_tokens = attempt.cached_tokens
+        self.retries += attempt.retries
+        if attempt.status == 'error':
+            self.status = 'error'
+        self.path = path
+
+    def finish(self, status=None):
+        """结束计时；status 为 None 时保留当前状态（流式处理中途出错时已标记为 error）"""
+        self.finished_at = time.monotonic()
+        if status is not None:
+            self.status = status
+
+    @property
+    def queue_time(self):
+        if self.started_at is None:
+            return None
+        return self.started_at - self.queued_at
+
+    @property
+    def ttft(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def duration(self):
+        if self.finished_at is None or self.started_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    def labels(self):
+        return (str(self.round), self.reviewer, self.model, self.endpoint)
+
+    def as_dict(self):
+        """SSE timings 事件中的单轮记录"""
+        return {
+            'round': self.round,
+            'reviewer': self.reviewer,
+            'model': self.model,
+            'endpoint': self.endpoint,
+            'status': self.status,
+            'fallback': self.fallback,
+            'retries': self.retries,
+            'path': self.path,
+            'queue_time': self.queue_time,
+            'ttft': self.ttft,
+            'duration': self.duration,
+            'chunks': self.chunks,
+            'output_chars': self.output_chars,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'cached_tokens': self.cached_tokens,
+        }
+
+
+class Histogram:
+    """累积桶直方图（Prometheus 语义）"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """按 (round, reviewer, model, endpoint) 标签聚合各轮指标，线程安全"""
+
+    HISTOGRAMS = (
+        ('benzieval_llm_round_queue_seconds', '阶段就绪到发出上游请求的等待时间（含准入排队）', 'queue_time'),
+        ('benzieval_llm_round_ttft_seconds', '发出上游请求到收到首个内容片段的时间', 'ttft'),
+        ('benzieval_llm_round_duration_seconds', '单轮 LLM 调用总耗时（含非流式回退）', 'duration'),
+    )
+    COUNTERS = (
+        ('benzieval_llm_round_chunks_total', '收到的流式内容片段数', 'chunks'),
+        ('benzieval_llm_round_output_chars_total', '输出字符数', 'output_chars'),
+        ('benzieval_llm_prompt_tokens_total', '上游报告的提示 token 数', 'prompt_tokens'),
+        ('benzieval_llm_completion_tokens_total', '上游报告的生成 token 数', 'completion_tokens'),
+        ('benzieval_llm_cached_prompt_tokens_total', '上游报告的命中前缀缓存的提示 token 数', 'cached_tokens'),
+        ('benzieval_llm_round_retries_total', '上游请求失败后的重试次数', 'retries'),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {name: {} for name, _, _ in self.HISTOGRAMS}
+        self._counters = {name: {} for name, _, _ in self.COUNTERS}
+        self._rounds = {}  # (labels, status) -> 次数
+        self._context = {}  # 轮次 -> [裁剪前 token, 节省 token]
+        self._prevalidation = {}  # 结果 -> 次数
+        self._paths = {}  # (labels, path) -> 次数
+        self._policy_cache = {}  # (学科, 状态) -> 次数
+        self._near_duplicates = {}  # (处理方式, 结果) -> 次数
+        self._streams = {}  # 事件 -> 次数
+        self._completion = {}  # 轮次 -> [成功调用的生成 token 合计, 次数]，用于估算取消节省的 token
+        self._cancelled = {}  # (轮次, 阶段) -> [次数, 节省的估算 token]
+
+    def observe_round(self, timing):
+        labels = timing.labels()
+        with self._lock:
+            key = (labels, timing.status)
+            self._rounds[key] = self._rounds.get(key, 0) + 1
+            key = (labels, timing.path)
+            self._paths[key] = self._paths.get(key, 0) + 1
+            for name, _, attr in self.HISTOGRAMS:
+                value = getattr(timing, attr)
+                if value is not None:
+                    self._histograms[name].setdefault(labels, Histogram()).observe(value)
+            for name, _, attr in self.COUNTERS:
+                value = getattr(timing, attr)
+                if value is not None:
+                    self._counters[name][labels] = self._counters[name].get(labels, 0) + value
+            if timing.status == 'ok' and timing.completion_tokens is not None:
+                totals = self._completion.setdefault(str(timing.round), [0, 0])
+                totals[0] += timing.completion_tokens
+                totals[1] += 1
+
+    def observe_cancellation(self, timing, max_tokens, prompt_tokens=0):
+        """记录一次被取消的轮次（客户端断开、评估中止等），估算因此节省的 token
+
+        预计生成量取该轮以往成功调用的平均生成 token（没有记录时为 max_tokens），减去取消前已生成的部分
+        （上游未报告用量时按输出字符数计）；请求尚未发出（stage 为 queued）时加上调用方估算的提示 token。
+        """
+        round_label = str(timing.round)
+        with self._lock:
+            total, count = self._completion.get(round_label, (0, 0))
+            expected = min(total / count, max_tokens) if count else max_tokens
+            generated = timing.completion_tokens or timing.output_chars
+            saved = int(prompt_tokens + max(0, expected - generated))
+            stage = 'queued' if timing.started_at is None else 'streaming'
+            totals = self._cancelled.setdefault((round_label, stage), [0, 0])
+            totals[0] += 1
+            totals[1] += saved
+
+    def observe_context(self, round_num, report):
+        """记录一次上下文裁剪（context_budget.fit_sections 的报告）"""
+        with self._lock:
+            totals = self._context.setdefault(str(round_num), [0, 0])
+            totals[0] += report['original_tokens']
+            totals[1] += report['saved_tokens']
+
+    def observe_prevalidation(self, result):
+        """记录一次本地预校验结果（accepted / rejected / fast_path）"""
+        with self._lock:
+            self._prevalidation[result] = self._prevalidation.get(result, 0) + 1
+
+    def observe_policy_cache(self, discipline, state):
+        """记录一次共享政策分析缓存查询（hit / stale / miss / shared）"""
+        with self._lock:
+            key = (discipline, state)
+            self._policy_cache[key] = self._policy_cache.get(key, 0) + 1
+
+    def observe_near_duplicate(self, mode, result):
+        """记录一次近似重复查找（mode 为 reuse / partial / lookup，result 为 match / none）"""
+        with self._lock:
+            key = (mode, result)
+            self._near_duplicates[key] = self._near_duplicates.get(key, 0) + 1
+
+    def observe_stream(self, event):
+        """记录一次可续传评估流事件（started / resumed / abandoned / expired）"""
+        with self._lock:
+            self._streams[event] = self._streams.get(event, 0) + 1
+
+    def render(self, upstream=None, gateways=None):
+        """Prometheus 文本格式（0.0.4）；upstream 为上游调度器的 stats()，gateways 为网关池的 stats()，以瞬时值导出"""
+        lines = []
+        for name, help_text, field in (
+                ('benzieval_upstream_active', '进行中的上游请求数', 'active'),
+                ('benzieval_upstream_queued', '等待准入的上游请求数', 'queued'),
+                ('benzieval_upstream_window_tokens', '最近一分钟预留与消耗的 token 数', 'window_tokens')):
+            if upstream:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} gauge')
+                for (endpoint, model), stats in sorted(upstream.items()):
+                    lines.append(f"{name}{_format_labels(('endpoint', 'model'), (endpoint, model))} {stats[field]}")
+        if gateways:
+            for name, help_text, kind, field in (
+                    ('benzieval_gateway_ttft_ewma_seconds', '网关池上游首 token 时间的 EWMA', 'gauge', 'ttft'),
+                    ('benzieval_gateway_throughput_ewma_chars', '网关池上游生成速度（输出字符/秒）的 EWMA', 'gauge', 'throughput'),
+                    ('benzieval_gateway_inflight', '网关池上游进行中的调用数', 'gauge', 'inflight'),
+                    ('benzieval_gateway_circuit_state', '熔断器状态（0 闭合，1 半开，2 断开）', 'gauge', 'state'),
+                    ('benzieval_gateway_selected_total', '被选为主调用的次数', 'counter', 'selected'),
+                    ('benzieval_gateway_successes_total', '产出内容的调用次数', 'counter', 'successes'),
+                    ('benzieval_gateway_errors_total', '失败或首 token 超时的调用次数', 'counter', 'errors'),
+                    ('benzieval_gateway_circuit_trips_total', '熔断器断开次数', 'counter', 'trips')):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for (endpoint, model), stats in sorted(gateways.items()):
+                    value = stats[field]
+                    if field == 'state':
+                        value = GATEWAY_STATES[value]
+                    if value is not None:
+                        lines.append(f"{name}{_format_labels(('endpoint', 'model'), (endpoint, model))} {_format_value(value)}")
+        with self._lock:
+            lines.append('# HELP benzieval_llm_rounds_total 完成的 LLM 调用轮数（按结果状态）')
+            lines.append('# TYPE benzieval_llm_rounds_total counter')
+            for (labels, status), count in sorted(self._rounds.items()):
+                lines.append(f"benzieval_llm_rounds_total{_format_labels(ROUND_LABELS, labels, [('status', status)])} {count}")
+            lines.append('# HELP benzieval_llm_round_path_total 实际产出各轮结果的调用路径（primary / hedge / watchdog / failover / fallback）')
+            lines.append('# TYPE benzieval_llm_round_path_total counter')
+            for (labels, path), count in sorted(self._paths.items()):
+                lines.append(f"benzieval_llm_round_path_total{_format_labels(ROUND_LABELS, labels, [('path', path)])} {count}")
+            for name, help_text, _ in self.HISTOGRAMS:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for labels, histogram in sorted(self._histograms[name].items()):
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f"{name}_bucket{_format_labels(ROUND_LABELS, labels, [('le', bound)])} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(ROUND_LABELS, labels, [('le', '+Inf')])} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(ROUND_LABELS, labels)} {_format_value(histogram.sum)}")
+                    lines.append(f"{name}_count{_format_labels(ROUND_LABELS, labels)} {histogram.count}")
+            for name, help_text, _ in self.COUNTERS:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for labels, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_format_labels(ROUND_LABELS, labels)} {_format_value(value)}")
+            for index, (name, help_text) in enumerate((
+                    ('benzieval_context_tokens_original_total', '上下文裁剪前的估算 token 数'),
+                    ('benzieval_context_tokens_saved_total', '上下文裁剪节省的估算 token 数'))):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for round_label, totals in sorted(self._context.items()):
+                    lines.append(f"{name}{_format_labels(('round',), (round_label,))} {totals[index]}")
+            lines.append('# HELP benzieval_prevalidation_total 本地预校验结果（rejected 的请求未调用上游）')
+            lines.append('# TYPE benzieval_prevalidation_total counter')
+            for result, count in sorted(self._prevalidation.items()):
+                lines.append(f"benzieval_prevalidation_total{_format_labels(('result',), (result,))} {count}")
+            lines.append('# HELP benzieval_policy_cache_total 共享政策分析缓存查询次数（按学科与状态）')
+            lines.append('# TYPE benzieval_policy_cache_total counter')
+            for (discipline, state), count in sorted(self._policy_cache.items()):
+                lines.append(f"benzieval_policy_cache_total{_format_labels(('discipline', 'state'), (discipline, state))} {count}")
+            lines.append('# HELP benzieval_near_duplicate_lookups_total 近似重复材料查找次数（按处理方式与是否找到）')
+            lines.append('# TYPE benzieval_near_duplicate_lookups_total counter')
+            for (mode, result), count in sorted(self._near_duplicates.items()):
+                lines.append(f"benzieval_near_duplicate_lookups_total{_format_labels(('mode', 'result'), (mode, result))} {count}")
+            lines.append('# HELP benzieval_sse_streams_total 可续传评估流的事件次数（新建、续传、无连接取消、过期清理）')
+            lines.append('# TYPE benzieval_sse_streams_total counter')
+            for event, count in sorted(self._streams.items()):
+                lines.append(f"benzieval_sse_streams_total{_format_labels(('event',), (event,))} {count}")
+            for index, (name, help_text) in enumerate((
+                    ('benzieval_cancelled_rounds_total', '被取消的轮次（queued 为尚未发出请求，streaming 为生成中途关闭）'),
+                    ('benzieval_cancellation_tokens_saved_total', '取消轮次节省的估算 token 数'))):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for (round_label, stage), totals in sorted(self._cancelled.items()):
+                    lines.append(f"{name}{_format_labels(('round', 'stage'), (round_label, stage))} {totals[index]}")
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,255 @@
+"""近似重复申请材料检测：MinHash 签名 + LSH 分桶索引，找出与此前评估过的材料高度相似的提交
+
+申请人常在一个申报周期内多次提交只做了少量修改的材料，内容哈希（结果缓存的键）无法命中。本模块：
+- 按中文逐字、英文与数字按词切分，以连续 shingle_size 个词元为一个 shingle；
+- 用单次置换 MinHash（one permutation hashing，空桶按旋转补齐）计算签名，每份材料只需遍历一次 shingle；
+- 签名按 bands × rows 分段，每段的哈希作为 LSH 桶；查询只比较与新材料至少一段完全相同的候选，
+  并以签名估算的 Jaccard 相似度排序，与存量大小基本无关；
+- 另存每个段落的哈希与关键词掩码（不含原文），用于判断修改涉及哪些段落、哪些维度。
+索引保存在 SQLite 中（未指定路径时为内存数据库），超出 max_entries 时先清理最早加入的记录。
+"""
+import array
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# 中日韩统一表意文字（含扩展 A 与兼容区）逐字切分；字母与数字按连续串切分，其余字符视为分隔
+TOKEN = re.compile(r'[㐀-䶿一-鿿豈-﫿]|[a-z0-9]+')
+
+_MASK32 = 0xFFFFFFFF
+# 空桶补齐时按距离加上的偏移，使借用的值与原桶不同（Shrivastava 2017 的旋转补齐）
+_ROTATION = 0x9E3779B1
+
+
+def tokenize(text):
+    """归一化（全/半角、大小写）后的词元列表"""
+    return TOKEN.findall(unicodedata.normalize('NFKC', text or '').lower())
+
+
+def _hash64(data):
+    return int.from_bytes(hashlib.blake2b(data.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _hash32(data):
+    return int.from_bytes(hashlib.blake2b(data.encode('utf-8'), digest_size=4).digest(), 'little')
+
+
+def paragraph_fingerprints(text, keyword_groups=()):
+    """[(段落哈希, 关键词掩码)]：第 i 位表示段落含 keyword_groups[i] 中的关键词；空段落被跳过
+
+    不含任何一组关键词的段落无法归入某一组，掩码取全部分组（修改这样的段落视为影响所有分组）。
+    """
+    all_groups = (1 << len(keyword_groups)) - 1
+    fingerprints = []
+    for line in (text or '').splitlines():
+        normalized = ' '.join(unicodedata.normalize('NFKC', line).split())
+        if not normalized:
+            continue
+        lowered = normalized.lower()
+        mask = 0
+        for index, keywords in enumerate(keyword_groups):
+            if any(keyword.lower() in lowered for keyword in keywords):
+                mask |= 1 << index
+        fingerprints.append((_hash32(normalized), mask or all_groups))
+    return fingerprints
+
+
+def paragraph_diff(old, new):
+    """两组段落指纹的差异，返回 (变化的段落数, 变化段落的关键词掩码之并)；新增与删除的段落都计入"""
+    old_hashes = {digest for digest, _ in old}
+    new_hashes = {digest for digest, _ in new}
+    changed = [(digest, mask) for digest, mask in new if digest not in old_hashes]
+    changed += [(digest, mask) for digest, mask in old if digest not in new_hashes]
+    mask = 0
+    for _, item_mask in changed:
+        mask |= item_mask
+    return len(changed), mask
+
+
+def _optimal_bands(threshold, num_perm):
+    """选取 bands × rows = num_perm 的划分，使阈值两侧的误判面积（漏检加误检）最小"""
+    def integrate(f, low, high, steps=200):
+        width = (high - low) / steps
+        return sum(f(low + (i + 0.5) * width) for i in range(steps)) * width
+
+    best = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        candidate = lambda s: 1 - (1 - s ** rows) ** bands
+        false_positive = integrate(candidate, 0.0, threshold)
+        false_negative = integrate(lambda s: 1 - candidate(s), threshold, 1.0)
+        error = false_positive + false_negative
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class MinHasher:
+    """单次置换 MinHash：shingle 哈希的低位选桶、高位取最小值；num_perm 须为 2 的幂"""
+
+    def __init__(self, num_perm=128, shingle_size=4):
+        if num_perm & (num_perm - 1):
+            raise ValueError('num_perm 须为 2 的幂')
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._bin_bits = num_perm.bit_length() - 1
+
+    def shingles(self, text):
+        tokens = tokenize(text)
+        size = self.shingle_size
+        if len(tokens) <= size:
+            return {_hash64('\x1f'.join(tokens))} if tokens else set()
+        return {_hash64('\x1f'.join(tokens[i:i + size])) for i in range(len(tokens) - size + 1)}
+
+    def signature(self, text):
+        """array('I')，长度 num_perm；空文本返回 None"""
+        hashes = self.shingles(text)
+        if not hashes:
+            return None
+        mins = [None] * self.num_perm
+        bin_mask = self.num_perm - 1
+        bits = self._bin_bits
+        for value in hashes:
+            slot = value & bin_mask
+            value >>= bits
+            if mins[slot] is None or value < mins[slot]:
+                mins[slot] = value
+        # 空桶取右侧（循环）第一个非空桶的值，并按距离加上偏移
+        signature = array.array('I', bytes(4 * self.num_perm))
+        for slot in range(self.num_perm):
+            distance = 0
+            while mins[(slot + distance) % self.num_perm] is None:
+                distance += 1
+            signature[slot] = (mins[(slot + distance) % self.num_perm] + distance * _ROTATION) & _MASK32
+        return signature
+
+    @staticmethod
+    def similarity(a, b):
+        """两个签名估算的 Jaccard 相似度"""
+        return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class NearDuplicateIndex:
+    """近似重复索引：add() 登记一份材料，query() 返回相似度不低于 threshold 的最相似记录
+
+    记录的 key 由调用方提供（如归一化材料的哈希），meta 为可 JSON 序列化的附加信息（不应包含原文）。
+    """
+
+    def __init__(self, path=None, threshold=0.8, num_perm=128, shingle_size=4, max_entries=200000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self.bands, self.rows = _optimal_bands(threshold, num_perm)
+        self._lock = threading.Lock()
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path or ':memory:', check_same_thread=False)
+        if path:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS proposals ('
+            'id INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL, signature BLOB NOT NULL, '
+            'paragraphs BLOB NOT NULL, meta TEXT NOT NULL, created_at REAL NOT NULL)'
+        )
+        # 签名参数变化后旧的分桶失效：按 (bands, rows) 分表
+        self._table = f'lsh_{self.bands}x{self.rows}_{shingle_size}'
+        self._conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {self._table} ('
+            'band INTEGER NOT NULL, bucket INTEGER NOT NULL, id INTEGER NOT NULL, '
+            'PRIMARY KEY (band, bucket, id)) WITHOUT ROWID'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS proposals_created ON proposals(created_at)')
+        self._conn.commit()
+        self._count = self._conn.execute('SELECT COUNT(*) FROM proposals').fetchone()[0]
+
+    def _buckets(self, signature):
+        rows = self.rows
+        for band in range(self.bands):
+            chunk = signature[band * rows:(band + 1) * rows].tobytes()
+            yield band, int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), 'little', signed=True)
+
+    def add(self, key, text, meta=None, keyword_groups=()):
+        """登记一份材料；同一 key 重复登记时覆盖旧记录"""
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return
+        self.add_signature(key, signature, paragraph_fingerprints(text, keyword_groups), meta)
+
+    def add_signature(self, key, signature, paragraphs=(), meta=None):
+        packed = array.array('I', (value for pair in paragraphs for value in pair))
+        with self._lock:
+            self._delete_key(key)
+            cursor = self._conn.execute(
+                'INSERT INTO proposals (key, signature, paragraphs, meta, created_at) VALUES (?, ?, ?, ?, ?)',
+                (key, signature.tobytes(), packed.tobytes(), json.dumps(meta or {}, ensure_ascii=False), time.time()))
+            row_id = cursor.lastrowid
+            self._count += 1
+            self._conn.executemany(f'INSERT OR IGNORE INTO {self._table} (band, bucket, id) VALUES (?, ?, ?)',
+                                   [(band, bucket, row_id) for band, bucket in self._buckets(signature)])
+            if self._count > self.max_entries:
+                self._delete_ids([row[0] for row in self._conn.execute(
+                    'SELECT id FROM proposals ORDER BY created_at LIMIT ?', (self._count - self.max_entries,))])
+            self._conn.commit()
+
+    def query(self, text, keyword_groups=(), exclude=None):
+        """最相似的记录 {'key', 'similarity', 'meta', 'created_at', 'changed_paragraphs', 'changed_mask'}；没有时返回 None
+
+        exclude 为不参与比较的 key（如本次材料自身）。
+        """
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return None
+        with self._lock:
+            candidates = set()
+            for band, bucket in self._buckets(signature):
+                candidates.update(row[0] for row in self._conn.execute(
+                    f'SELECT id FROM {self._table} WHERE band = ? AND bucket = ?', (band, bucket)))
+            if not candidates:
+                return None
+            placeholders = ','.join('?' * len(candidates))
+            rows = self._conn.execute(
+                f'SELECT key, signature, paragraphs, meta, created_at FROM proposals WHERE id IN ({placeholders})',
+                list(candidates)).fetchall()
+        best = None
+        for key, blob, paragraphs, meta, created_at in rows:
+            if key == exclude:
+                continue
+            similarity = MinHasher.similarity(signature, array.array('I', blob))
+            if similarity >= self.threshold and (best is None or similarity > best[0]):
+                best = (similarity, key, paragraphs, meta, created_at)
+        if best is None:
+            return None
+        similarity, key, paragraphs, meta, created_at = best
+        stored = array.array('I', paragraphs)
+        changed, mask = paragraph_diff(list(zip(stored[::2], stored[1::2])),
+                                       paragraph_fingerprints(text, keyword_groups))
+        return {'key': key, 'similarity': similarity, 'meta': json.loads(meta), 'created_at': created_at,
+                'changed_paragraphs': changed, 'changed_mask': mask}
+
+    def __len__(self):
+        return self._count
+
+    def _delete_key(self, key):
+        row = self._conn.execute('SELECT id FROM proposals WHERE key = ?', (key,)).fetchone()
+        if row is not None:
+            self._delete_ids([row[0]])
+
+    def _delete_ids(self, ids):
+        """删除记录及其分桶（由签名重新计算分桶，按主键删除）"""
+        for row_id in ids:
+            row = self._conn.execute('SELECT signature FROM proposals WHERE id = ?', (row_id,)).fetchone()
+            if row is None:
+                continue
+            self._conn.executemany(f'DELETE FROM {self._table} WHERE band = ? AND bucket = ? AND id = ?',
+                                   [(band, bucket, row_id) for band, bucket in self._buckets(array.array('I', row[0]))])
+            self._conn.execute('DELETE FROM proposals WHERE id = ?', (row_id,))
+            self._count -= 1
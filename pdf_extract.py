@@ -0,0 +1,299 @@
+"""PDF 文本提取：上传文件与 URL 下载先写入有大小上限的临时文件，再按页码区间分片交给进程池并行提取
+
+提取结果按 PDF 内容的 SHA-256 缓存整份文本，并按页面指纹缓存各页文本，修订版 PDF 只需重新提取改动的页面。
+"""
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+import requests
+
+COPY_CHUNK_BYTES = 1024 * 1024
+
+
+class PDFTooLarge(Exception):
+    """PDF 超过大小上限"""
+
+
+def _spool(chunks, max_bytes):
+    """分块写入临时文件并计算 SHA-256，超过大小上限时删除文件并抛出 PDFTooLarge；返回 (路径, 摘要)"""
+    target = tempfile.NamedTemporaryFile(prefix='benzieval-', suffix='.pdf', delete=False)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with target:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise PDFTooLarge(f'PDF 超过大小上限（{max_bytes // (1024 * 1024)} MB）')
+                digest.update(chunk)
+                target.write(chunk)
+    except BaseException:
+        os.unlink(target.name)
+        raise
+    return target.name, digest.hexdigest()
+
+
+def spool_upload(stream, max_bytes):
+    """将上传的文件流分块写入临时文件，返回 (临时文件路径, SHA-256)（调用方负责删除文件）"""
+    return _spool(iter(lambda: stream.read(COPY_CHUNK_BYTES), b''), max_bytes)
+
+
+def download_pdf(url, max_bytes, timeout=30, validators=None):
+    """流式下载 PDF 到临时文件，超过大小上限时立即中止；返回 (临时文件路径, SHA-256, 响应头)
+
+    validators 为上次下载时记录的 ETag / Last-Modified，服务端返回 304 时路径与摘要为 None。
+    """
+    headers = {}
+    if validators:
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+    with requests.get(url, timeout=timeout, stream=True, headers=headers) as response:
+        if response.status_code == 304 and validators:
+            return None, None, response.headers
+        response.raise_for_status()
+        declared = response.headers.get('Content-Length')
+        if max_bytes and declared and declared.isdigit() and int(declared) > max_bytes:
+            raise PDFTooLarge(f'PDF 超过大小上限（{max_bytes // (1024 * 1024)} MB）')
+        path, digest = _spool(response.iter_content(COPY_CHUNK_BYTES), max_bytes)
+        return path, digest, response.headers
+
+
+def page_count(path):
+    return len(PyPDF2.PdfReader(path).pages)
+
+
+def extract_page_range(path, start, stop):
+    """提取 [start, stop) 页的文本（在工作进程中执行，每个分片独立打开文件）"""
+    return extract_page_list(path, range(start, stop))
+
+
+def extract_page_list(path, indexes):
+    """提取指定页码（从 0 开始）的文本"""
+    reader = PyPDF2.PdfReader(path)
+    return [reader.pages[index].extract_text() or '' for index in indexes]
+
+
+def _hash_stream(digest, obj):
+    obj = obj.get_object()
+    if hasattr(obj, 'get_data'):
+        digest.update(obj.get_data())
+
+
+def page_fingerprints(path):
+    """各页的内容指纹：内容流、表单 XObject、字体（名称、编码与 ToUnicode 映射）及旋转角度
+
+    只解压不解析文本，远快于 extract_text；指纹相同的页面提取结果相同，可跨文件复用。
+    """
+    fingerprints = []
+    for page in PyPDF2.PdfReader(path).pages:
+        digest = hashlib.sha256()
+        contents = page.get_contents()
+        if contents is not None:
+            digest.update(contents.get_data())
+        digest.update(repr(page.get('/Rotate', 0)).encode('utf-8'))
+        resources = page.get('/Resources')
+        resources = resources.get_object() if resources is not None else {}
+        fonts = resources.get('/Font')
+        fonts = fonts.get_object() if fonts is not None else {}
+        for name in sorted(fonts):
+            font = fonts[name].get_object()
+            digest.update(repr((name, font.get('/Subtype'), font.get('/BaseFont'))).encode('utf-8'))
+            encoding = font.get('/Encoding')
+            if encoding is not None:
+                digest.update(repr(encoding.get_object()).encode('utf-8'))
+            if font.get('/ToUnicode') is not None:
+                _hash_stream(digest, font['/ToUnicode'])
+        xobjects = resources.get('/XObject')
+        xobjects = xobjects.get_object() if xobjects is not None else {}
+        for name in sorted(xobjects):
+            xobject = xobjects[name].get_object()
+            if xobject.get('/Subtype') == '/Form':
+                digest.update(name.encode('utf-8'))
+                _hash_stream(digest, xobject)
+        fingerprints.append(digest.hexdigest())
+    return fingerprints
+
+
+class PDFExtractor:
+    """按页码区间分片的并行提取器；页数不超过一个分片时直接在当前进程提取，避免进程间开销
+
+    进程池使用 spawn 方式启动（评估服务进程中有事件循环线程，fork 不安全），首次使用时创建。
+    """
+
+    def __init__(self, workers=None, shard_pages=16):
+        # shard_pages 为分片的最小页数
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_pages = shard_pages
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def iter_pages(self, path, pages=None, known=None):
+        """按页序逐页产出 (页码, 文本)；各分片并行提取，先完成的分片等待前面的分片后再产出
+
+        known 为已知文本的页面 {页码: 文本}（如缓存命中的页面），这些页面不再提取。
+        """
+        pages = page_count(path) if pages is None else pages
+        known = known or {}
+        missing = [index for index in range(pages) if index not in known]
+        if len(missing) <= self.shard_pages or self.workers <= 1:
+            extracted = dict(zip(missing, extract_page_list(path, missing))) if missing else {}
+            for index in range(pages):
+                yield index, known[index] if index in known else extracted[index]
+            return
+        # 每个分片都要重新解析文件的交叉引用表，因此分片数控制在工作进程数的两倍左右
+        shard = max(self.shard_pages, -(-len(missing) // (self.workers * 2)))
+        pool = self.pool()
+        futures = [(missing[i:i + shard], pool.submit(extract_page_list, path, missing[i:i + shard]))
+                   for i in range(0, len(missing), shard)]
+        try:
+            next_index = 0
+            for indexes, future in futures:
+                for index, text in zip(indexes, future.result()):
+                    while next_index < index:
+                        yield next_index, known[next_index]
+                        next_index += 1
+                    yield index, text
+                    next_index = index + 1
+            for index in range(next_index, pages):
+                yield index, known[index]
+        finally:
+            # 客户端断开或出错时取消尚未开始的分片
+            for _, future in futures:
+                future.cancel()
+
+    def extract(self, path):
+        """提取全部页面，返回按页排列的文本列表"""
+        return [text for _, text in self.iter_pages(path)]
+
+
+class PDFTextCache:
+    """PDF 提取结果缓存，存储使用 result_cache.ResultCache（内存 LRU + 可选 SQLite，均按字节数淘汰）
+
+    键：整份文本按 PDF 字节的 SHA-256，单页文本按页面指纹，远程文件按 URL 记录 ETag / Last-Modified 与摘要。
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def document(self, digest):
+        return self.store.get(f'pdf-doc:{digest}')
+
+    def put_document(self, digest, texts):
+        self.store.put(f'pdf-doc:{digest}', texts)
+
+    def pages(self, fingerprints):
+        """已缓存的页面 {页码: 文本}"""
+        known = {}
+        for index, fingerprint in enumerate(fingerprints):
+            text = self.store.get(f'pdf-page:{fingerprint}')
+            if text is not None:
+                known[index] = text
+        return known
+
+    def put_pages(self, fingerprints, texts):
+        for index, text in texts.items():
+            self.store.put(f'pdf-page:{fingerprints[index]}', text)
+
+    def url_entry(self, url):
+        """上次下载该 URL 时记录的 {'etag', 'last_modified', 'digest'}"""
+        return self.store.get(f'pdf-url:{url}')
+
+    def put_url(self, url, headers, digest):
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if etag or last_modified:
+            self.store.put(f'pdf-url:{url}', {'etag': etag, 'last_modified': last_modified, 'digest': digest})
+
+
+class Extraction:
+    """一次 PDF 提取：先查整份文本缓存，未命中时按页面指纹复用已缓存的页面，只提取其余页面
+
+    迭代得到 (页码, 文本)；全部页面产出后写回缓存，stats() 给出命中情况与提取耗时。
+    texts 为调用方已从缓存取出的整份文本（如 URL 返回 304 时），此时 path 可为 None，不再查缓存，
+    避免两次查询之间条目被淘汰。
+    """
+
+    def __init__(self, extractor, cache, path, digest, texts=None):
+        self.extractor = extractor
+        self.cache = cache
+        self.path = path
+        self.digest = digest
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.fingerprints = None
+        if texts is None and cache is not None and digest:
+            texts = cache.document(digest)
+        if texts is not None:
+            self.document_hit = True
+            self.pages = len(texts)
+            self.known = dict(enumerate(texts))
+        else:
+            self.document_hit = False
+            if cache is not None:
+                self.fingerprints = page_fingerprints(path)
+                self.pages = len(self.fingerprints)
+                self.known = cache.pages(self.fingerprints)
+            else:
+                self.pages = page_count(path)
+                self.known = {}
+
+    def __iter__(self):
+        if self.document_hit:
+            pages = ((index, self.known[index]) for index in range(self.pages))
+        else:
+            pages = self.extractor.iter_pages(self.path, self.pages, self.known)
+        texts = []
+        for index, text in pages:
+            texts.append(text)
+            yield index, text
+        self.finished_at = time.monotonic()
+        if self.cache is not None and not self.document_hit:
+            self.cache.put_pages(self.fingerprints, {index: texts[index] for index in range(self.pages)
+                                                     if index not in self.known})
+            if self.digest:
+                self.cache.put_document(self.digest, texts)
+
+    def stats(self):
+        if self.document_hit:
+            status = 'hit'
+        elif self.known:
+            status = 'partial'
+        else:
+            status = 'miss'
+        return {
+            'cache': status,
+            'pages': self.pages,
+            'pages_reused': len(self.known),
+            'pages_extracted': self.pages - len(self.known),
+            'extraction_time': (self.finished_at or time.monotonic()) - self.started_at,
+        }
+
+
+def join_pages(page_texts):
+    """与逐页拼接（每页后加换行，整体去除首尾空白）的结果一致"""
+    return ''.join(text + '\n' for text in page_texts).strip()
+
+
+def remove_quietly(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
@@ -0,0 +1,79 @@
+"""共享政策分析缓存：同一学科、同一月份的申请共用一份政策搜索结果
+
+条目超过 refresh_after 秒后仍直接返回，同时在后台重新生成；超过 ttl 秒视为过期，需等待重新生成。
+同一个键同时只有一个生成任务，其余请求（可能来自不同的事件循环）等待它的结果；生成任务与发起它的请求解耦，
+请求被取消时生成仍会完成并写入缓存。
+"""
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+
+class IncompleteAnalysis(Exception):
+    """生成的政策分析不完整（如上游在流式输出中途断开）：不写入缓存，等待中的请求同样收到该异常"""
+
+
+class PolicyCache:
+    """store 为提供 get/put 的缓存（如 result_cache.ResultCache），值为 {'analysis', 'created_at'}"""
+
+    def __init__(self, store, ttl=7 * 86400, refresh_after=86400):
+        self.store = store
+        self.ttl = ttl
+        self.refresh_after = refresh_after
+        self._inflight = {}  # 键 -> concurrent.futures.Future
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+    async def get(self, key, generate, refresh=None):
+        """返回 (政策分析, 状态)
+
+        状态为 hit、stale（返回旧内容并已安排后台刷新）、miss（由本请求发起生成）或 shared（等待其他请求发起的生成）。
+        generate() 为生成政策分析文本的协程函数，refresh() 为后台刷新时使用的版本（缺省同 generate）；
+        生成失败时抛出其异常，不写入缓存。内容不完整时 generate 应抛出 IncompleteAnalysis 而不是返回部分内容。
+        """
+        entry = await asyncio.to_thread(self.store.get, key)
+        age = time.time() - entry['created_at'] if entry is not None else None
+        if age is not None and age < self.ttl:
+            if age >= self.refresh_after:
+                future, owner = self._claim(key)
+                if owner:
+                    self._start(key, refresh or generate, future)
+                return entry['analysis'], 'stale'
+            return entry['analysis'], 'hit'
+        future, owner = self._claim(key)
+        if owner:
+            self._start(key, generate, future)
+        # shield：请求被取消时不取消共享的生成任务
+        return await asyncio.shield(asyncio.wrap_future(future)), 'miss' if owner else 'shared'
+
+    def _claim(self, key):
+        """登记键的生成任务，返回 (future, 是否由调用方负责生成)"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = self._inflight[key] = concurrent.futures.Future()
+            return future, True
+
+    def _start(self, key, generate, future):
+        task = asyncio.ensure_future(self._generate(key, generate, future))
+        # 保留引用，避免后台任务在完成前被回收
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _generate(self, key, generate, future):
+        try:
+            analysis = await generate()
+            if not analysis:
+                raise ValueError('政策分析为空')
+            await asyncio.to_thread(self.store.put, key, {'analysis': analysis, 'created_at': time.time()})
+        except BaseException as e:
+            future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+        else:
+            future.set_result(analysis)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
@@ -0,0 +1,131 @@
+"""本地预校验：在调用任何上游模型之前，用毫秒级的规则拒绝明显无效的输入
+
+检查长度、有效字符比例、乱码比例、URL 密度、重复内容，以及是否包含申请材料的关键部分（教育、成果、研究计划等）。
+"""
+import os
+import re
+import zlib
+
+URL_PATTERN = re.compile(r'https?://\S+')
+
+# 有效字符：中日韩文字、字母与数字
+TEXT_CHAR = re.compile(r'[\u4e00-\u9fff\u3400-\u4dbfA-Za-z0-9]')
+
+# PDF 提取失败时常见的乱码：替换字符、私有区字符与控制字符
+GARBLED_CHAR = re.compile(r'[\ufffd\ue000-\uf8ff\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# 申请材料的关键部分及其关键词
+KEY_SECTIONS = {
+    'education': re.compile(r'教育|学历|学位|博士|硕士|毕业|博士后|university|ph\.?d|education', re.IGNORECASE),
+    'publications': re.compile(r'论文|发表|期刊|专著|专利|成果|引用|publication|journal|conference|patent', re.IGNORECASE),
+    'research': re.compile(r'研究方向|研究领域|科研|研究计划|工作设想|项目|课题|research|project', re.IGNORECASE),
+    'position': re.compile(r'教授|研究员|讲师|工作经历|任职|依托单位|professor|researcher|postdoc', re.IGNORECASE),
+}
+
+SECTION_NAMES = {
+    'education': '教育背景',
+    'publications': '学术成果',
+    'research': '研究方向/计划',
+    'position': '工作经历',
+}
+
+
+class GateConfig:
+    """预校验阈值；比例均为 0-1 之间的小数
+
+    fast_path_sections > 0 时，关键部分命中数不少于该值的输入走快速通道，跳过第一轮模型验证。
+    """
+
+    def __init__(self, min_chars=100, max_chars=200000, min_text_ratio=0.5, max_garbled_ratio=0.05,
+                 max_urls=3, max_url_ratio=0.3, min_compression_ratio=0.05, max_duplicate_line_ratio=0.6,
+                 min_sections=1, fast_path_sections=0):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.min_text_ratio = min_text_ratio
+        self.max_garbled_ratio = max_garbled_ratio
+        self.max_urls = max_urls
+        self.max_url_ratio = max_url_ratio
+        self.min_compression_ratio = min_compression_ratio
+        self.max_duplicate_line_ratio = max_duplicate_line_ratio
+        self.min_sections = min_sections
+        self.fast_path_sections = fast_path_sections
+
+    @classmethod
+    def from_env(cls):
+        """从 PREVALIDATION_* 环境变量读取阈值，未设置的使用默认值"""
+        defaults = cls()
+        config = cls()
+        for name, value in vars(defaults).items():
+            raw = os.getenv(f"PREVALIDATION_{name.upper()}")
+            if raw is not None:
+                setattr(config, name, type(value)(raw))
+        return config
+
+
+class GateResult:
+    """预校验结论：accepted 为 False 时 reasons 列出拒绝原因；fast_path 表示关键部分齐全，可跳过模型验证"""
+
+    def __init__(self, accepted, reasons, sections, fast_path, stats):
+        self.accepted = accepted
+        self.reasons = reasons
+        self.sections = sections
+        self.fast_path = fast_path
+        self.stats = stats
+
+    def summary(self):
+        """快速通道时代替第一轮模型输出的验证结论"""
+        found = '、'.join(SECTION_NAMES[name] for name in self.sections)
+        return (f"本地预校验通过：材料共 {self.stats['chars']} 字，包含{found}等关键部分，"
+                f"有效字符占比 {self.stats['text_ratio']:.0%}，未发现乱码或大量重复内容，适合进行深入评估。")
+
+
+def prevalidate(text, config):
+    """对申请材料做本地预校验，返回 GateResult"""
+    text = text or ''
+    length = len(text)
+    reasons = []
+
+    urls = URL_PATTERN.findall(text)
+    url_chars = sum(len(url) for url in urls)
+    body = URL_PATTERN.sub('', text)
+    visible = len(''.join(body.split()))
+    text_ratio = len(TEXT_CHAR.findall(body)) / visible if visible else 0.0
+    garbled_ratio = len(GARBLED_CHAR.findall(text)) / length if length else 0.0
+    raw = text.encode('utf-8')
+    compression_ratio = len(zlib.compress(raw)) / len(raw) if raw else 1.0
+    lines = [' '.join(line.split()) for line in text.splitlines() if line.strip()]
+    duplicate_line_ratio = 1 - len(set(lines)) / len(lines) if len(lines) >= 5 else 0.0
+    sections = [name for name, pattern in KEY_SECTIONS.items() if pattern.search(text)]
+
+    if length < config.min_chars:
+        reasons.append(f'内容过短（{length} 字，至少需要 {config.min_chars} 字），请提供完整的申请材料文本')
+    if length > config.max_chars:
+        reasons.append(f'内容过长（{length} 字，上限 {config.max_chars} 字）')
+    if len(urls) > config.max_urls or (urls and url_chars / length > config.max_url_ratio):
+        reasons.append('检测到过多URL链接，请提供实际的申请材料文本内容')
+    if visible and text_ratio < config.min_text_ratio:
+        reasons.append('有效文字占比过低，内容可能是符号、代码或格式残留')
+    if garbled_ratio > config.max_garbled_ratio:
+        reasons.append('检测到大量乱码，PDF 文本提取可能失败')
+    if length >= 500 and compression_ratio < config.min_compression_ratio:
+        reasons.append('内容高度重复，疑似模板或无效填充')
+    elif duplicate_line_ratio > config.max_duplicate_line_ratio:
+        reasons.append('重复行过多，疑似模板或无效填充')
+    if len(sections) < config.min_sections:
+        reasons.append('未找到申请材料的关键部分（教育背景、学术成果、研究方向、工作经历）')
+
+    accepted = not reasons
+    return GateResult(
+        accepted=accepted,
+        reasons=reasons,
+        sections=sections,
+        fast_path=accepted and config.fast_path_sections > 0 and len(sections) >= config.fast_path_sections,
+        stats={
+            'chars': length,
+            'urls': len(urls),
+            'text_ratio': text_ratio,
+            'garbled_ratio': garbled_ratio,
+            'compression_ratio': compression_ratio,
+            'duplicate_line_ratio': duplicate_line_ratio,
+        },
+    )
@@ -0,0 +1,42 @@
+"""上游请求速率限制：按网关限制每分钟发起的模型请求数，请求按到达顺序均匀错开"""
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    """按网关（base_url）的请求速率限制；rpm 为 0 时不限制
+
+    per_endpoint 为 {base_url: 每分钟请求数}，未列出的网关使用 rpm。
+    """
+
+    def __init__(self, rpm=0, per_endpoint=None):
+        self.rpm = rpm
+        self.per_endpoint = {endpoint.rstrip('/'): limit for endpoint, limit in (per_endpoint or {}).items()}
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def limit(self, endpoint):
+        return self.per_endpoint.get(endpoint.rstrip('/'), self.rpm)
+
+    async def acquire(self, endpoint):
+        """等待该网关的下一个请求时隙"""
+        limit = self.limit(endpoint)
+        if not limit:
+            return
+        key = endpoint.rstrip('/')
+        interval = 60.0 / limit
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(key, now))
+            self._next_slot[key] = slot + interval
+        if slot > now:
+            try:
+                await asyncio.sleep(slot - now)
+            except asyncio.CancelledError:
+                # 等待中被取消（评估流被放弃、任务取消、对冲落败）：时隙仍是最后预留的一个时归还，
+                # 否则之后的请求会被无谓地推迟
+                with self._lock:
+                    if self._next_slot.get(key) == slot + interval:
+                        self._next_slot[key] = slot
+                raise
@@ -0,0 +1,146 @@
+"""评估结果缓存：按内容哈希缓存各轮输出，支持进程内 LRU 与 SQLite 磁盘存储"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+
+
+def normalize_proposal(text):
+    """归一化申请材料：统一全/半角并压缩空白，使重新提取的同一PDF得到相同的键"""
+    text = unicodedata.normalize('NFKC', text or '')
+    return ' '.join(text.split())
+
+
+def cache_key(*parts):
+    """由任意可JSON序列化的部分计算内容哈希键"""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _encode(value):
+    return zlib.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+
+
+def _decode(blob):
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+class MemoryCache:
+    """进程内 LRU 缓存，按压缩后的字节数淘汰"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is None:
+                return None
+            self._entries.move_to_end(key)
+        return _decode(blob)
+
+    def put(self, key, value):
+        self.put_blob(key, _encode(value))
+
+    def put_blob(self, key, blob):
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= len(old)
+            self._entries[key] = blob
+            self.total_bytes += len(blob)
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+
+class SQLiteCache:
+    """SQLite 磁盘缓存，按最近访问时间淘汰，直到总大小低于上限"""
+
+    def __init__(self, path, max_bytes=512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results(accessed_at)')
+        self._conn.commit()
+
+    def get(self, key):
+        blob = self.get_blob(key)
+        return _decode(blob) if blob is not None else None
+
+    def get_blob(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute('UPDATE results SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            self._conn.commit()
+        return row[0]
+
+    def put(self, key, value):
+        self.put_blob(key, _encode(value))
+
+    def put_blob(self, key, blob):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO results (key, value, size, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, blob, len(blob), time.time())
+            )
+            total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+            while total > self.max_bytes:
+                row = self._conn.execute(
+                    'SELECT key, size FROM results ORDER BY accessed_at LIMIT 1'
+                ).fetchone()
+                if row is None:
+                    break
+                self._conn.execute('DELETE FROM results WHERE key = ?', (row[0],))
+                total -= row[1]
+            self._conn.commit()
+
+
+class ResultCache:
+    """两级缓存：先查内存，再查磁盘（命中后回填内存）；写入时两级同时写"""
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            blob = self.disk.get_blob(key)
+            if blob is not None:
+                self.memory.put_blob(key, blob)
+                value = _decode(blob)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        blob = _encode(value)
+        self.memory.put_blob(key, blob)
+        if self.disk is not None:
+            self.disk.put_blob(key, blob)
@@ -0,0 +1,212 @@
+"""上游调度：在评估流程与 OpenAI 客户端之间按 (网关, 模型) 限制并发请求数与每分钟 token 数
+
+超出限制的请求按到达顺序排队，排队期间定期报告队列位置；失败的请求按带抖动的指数退避重试，每次重试重新排队并计入同一预算。
+调度状态由线程锁保护，排队的请求可以来自不同的事件循环（WSGI 后台循环、ASGI 服务循环、批量评估）。
+"""
+import asyncio
+import collections
+import random
+import threading
+import time
+
+import openai
+
+# 排队的请求每隔多少秒重新检查 token 预算并报告队列位置
+QUEUE_POLL_INTERVAL = 1.0
+
+RETRYABLE_STATUS = frozenset((408, 409, 429, 500, 502, 503, 504))
+
+
+class EndpointLimits:
+    """单个 (网关, 模型) 的限制；0 表示不限制"""
+
+    def __init__(self, concurrency=0, tpm=0):
+        self.concurrency = concurrency
+        self.tpm = tpm
+
+
+class _Bucket:
+    def __init__(self, limits):
+        self.limits = limits
+        self.active = 0
+        self.waiters = collections.deque()
+        self.usage = collections.deque()  # [时间, token 数]，最近一个窗口内的预留与实际用量
+        self.window_tokens = 0
+
+
+class _Waiter:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.loop = asyncio.get_running_loop()
+        self.future = self.loop.create_future()
+        self.entry = None
+        self.granted = False
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Slot:
+    """一次上游调用占用的名额（async with）；settle() 用上游报告的实际 token 数替换预估值"""
+
+    def __init__(self, scheduler, key, tokens, on_queued):
+        self.scheduler = scheduler
+        self.key = key
+        self.tokens = tokens
+        self.on_queued = on_queued
+        self.entry = None
+
+    async def __aenter__(self):
+        self.entry = await self.scheduler._acquire(self.key, self.tokens, self.on_queued)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.scheduler._release(self.key)
+
+    def settle(self, tokens):
+        self.scheduler._settle(self.key, self.entry, tokens)
+
+
+class UpstreamScheduler:
+    """按 (base_url, model) 的准入控制
+
+    concurrency / tpm 为默认限制，per_endpoint 为 [{'base_url', 'model'（可选）, 'concurrency', 'tpm'}]，
+    同时指定模型的配置优先于只指定网关的配置。
+    """
+
+    def __init__(self, concurrency=0, tpm=0, per_endpoint=None, window=60.0):
+        self.default = EndpointLimits(concurrency, tpm)
+        self.per_endpoint = {}
+        for item in per_endpoint or []:
+            key = (item['base_url'].rstrip('/'), item.get('model'))
+            self.per_endpoint[key] = EndpointLimits(item.get('concurrency', 0), item.get('tpm', 0))
+        self.window = window
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def limits(self, base_url, model):
+        base_url = base_url.rstrip('/')
+        return (self.per_endpoint.get((base_url, model)) or self.per_endpoint.get((base_url, None))
+                or self.default)
+
+    def slot(self, base_url, model, tokens, on_queued=None):
+        """获取一个调用名额；tokens 为本次请求的预估 token 数（提示 + 生成上限）
+
+        需要排队时以当前队列位置（从 1 开始）调用 on_queued(position)，位置变化时再次调用。
+        """
+        return Slot(self, (base_url.rstrip('/'), model), tokens, on_queued)
+
+    def _bucket(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(self.limits(*key))
+        return bucket
+
+    def _admit(self, bucket, tokens, now):
+        """名额与 token 预算均有余量时占用并返回用量记录，否则返回 None（调用方持有锁）"""
+        limits = bucket.limits
+        while bucket.usage and now - bucket.usage[0][0] >= self.window:
+            bucket.window_tokens -= bucket.usage.popleft()[1]
+        if limits.concurrency and bucket.active >= limits.concurrency:
+            return None
+        # 窗口内没有用量时总是放行，避免超过预算的单个请求永远排队
+        if limits.tpm and bucket.usage and bucket.window_tokens + tokens > limits.tpm:
+            return None
+        bucket.active += 1
+        entry = [now, tokens]
+        bucket.usage.append(entry)
+        bucket.window_tokens += tokens
+        return entry
+
+    def _dispatch(self, bucket):
+        """按到达顺序放行队首的请求（调用方持有锁）"""
+        now = time.monotonic()
+        while bucket.waiters:
+            waiter = bucket.waiters[0]
+            entry = self._admit(bucket, waiter.tokens, now)
+            if entry is None:
+                return
+            bucket.waiters.popleft()
+            waiter.entry = entry
+            waiter.granted = True
+            waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+
+    async def _acquire(self, key, tokens, on_queued):
+        with self._lock:
+            bucket = self._bucket(key)
+            if not bucket.waiters:
+                entry = self._admit(bucket, tokens, time.monotonic())
+                if entry is not None:
+                    return entry
+            waiter = _Waiter(tokens)
+            bucket.waiters.append(waiter)
+            position = len(bucket.waiters)
+        reported = None
+        try:
+            while True:
+                if on_queued is not None and position != reported:
+                    reported = position
+                    await on_queued(position)
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter.future), QUEUE_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                with self._lock:
+                    if not waiter.granted:
+                        # token 窗口随时间滑动，无需等待其他请求结束也可能腾出预算
+                        self._dispatch(bucket)
+                    if waiter.granted:
+                        return waiter.entry
+                    position = bucket.waiters.index(waiter) + 1
+        except BaseException:
+            with self._lock:
+                if waiter.granted:
+                    bucket.active -= 1
+                    self._dispatch(bucket)
+                else:
+                    bucket.waiters.remove(waiter)
+                    self._dispatch(bucket)
+            raise
+
+    def _release(self, key):
+        with self._lock:
+            bucket = self._buckets[key]
+            bucket.active -= 1
+            self._dispatch(bucket)
+
+    def _settle(self, key, entry, tokens):
+        with self._lock:
+            bucket = self._buckets[key]
+            if bucket.usage and entry[0] >= bucket.usage[0][0]:
+                bucket.window_tokens += tokens - entry[1]
+            entry[1] = tokens
+
+    def stats(self):
+        """各 (网关, 模型) 的进行中请求数、排队数与窗口内 token 数"""
+        with self._lock:
+            return {key: {'active': bucket.active, 'queued': len(bucket.waiters),
+                          'window_tokens': bucket.window_tokens}
+                    for key, bucket in self._buckets.items()}
+
+
+def is_retryable(error):
+    """限流、超时、连接失败与网关 5xx 可重试；鉴权、参数错误等不重试"""
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS
+    return False
+
+
+def retry_delay(error, attempt, base=0.5, cap=20.0):
+    """第 attempt 次重试（从 0 开始）前的等待秒数：优先使用 Retry-After，否则为带完全抖动的指数退避"""
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    if retry_after:
+        try:
+            return min(cap, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * 2 ** attempt))
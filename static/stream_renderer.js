@@ -0,0 +1,162 @@
+// 评估流的前端渲染：SSE 增量解析与按动画帧批量写入 DOM（评估页面与 benchmarks/bench_render.html 共用）
+
+// 增量解析 SSE：按空行分帧，支持多行 data、id 字段与注释行（心跳）；数据块末尾不完整的帧留到下一次
+// onEvent 收到 {id, data}，没有对应字段时为 null
+function createSSEParser(onEvent) {
+    let buffer = '';
+
+    function dispatch(frame) {
+        let id = null;
+        const data = [];
+        frame.split('\n').forEach(line => {
+            if (line.endsWith('\r')) {
+                line = line.slice(0, -1);
+            }
+            if (!line || line[0] === ':') {
+                return;
+            }
+            const colon = line.indexOf(':');
+            const field = colon === -1 ? line : line.slice(0, colon);
+            let value = colon === -1 ? '' : line.slice(colon + 1);
+            if (value[0] === ' ') {
+                value = value.slice(1);
+            }
+            if (field === 'data') {
+                data.push(value);
+            } else if (field === 'id') {
+                id = value;
+            }
+        });
+        if (data.length || id !== null) {
+            onEvent({ id, data: data.length ? data.join('\n') : null });
+        }
+    }
+
+    return {
+        push(text) {
+            buffer += text;
+            if (buffer.indexOf('\n\n') === -1) {
+                return;
+            }
+            const frames = buffer.split('\n\n');
+            buffer = frames.pop();
+            frames.forEach(dispatch);
+        }
+    };
+}
+
+// 流式输出的渲染器：append() 只记录增量，每个动画帧把各节点的增量一次性追加到其文本节点末尾（先全部写入、
+// 再统一滚动，避免逐片段的样式计算与布局）；complete() 在该节点输出结束时整段渲染一次 Markdown。
+// reset() 丢弃节点已有与待写入的输出（该轮重新输出时）；defer(key, task) 把同一 key 的多次刷新合并为每帧一次
+// （如第五轮的部分评分结果）
+function createStreamRenderer(options = {}) {
+    const schedule = options.schedule || (callback => requestAnimationFrame(callback));
+    const renderMarkdown = options.renderMarkdown || (text => DOMPurify.sanitize(marked.parse(text)));
+    const states = new Map();  // 节点 -> {text, pending, textNode, rendered}
+    const dirty = new Set();
+    const tasks = new Map();
+    let scheduled = false;
+
+    function state(element) {
+        let item = states.get(element);
+        if (!item) {
+            item = { text: '', pending: [], textNode: null, rendered: false };
+            states.set(element, item);
+        }
+        return item;
+    }
+
+    function write(element) {
+        const item = states.get(element);
+        if (!item.pending.length) {
+            return false;
+        }
+        const delta = item.pending.length === 1 ? item.pending[0] : item.pending.join('');
+        item.pending = [];
+        if (item.rendered) {
+            // 完成后又收到输出（极少见）：恢复为纯文本继续追加
+            element.textContent = '';
+            element.style.whiteSpace = 'pre-wrap';
+            item.textNode = null;
+            item.rendered = false;
+        }
+        if (!item.textNode) {
+            item.textNode = document.createTextNode(item.text);
+            element.appendChild(item.textNode);
+        }
+        item.textNode.appendData(delta);
+        item.text += delta;
+        return true;
+    }
+
+    function frame() {
+        scheduled = false;
+        const written = [];
+        dirty.forEach(element => {
+            if (write(element)) {
+                written.push(element);
+            }
+        });
+        dirty.clear();
+        written.forEach(element => {
+            element.scrollTop = element.scrollHeight;
+        });
+        const pendingTasks = Array.from(tasks.values());
+        tasks.clear();
+        pendingTasks.forEach(task => task());
+    }
+
+    function request() {
+        if (!scheduled) {
+            scheduled = true;
+            schedule(frame);
+        }
+    }
+
+    return {
+        append(element, delta) {
+            if (!element || !delta) {
+                return;
+            }
+            state(element).pending.push(delta);
+            dirty.add(element);
+            request();
+        },
+        // markdown 为 false 时保留纯文本（如第五轮的 JSON 输出）
+        complete(element, markdown = true) {
+            if (!element) {
+                return;
+            }
+            const item = state(element);
+            write(element);
+            dirty.delete(element);
+            if (markdown && item.text && !item.rendered) {
+                element.innerHTML = renderMarkdown(item.text);
+                element.style.whiteSpace = 'normal';
+                item.textNode = null;
+                item.rendered = true;
+            }
+        },
+        reset(element) {
+            if (!element) {
+                return;
+            }
+            states.delete(element);
+            dirty.delete(element);
+            element.textContent = '';
+            element.style.whiteSpace = 'pre-wrap';
+        },
+        text(element) {
+            const item = states.get(element);
+            return item ? item.text + item.pending.join('') : '';
+        },
+        defer(key, task) {
+            tasks.set(key, task);
+            request();
+        },
+        // 立即写入全部增量并执行待刷新的任务（评估结束时在显示最终结果之前调用）
+        flush() {
+            frame();
+        }
+    };
+}
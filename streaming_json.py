@@ -0,0 +1,162 @@
+"""增量 JSON 解析：边接收模型输出边解析，在数组元素、对象字段完整时立即报告，输出被截断时补全为可用的结果
+
+解析器容忍模型输出中常见的偏差：JSON 前后的说明文字与 ``` 代码块标记、字符串中未转义的换行、
+未加引号的取值（原样保留为字符串）。
+"""
+import json
+
+_WHITESPACE = ' \t\r\n'
+_DELIMITERS = ',:]}' + _WHITESPACE
+
+
+class _Frame:
+    """一个尚未闭合的对象或数组"""
+
+    __slots__ = ('value', 'path', 'key', 'expect_key')
+
+    def __init__(self, value, path):
+        self.value = value
+        self.path = path
+        self.key = None
+        self.expect_key = isinstance(value, dict)
+
+
+class StreamingJSONParser:
+    """按片段喂入文本，feed() 返回本次新完成的 [(路径, 值)]
+
+    路径为从根到该值的键与下标组成的元组，例如 ('scores', 2) 或 ('aggregate',)；只报告深度不超过
+    max_depth 的值。对象与数组在开始时即挂到父节点上，因此 result() 在任意时刻都能返回已解析的部分。
+    """
+
+    def __init__(self, max_depth=2):
+        self.max_depth = max_depth
+        self.root = None
+        self.done = False
+        self._started = False
+        self._stack = []
+        self._token = None  # 'string' | 'literal' | None
+        self._chars = []
+        self._escape = False
+
+    def feed(self, text):
+        completed = []
+        for char in text:
+            if self.done:
+                break
+            if self._token == 'string':
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._token = None
+                    self._string_done(''.join(self._chars), completed)
+                    continue
+                self._chars.append(char)
+                continue
+            if self._token == 'literal':
+                if char not in _DELIMITERS and char != '"':
+                    self._chars.append(char)
+                    continue
+                self._token = None
+                self._value(_literal(''.join(self._chars)), completed)
+            if not self._started:
+                # 跳过 JSON 之前的说明文字与代码块标记
+                if char == '{':
+                    self._started = True
+                    self._open({})
+                continue
+            self._structural(char, completed)
+        return completed
+
+    def _structural(self, char, completed):
+        if char in _WHITESPACE:
+            return
+        frame = self._stack[-1] if self._stack else None
+        if char == '{':
+            self._open({})
+        elif char == '[':
+            self._open([])
+        elif char in '}]':
+            if frame is not None:
+                self._stack.pop()
+                self._complete(frame.path, frame.value, completed)
+        elif char == ',':
+            if frame is not None and isinstance(frame.value, dict):
+                frame.key = None
+                frame.expect_key = True
+        elif char == ':':
+            if frame is not None:
+                frame.expect_key = False
+        elif char == '"':
+            self._token = 'string'
+            self._chars = []
+        else:
+            self._token = 'literal'
+            self._chars = [char]
+
+    def _string_done(self, raw, completed):
+        try:
+            value = json.loads(f'"{raw}"', strict=False)
+        except json.JSONDecodeError:
+            value = raw
+        frame = self._stack[-1] if self._stack else None
+        if frame is not None and frame.expect_key:
+            frame.key = value
+        else:
+            self._value(value, completed)
+
+    def _attach(self, value):
+        """把值挂到当前容器上，返回其路径；没有可挂的位置（如缺少键）时返回 None"""
+        if not self._stack:
+            self.root = value
+            return ()
+        frame = self._stack[-1]
+        if isinstance(frame.value, list):
+            frame.value.append(value)
+            return frame.path + (len(frame.value) - 1,)
+        if frame.key is None or frame.expect_key:
+            return None
+        frame.value[frame.key] = value
+        return frame.path + (frame.key,)
+
+    def _open(self, value):
+        path = self._attach(value)
+        self._stack.append(_Frame(value, path if path is not None else ('?',)))
+
+    def _value(self, value, completed):
+        path = self._attach(value)
+        if path is not None:
+            self._complete(path, value, completed)
+
+    def _complete(self, path, value, completed):
+        if not path:
+            self.done = True
+        elif len(path) <= self.max_depth and path[0] != '?':
+            completed.append((path, value))
+
+    def result(self):
+        """结束解析并返回根对象；输出被截断时丢弃悬空的键与未结束的数字，保留未结束的字符串并闭合所有容器
+
+        尚未遇到 JSON 对象时返回 None。调用后不再接受输入。
+        """
+        if self.done or not self._started:
+            return self.root
+        frame = self._stack[-1] if self._stack else None
+        if self._token == 'string' and not (frame is not None and frame.expect_key):
+            raw = ''.join(self._chars)
+            if self._escape:
+                raw = raw[:-1]
+            self._string_done(raw, [])
+        # 截断的数字、true/false/null 无法判断原值，直接丢弃
+        self._token = None
+        self._stack = []
+        self.done = True
+        return self.root
+
+
+def _literal(text):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
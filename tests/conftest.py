@@ -0,0 +1,6 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 导入评估服务模块时会创建默认的 OpenAI 客户端
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,49 @@
+import asyncio
+
+import app_overseas_young_scholar as app
+
+
+class MemoryStore(dict):
+    def put(self, key, value):
+        self[key] = value
+
+
+def run_stage(stage):
+    events = []
+
+    async def emit(chunk_data):
+        events.append(app.event_payload(chunk_data))
+
+    value = asyncio.run(stage({}, emit))
+    return value, events
+
+
+def test_queued_events_are_not_replayed(monkeypatch):
+    monkeypatch.setattr(app, 'result_cache', MemoryStore())
+
+    async def stage_func(results, emit):
+        await emit(app.SSEEvent({'round': 2, 'reviewer': 'r', 'status': 'start'}))
+        await emit(app.SSEEvent({'round': 2, 'reviewer': 'r', 'status': 'queued', 'position': 3}))
+        await emit(app.SSEEvent({'round': 2, 'reviewer': 'r', 'status': 'streaming', 'content': '内容'}))
+        await emit(app.SSEEvent({'round': 2, 'reviewer': 'r', 'status': 'complete'}))
+        return '内容'
+
+    _, live = run_stage(app.cached_stage(stage_func, 'key', [], set()))
+    assert 'queued' in [payload['status'] for payload in live]
+    value, replayed = run_stage(app.cached_stage(stage_func, 'key', [], set()))
+    assert value == '内容'
+    assert [payload['status'] for payload in replayed] == ['start', 'streaming', 'complete']
+    assert replayed[0]['cache'] == 'hit'
+
+
+def test_failed_stage_is_not_cached(monkeypatch):
+    store = MemoryStore()
+    monkeypatch.setattr(app, 'result_cache', store)
+
+    async def stage_func(results, emit):
+        await emit(app.SSEEvent({'round': 2, 'reviewer': 'r', 'status': 'streaming', 'content': '部分'}))
+        await emit(app.SSEEvent({'round': 2, 'reviewer': 'r', 'status': 'error', 'message': '流式处理失败'}))
+        return '部分'
+
+    run_stage(app.cached_stage(stage_func, 'key', [], set()))
+    assert store == {}
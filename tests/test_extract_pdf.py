@@ -0,0 +1,26 @@
+import app_overseas_young_scholar as app
+
+
+class EvictingCache:
+    """document() 只在第一次查询时命中，模拟两次查询之间条目被 LRU 淘汰"""
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.lookups = 0
+
+    def url_entry(self, url):
+        return {'etag': '"v1"', 'last_modified': None, 'digest': 'abc'}
+
+    def document(self, digest):
+        self.lookups += 1
+        return self.texts if self.lookups == 1 else None
+
+
+def test_not_modified_url_survives_eviction(monkeypatch):
+    monkeypatch.setattr(app, 'pdf_cache', EvictingCache(['第一页', '第二页']))
+    monkeypatch.setattr(app, 'download_pdf', lambda url, max_bytes, validators=None: (None, None, None))
+    response = app.app.test_client().post('/extract_pdf', json={'pdf_url': 'http://example.com/a.pdf'})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['success'] and '第一页' in body['text'] and '第二页' in body['text']
+    assert body['stats']['cache'] == 'hit'
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+
+import app_overseas_young_scholar as app
+import jobs
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from mock_upstream import MockConfig, serve  # noqa: E402
+
+PROPOSAL = (
+    '申请人博士毕业于海外知名大学，现任助理教授，发表论文二十余篇，主持多项科研项目。'
+    '研究方向为面向新型储能材料的界面调控与器件集成，拟建立原位表征与多尺度模拟相结合的研究体系。'
+    '近五年以第一或通讯作者在领域重要期刊发表论文十二篇，获得国际学术会议最佳论文奖一次。'
+    '回国后计划组建十人左右的研究团队，与国内电池企业合作推进固态电解质界面的工程化验证。'
+    '预期在三年内突破高电压正极界面副反应的关键问题，形成具有自主知识产权的材料设计方法。'
+)
+
+
+def start_mock_upstream(config):
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    threading.Thread(target=lambda: asyncio.run(serve('127.0.0.1', port, config)), daemon=True).start()
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    return f'http://127.0.0.1:{port}/v1'
+
+
+def collect_events(data):
+    async def collect():
+        return [app.event_payload(chunk_data) async for chunk_data in app.evaluation_events(data)]
+
+    return [payload for payload in asyncio.run(collect()) if payload]
+
+
+def test_nested_json_falls_back_and_resets_rounds_4_and_5():
+    url = start_mock_upstream(MockConfig(tokens_per_second=100000, ttft=0, chunk_chars=50, nested_json=True))
+    events = collect_events({
+        'proposal_text': PROPOSAL, 'api_base': url, 'api_key': 'mock', 'pipeline': 'fused', 'use_cache': False,
+    })
+
+    retries = [payload for payload in events if payload.get('status') == 'retry']
+    assert sorted(payload['round'] for payload in retries) == [4, 5]
+
+    job = {'rounds': {}}
+    contents = {}
+    for payload in events:
+        jobs.apply_event(job, contents, payload)
+    for round_num in (4, 5):
+        retry_index = next(i for i, payload in enumerate(events)
+                           if payload.get('status') == 'retry' and payload.get('round') == round_num)
+        streamed_after = ''.join(payload.get('content', '') for payload in events[retry_index:]
+                                 if payload.get('round') == round_num and payload.get('status') == 'streaming')
+        streamed_before = ''.join(payload.get('content', '') for payload in events[:retry_index]
+                                  if payload.get('round') == round_num and payload.get('status') == 'streaming')
+        assert streamed_before
+        assert ''.join(contents[str(round_num)]) == streamed_after
+        assert job['rounds'][str(round_num)]['status'] == 'complete'
+    assert '"review"' not in ''.join(contents['5'])
+    assert len(job['rounds']['5']['scores']) == 5
+
+
+class MemoryStore(dict):
+    def put(self, key, value):
+        self[key] = value
+
+
+def test_cached_fallback_replays_only_two_round_output(monkeypatch):
+    monkeypatch.setattr(app, 'result_cache', MemoryStore())
+    url = start_mock_upstream(MockConfig(tokens_per_second=100000, ttft=0, chunk_chars=50, nested_json=True))
+    data = {'proposal_text': PROPOSAL, 'api_base': url, 'api_key': 'mock', 'pipeline': 'fused'}
+    live = collect_events(data)
+    replayed = collect_events(data)
+
+    assert 'retry' not in [payload.get('status') for payload in replayed]
+    assert any(payload.get('round') == 4 and payload.get('cache') == 'hit' for payload in replayed)
+    for round_num in (4, 5):
+        def final_output(events):
+            retry_index = max([i for i, payload in enumerate(events)
+                               if payload.get('status') == 'retry' and payload.get('round') == round_num] or [-1])
+            return ''.join(payload.get('content', '') for payload in events[retry_index + 1:]
+                           if payload.get('round') == round_num and payload.get('status') == 'streaming')
+        assert final_output(replayed) == final_output(live)
+    assert len([payload for payload in replayed if payload.get('status') == 'score' and payload.get('round') == 5]) == 5
@@ -0,0 +1,189 @@
+import pytest
+
+from gateway_pool import CLOSED, HALF_OPEN, OPEN, GatewayPool, Upstream
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+FAST = Upstream('http://fast/v1', 'key', 'model')
+MEDIUM = Upstream('http://medium/v1', 'key', 'model')
+SLOW = Upstream('http://slow/v1', 'key', 'model')
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make_pool(clock, upstreams=(FAST, MEDIUM, SLOW), **options):
+    options = dict({'alpha': 0.5, 'failure_threshold': 3, 'cooldown': 10.0, 'max_cooldown': 35.0}, **options)
+    return GatewayPool({'main': list(upstreams)}, clock=clock, **options)
+
+
+def observe(pool, upstream, ttft, chars_per_second):
+    pool.success(upstream.base_url, upstream.model, ttft, output_chars=chars_per_second, generation_time=1.0)
+
+
+def names(upstreams):
+    return [upstream.base_url.split('/')[2] for upstream in upstreams]
+
+
+def trip(pool, upstream):
+    for _ in range(pool.failure_threshold):
+        pool.failure(upstream.base_url, upstream.model)
+
+
+def test_ranks_by_expected_latency(clock):
+    pool = make_pool(clock, (SLOW, MEDIUM, FAST))
+    observe(pool, FAST, 0.2, 400)
+    observe(pool, MEDIUM, 0.5, 200)
+    observe(pool, SLOW, 1.5, 80)
+    assert names(pool.ranked('main', 1000)) == ['fast', 'medium', 'slow']
+    # 预计耗时 = 首 token 时间 + 预计输出 / 生成速度：输出很短时首 token 时间起决定作用
+    observe(pool, MEDIUM, 0.05, 200)
+    observe(pool, MEDIUM, 0.05, 200)
+    assert names(pool.ranked('main', 10)) == ['medium', 'fast', 'slow']
+    assert names(pool.ranked('main', 2000)) == ['fast', 'medium', 'slow']
+
+
+def test_inflight_calls_and_weight_shift_selection(clock):
+    heavy = Upstream('http://heavy/v1', 'key', 'model', weight=4.0)
+    pool = make_pool(clock, (FAST, heavy))
+    observe(pool, FAST, 1.0, 1000)
+    observe(pool, heavy, 2.0, 1000)
+    assert names(pool.ranked('main', 1000)) == ['heavy', 'fast']
+    pool = make_pool(clock, (FAST, MEDIUM))
+    observe(pool, FAST, 1.0, 1000)
+    observe(pool, MEDIUM, 1.5, 1000)
+    assert names(pool.ranked('main', 1000)) == ['fast', 'medium']
+    pool.begin(FAST.base_url, FAST.model)
+    assert names(pool.ranked('main', 1000)) == ['medium', 'fast']
+    pool.end(FAST.base_url, FAST.model)
+    assert names(pool.ranked('main', 1000)) == ['fast', 'medium']
+
+
+def test_unsampled_upstream_gets_optimistic_estimate(clock):
+    # 尚无样本的上游按已知上游中最快的估计排序（同分时按配置顺序）
+    pool = make_pool(clock, (SLOW, MEDIUM, FAST))
+    observe(pool, SLOW, 1.5, 80)
+    observe(pool, MEDIUM, 0.5, 200)
+    assert names(pool.ranked('main', 1000)) == ['medium', 'fast', 'slow']
+
+
+def test_breaker_trips_after_failure_threshold(clock):
+    pool = make_pool(clock)
+    for upstream, ttft in ((FAST, 0.2), (MEDIUM, 0.5), (SLOW, 1.5)):
+        observe(pool, upstream, ttft, 400)
+    for _ in range(pool.failure_threshold - 1):
+        pool.failure(FAST.base_url, FAST.model)
+    assert pool.stats()[FAST.key]['state'] == CLOSED
+    assert names(pool.ranked('main')) == ['fast', 'medium', 'slow']
+    pool.failure(FAST.base_url, FAST.model)
+    stats = pool.stats()[FAST.key]
+    assert (stats['state'], stats['trips'], stats['errors']) == (OPEN, 1, 3)
+    assert names(pool.ranked('main')) == ['medium', 'slow', 'fast']
+
+
+def test_success_resets_consecutive_failures(clock):
+    pool = make_pool(clock)
+    for _ in range(pool.failure_threshold - 1):
+        pool.failure(FAST.base_url, FAST.model)
+    observe(pool, FAST, 0.2, 400)
+    pool.failure(FAST.base_url, FAST.model)
+    assert pool.stats()[FAST.key]['state'] == CLOSED
+
+
+def test_half_open_admits_a_single_probe(clock):
+    pool = make_pool(clock)
+    for upstream, ttft in ((FAST, 0.2), (MEDIUM, 0.5), (SLOW, 1.5)):
+        observe(pool, upstream, ttft, 400)
+    trip(pool, FAST)
+    clock.advance(9.9)
+    assert names(pool.ranked('main')) == ['medium', 'slow', 'fast']
+    clock.advance(0.1)
+    assert names(pool.ranked('main')) == ['fast', 'medium', 'slow']
+    assert pool.stats()[FAST.key]['state'] == HALF_OPEN
+    # 探测调用进行中时，其余调用不再选中该上游
+    pool.begin(FAST.base_url, FAST.model)
+    assert names(pool.ranked('main')) == ['medium', 'slow', 'fast']
+    assert names(pool.ranked('main')) == ['medium', 'slow', 'fast']
+    observe(pool, FAST, 0.2, 400)
+    pool.end(FAST.base_url, FAST.model)
+    assert pool.stats()[FAST.key]['state'] == CLOSED
+    assert names(pool.ranked('main')) == ['fast', 'medium', 'slow']
+
+
+def test_probe_cancelled_before_first_token_allows_another_probe(clock):
+    pool = make_pool(clock)
+    trip(pool, FAST)
+    clock.advance(10)
+    pool.ranked('main')
+    pool.begin(FAST.base_url, FAST.model)
+    pool.slow(FAST.base_url, FAST.model, 0.5)
+    pool.end(FAST.base_url, FAST.model)
+    assert pool.stats()[FAST.key]['state'] == HALF_OPEN
+    assert 'fast' in names(pool.ranked('main')[:2])
+
+
+def test_failed_probe_doubles_cooldown_up_to_max(clock):
+    pool = make_pool(clock, (FAST, SLOW))
+    observe(pool, FAST, 0.2, 400)
+    observe(pool, SLOW, 1.5, 80)
+    trip(pool, FAST)
+    for cooldown in (10.0, 20.0, 35.0, 35.0):
+        clock.advance(cooldown - 0.1)
+        assert names(pool.ranked('main')) == ['slow', 'fast']
+        clock.advance(0.1)
+        assert names(pool.ranked('main')) == ['fast', 'slow']
+        pool.begin(FAST.base_url, FAST.model)
+        pool.failure(FAST.base_url, FAST.model)
+        pool.end(FAST.base_url, FAST.model)
+        assert pool.stats()[FAST.key]['state'] == OPEN
+    assert pool.stats()[FAST.key]['trips'] == 5
+    # 探测成功后冷却时间复位
+    clock.advance(35.0)
+    pool.ranked('main')
+    observe(pool, FAST, 0.2, 400)
+    trip(pool, FAST)
+    clock.advance(10.0)
+    assert names(pool.ranked('main')) == ['fast', 'slow']
+
+
+def test_failover_order_puts_open_upstreams_last_by_reopen_time(clock):
+    pool = make_pool(clock)
+    for upstream, ttft in ((FAST, 0.2), (MEDIUM, 0.5), (SLOW, 1.5)):
+        observe(pool, upstream, ttft, 400)
+    # 排在第二的上游即对冲、看门狗替换与失败接替的备用目标
+    assert names(pool.ranked('main')[:2]) == ['fast', 'medium']
+    trip(pool, MEDIUM)
+    clock.advance(5)
+    trip(pool, FAST)
+    assert names(pool.ranked('main')) == ['slow', 'medium', 'fast']
+    # 全部断开时仍按最早恢复的顺序返回
+    trip(pool, SLOW)
+    assert names(pool.ranked('main')) == ['medium', 'fast', 'slow']
+
+
+def test_pinned_api_base_bypasses_pool(clock):
+    from app_overseas_young_scholar import evaluation_settings, pinned_targets, select_target
+
+    pool = GatewayPool({'main': [FAST, MEDIUM], 'structured': [FAST, MEDIUM], 'policy': [FAST]}, clock=clock)
+    pinned = pinned_targets(evaluation_settings({'api_base': 'http://pinned/v1', 'api_key': 'custom'}))
+    for role in ('main', 'structured', 'policy'):
+        (base_url, api_key, _), upstreams = select_target(role, pinned, 1000, pool)
+        assert (base_url, api_key, upstreams) == ('http://pinned/v1', 'custom', [])
+    assert all(stats['selected'] == 0 for stats in pool.stats().values())
+
+    pinned = pinned_targets(evaluation_settings({}))
+    (base_url, _, _), upstreams = select_target('main', pinned, 1000, pool)
+    assert base_url == FAST.base_url and names(upstreams) == ['fast', 'medium']
+    assert pool.stats()[FAST.key]['selected'] == 1
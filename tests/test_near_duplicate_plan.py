@@ -0,0 +1,23 @@
+import app_overseas_young_scholar as app
+
+
+def make_match(discipline='information_sciences'):
+    return {'similarity': 0.9, 'changed_paragraphs': [3], 'changed_mask': 0b1, 'created_at': 0,
+            'meta': {'discipline': discipline, 'pipeline': 'standard', 'dimension_fanout': False}}
+
+
+def test_partial_reruns_personalized_policy(monkeypatch):
+    monkeypatch.setattr(app, 'policy_cache', object())
+    monkeypatch.setattr(app, 'POLICY_PERSONALIZE_MAX_TOKENS', 600)
+    assert app.near_duplicate_plan(make_match(), 'partial', 'information_sciences')['reused'] == ['validation']
+    # reuse 模式照常回放全部轮次
+    assert 'policy' in app.near_duplicate_plan(make_match(), 'reuse', 'information_sciences')['reused']
+
+
+def test_partial_reuses_policy_without_personalization(monkeypatch):
+    monkeypatch.setattr(app, 'policy_cache', object())
+    monkeypatch.setattr(app, 'POLICY_PERSONALIZE_MAX_TOKENS', 0)
+    plan = app.near_duplicate_plan(make_match(), 'partial', 'information_sciences')
+    assert plan['reused'] == ['validation', 'policy']
+    plan = app.near_duplicate_plan(make_match('life_sciences'), 'partial', 'information_sciences')
+    assert plan['reused'] == ['validation']
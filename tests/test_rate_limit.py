@@ -0,0 +1,20 @@
+import asyncio
+import time
+
+from rate_limit import RateLimiter
+
+
+def test_cancelled_waiter_returns_its_slot():
+    async def scenario():
+        limiter = RateLimiter(rpm=300)  # 每 0.2 秒一个时隙
+        await limiter.acquire('http://gateway/v1')
+        waiter = asyncio.ensure_future(limiter.acquire('http://gateway/v1'))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        start = time.monotonic()
+        await limiter.acquire('http://gateway/v1')
+        return time.monotonic() - start
+
+    # 被取消的调用归还时隙后，下一个调用只等第二个时隙（约 0.15 秒），而不是第三个（约 0.35 秒）
+    assert asyncio.run(scenario()) < 0.3